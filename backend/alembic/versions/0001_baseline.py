@@ -0,0 +1,111 @@
+"""baseline schema
+
+初始版本的全部表。之前由 Base.metadata.create_all 或 mysql_db_init.sql 建好的库中表已存在，
+这里只创建缺少的表，因此已有的库可以直接 alembic upgrade head，无需手工 stamp。
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-01-01 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def _create_table(existing, name, *columns, **kwargs):
+    if name not in existing:
+        op.create_table(name, *columns, **kwargs)
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    _create_table(
+        existing, 'users',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('username', sa.String(50), nullable=False, unique=True, index=True),
+        sa.Column('email', sa.String(100), nullable=False, unique=True, index=True),
+        sa.Column('hashed_password', sa.String(255), nullable=False),
+        sa.Column('is_active', sa.Boolean()),
+        sa.Column('is_superuser', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True)),
+    )
+    _create_table(
+        existing, 'spider_tasks',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('description', sa.Text()),
+        sa.Column('url', sa.String(500), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'FAILED', 'CANCELLED', name='taskstatus')),
+        sa.Column('config', sa.Text()),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True)),
+        sa.Column('started_at', sa.DateTime(timezone=True)),
+        sa.Column('completed_at', sa.DateTime(timezone=True)),
+        sa.Column('error_message', sa.Text()),
+    )
+    _create_table(
+        existing, 'spider_data',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('task_id', sa.Integer(), sa.ForeignKey('spider_tasks.id')),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('title', sa.Text()),
+        sa.Column('content', sa.Text()),
+        sa.Column('extracted_data', sa.JSON()),
+        sa.Column('raw_html', sa.Text()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    _create_table(
+        existing, 'spider_configs',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('description', sa.Text()),
+        sa.Column('config_data', sa.JSON(), nullable=False),
+        sa.Column('is_default', sa.Boolean()),
+        sa.Column('is_active', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True)),
+    )
+    _create_table(
+        existing, 'proxy_websites',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('name', sa.String(100), nullable=False, comment='网站名称'),
+        sa.Column('url', sa.String(500), nullable=False, comment='网站URL'),
+        sa.Column('description', sa.Text(), comment='网站描述'),
+        sa.Column('is_active', sa.Boolean(), comment='是否启用'),
+        sa.Column('crawl_interval', sa.Integer(), comment='爬取间隔(秒)'),
+        sa.Column('last_crawl_time', sa.DateTime(), comment='最后爬取时间'),
+        sa.Column('success_rate', sa.Float(), comment='成功率'),
+        sa.Column('total_proxies', sa.Integer(), comment='总代理数量'),
+        sa.Column('valid_proxies', sa.Integer(), comment='有效代理数量'),
+        sa.Column('created_at', sa.DateTime(), comment='创建时间'),
+        sa.Column('updated_at', sa.DateTime(), comment='更新时间'),
+    )
+    _create_table(
+        existing, 'proxies',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('ip', sa.String(45), nullable=False, comment='代理IP'),
+        sa.Column('port', sa.Integer(), nullable=False, comment='代理端口'),
+        sa.Column('protocol', sa.String(10), comment='协议类型'),
+        sa.Column('country', sa.String(50), comment='国家/地区'),
+        sa.Column('region', sa.String(100), comment='省份/州'),
+        sa.Column('city', sa.String(100), comment='城市'),
+        sa.Column('isp', sa.String(100), comment='网络服务商'),
+        sa.Column('anonymity', sa.String(20), comment='匿名度'),
+        sa.Column('speed', sa.Float(), comment='响应速度(ms)'),
+        sa.Column('success_rate', sa.Float(), comment='成功率'),
+        sa.Column('last_check_time', sa.DateTime(), comment='最后检测时间'),
+        sa.Column('is_active', sa.Boolean(), comment='是否有效'),
+        sa.Column('source_website_id', sa.Integer(), sa.ForeignKey('proxy_websites.id'), comment='来源网站ID'),
+        sa.Column('created_at', sa.DateTime(), comment='创建时间'),
+        sa.Column('updated_at', sa.DateTime(), comment='更新时间'),
+    )
+
+def downgrade() -> None:
+    for name in ('proxies', 'proxy_websites', 'spider_configs', 'spider_data', 'spider_tasks', 'users'):
+        op.drop_table(name)
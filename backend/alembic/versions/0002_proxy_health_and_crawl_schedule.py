@@ -0,0 +1,97 @@
+"""proxy health, crawl rules and scheduling columns
+
+proxies 表的平滑健康统计、分阶段耗时、失败计数和 (ip, port, protocol) 唯一约束，
+proxy_websites 表的抓取规则和自适应调度字段，以及页面缓存表 proxy_source_pages。
+已存在的列和表跳过（create_all 建的新库已包含这些字段）。
+
+添加唯一约束前会删除重复的代理（每组保留ID最小的一条），并把为空的协议补为 http。
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-01-02 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+PROXY_COLUMNS = [
+    sa.Column('ewma_success', sa.Float(), comment='平滑成功率(0-1)'),
+    sa.Column('ewma_latency', sa.Float(), comment='平滑响应时间(ms)'),
+    sa.Column('latency_p50', sa.Float(), comment='响应时间P50估计(ms)'),
+    sa.Column('latency_p95', sa.Float(), comment='响应时间P95估计(ms)'),
+    sa.Column('check_count', sa.Integer(), server_default='0', comment='累计检测次数'),
+    sa.Column('quality_score', sa.Float(), server_default='0', comment='质量评分(0-100)'),
+    sa.Column('connect_ms', sa.Integer(), comment='建立连接耗时(ms)'),
+    sa.Column('tls_ms', sa.Integer(), comment='TLS握手耗时(ms)'),
+    sa.Column('ttfb_ms', sa.Integer(), comment='首字节耗时(ms)'),
+    sa.Column('fail_count', sa.Integer(), server_default='0', comment='连续失败次数'),
+]
+
+WEBSITE_COLUMNS = [
+    sa.Column('crawl_rules', sa.JSON(none_as_null=True), comment='抓取规则(URL模板、分页、行选择器/正则、列映射)'),
+    sa.Column('adaptive_interval', sa.Integer(), comment='按产出自适应调整后的爬取间隔(秒)'),
+    sa.Column('consecutive_failures', sa.Integer(), server_default='0', comment='连续爬取失败次数'),
+    sa.Column('next_crawl_time', sa.DateTime(), comment='下次爬取时间'),
+]
+
+UNIQUE_NAME = 'uq_proxies_ip_port_protocol'
+
+def _add_missing_columns(inspector, table, columns):
+    existing = {column['name'] for column in inspector.get_columns(table)}
+    missing = [column for column in columns if column.name not in existing]
+    if missing:
+        with op.batch_alter_table(table) as batch:
+            for column in missing:
+                batch.add_column(column)
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    _add_missing_columns(inspector, 'proxies', PROXY_COLUMNS)
+    _add_missing_columns(inspector, 'proxy_websites', WEBSITE_COLUMNS)
+
+    unique_names = {constraint['name'] for constraint in inspector.get_unique_constraints('proxies')}
+    unique_names |= {index['name'] for index in inspector.get_indexes('proxies') if index.get('unique')}
+    if UNIQUE_NAME not in unique_names:
+        op.execute("UPDATE proxies SET protocol = 'http' WHERE protocol IS NULL")
+        # 派生表包一层，MySQL 不允许 DELETE 的子查询直接引用目标表
+        op.execute(
+            "DELETE FROM proxies WHERE id NOT IN ("
+            "SELECT id FROM (SELECT MIN(id) AS id FROM proxies GROUP BY ip, port, protocol) AS keep_ids)"
+        )
+        with op.batch_alter_table('proxies') as batch:
+            batch.alter_column('protocol', existing_type=sa.String(10), nullable=False)
+            batch.create_unique_constraint(UNIQUE_NAME, ['ip', 'port', 'protocol'])
+
+    if 'proxy_source_pages' not in inspector.get_table_names():
+        op.create_table(
+            'proxy_source_pages',
+            sa.Column('id', sa.Integer(), primary_key=True, index=True),
+            sa.Column('url', sa.String(500), nullable=False, unique=True, comment='页面URL'),
+            sa.Column('website_id', sa.Integer(), sa.ForeignKey('proxy_websites.id'), comment='所属网站ID'),
+            sa.Column('etag', sa.String(255), comment='ETag响应头'),
+            sa.Column('last_modified', sa.String(100), comment='Last-Modified响应头'),
+            sa.Column('content_hash', sa.String(64), comment='页面内容SHA-256'),
+            sa.Column('content_length', sa.Integer(), comment='页面大小(字节)'),
+            sa.Column('last_fetch_time', sa.DateTime(), comment='最后抓取时间'),
+            sa.Column('last_changed_time', sa.DateTime(), comment='内容最后变化时间'),
+            sa.Column('created_at', sa.DateTime(), comment='创建时间'),
+            sa.Column('updated_at', sa.DateTime(), comment='更新时间'),
+        )
+
+def downgrade() -> None:
+    op.drop_table('proxy_source_pages')
+    with op.batch_alter_table('proxies') as batch:
+        batch.drop_constraint(UNIQUE_NAME, type_='unique')
+        batch.alter_column('protocol', existing_type=sa.String(10), nullable=True)
+        for column in PROXY_COLUMNS:
+            batch.drop_column(column.name)
+    with op.batch_alter_table('proxy_websites') as batch:
+        for column in WEBSITE_COLUMNS:
+            batch.drop_column(column.name)
@@ -0,0 +1,54 @@
+"""composite and partial indexes for proxy queries
+
+与 app/models/proxy.py 中定义的索引一致。PostgreSQL 上使用 CREATE INDEX CONCURRENTLY，
+建索引期间不阻塞对 proxies 表的写入；已存在的索引跳过。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-01-03 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# (索引名, 列, 是否只包含有效代理)
+INDEXES = [
+    ('ix_proxies_active_selection',
+     ['protocol', 'country', sa.text('quality_score DESC'), sa.text('success_rate DESC')], True),
+    ('ix_proxies_active_ranking', [sa.text('quality_score DESC'), sa.text('success_rate DESC')], True),
+    ('ix_proxies_protocol_country_active', ['protocol', 'country', 'is_active'], False),
+    ('ix_proxies_source_active', ['source_website_id', 'is_active'], False),
+    ('ix_proxies_updated_at', ['updated_at'], False),
+]
+
+def _existing_indexes():
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('proxies')}
+
+def upgrade() -> None:
+    existing = _existing_indexes()
+    dialect = op.get_bind().dialect.name
+    options = {'postgresql_concurrently': True} if dialect == 'postgresql' else {}
+
+    # CONCURRENTLY 不能在事务中执行
+    with op.get_context().autocommit_block():
+        for name, columns, active_only in INDEXES:
+            if name in existing:
+                continue
+            where = {}
+            if active_only:
+                where = {
+                    'postgresql_where': sa.text('is_active = true'),
+                    'sqlite_where': sa.text('is_active = 1'),
+                }
+            op.create_index(name, 'proxies', columns, **options, **where)
+
+def downgrade() -> None:
+    existing = _existing_indexes()
+    for name, _, _ in INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name='proxies')
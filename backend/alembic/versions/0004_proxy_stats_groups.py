@@ -0,0 +1,46 @@
+"""proxy stats summary table
+
+按 (协议, 国家) 汇总代理数、有效数、速度和成功率之和的 proxy_stats_groups 表，
+由 proxies 表的写入在同一事务中按差量更新。建表后用一次分组聚合填充初始值。
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-01-04 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    if 'proxy_stats_groups' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'proxy_stats_groups',
+            sa.Column('id', sa.Integer(), primary_key=True, index=True),
+            sa.Column('protocol', sa.String(10), nullable=False, comment='协议类型'),
+            sa.Column('country', sa.String(50), nullable=False, server_default='', comment='国家/地区，空字符串表示未知'),
+            sa.Column('total', sa.Integer(), nullable=False, server_default='0', comment='代理数'),
+            sa.Column('active', sa.Integer(), nullable=False, server_default='0', comment='有效代理数'),
+            sa.Column('speed_sum', sa.Float(), nullable=False, server_default='0', comment='响应速度之和(ms)'),
+            sa.Column('speed_count', sa.Integer(), nullable=False, server_default='0', comment='有响应速度的代理数'),
+            sa.Column('success_sum', sa.Float(), nullable=False, server_default='0', comment='成功率之和'),
+            sa.Column('success_count', sa.Integer(), nullable=False, server_default='0', comment='有成功率的代理数'),
+            sa.Column('updated_at', sa.DateTime(), comment='更新时间'),
+            sa.UniqueConstraint('protocol', 'country', name='uq_proxy_stats_groups_protocol_country'),
+        )
+    op.execute("DELETE FROM proxy_stats_groups")
+    op.execute(
+        "INSERT INTO proxy_stats_groups "
+        "(protocol, country, total, active, speed_sum, speed_count, success_sum, success_count) "
+        "SELECT protocol, COALESCE(country, ''), COUNT(id), "
+        "SUM(CASE WHEN is_active THEN 1 ELSE 0 END), COALESCE(SUM(speed), 0), COUNT(speed), "
+        "COALESCE(SUM(success_rate), 0), COUNT(success_rate) "
+        "FROM proxies GROUP BY protocol, COALESCE(country, '')"
+    )
+
+def downgrade() -> None:
+    op.drop_table('proxy_stats_groups')
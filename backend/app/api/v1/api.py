@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, tasks, data, configs, proxy
+from app.api.v1.endpoints import auth, tasks, data, configs, proxy, judge
 
 api_router = APIRouter()
 
@@ -8,3 +8,4 @@ api_router.include_router(tasks.router, prefix="/tasks", tags=["爬虫任务"])
 api_router.include_router(data.router, prefix="/data", tags=["爬虫数据"])
 api_router.include_router(configs.router, prefix="/configs", tags=["爬虫配置"])
 api_router.include_router(proxy.router, prefix="/proxy", tags=["代理管理"])
+api_router.include_router(judge.router, prefix="/judge", tags=["代理验证回显"])
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.core.database import get_db
+from app.core.pagination import paginate, InvalidCursor, NEXT_CURSOR_HEADER
 from app.models.spider_config import SpiderConfig
 from app.schemas.config import ConfigCreate, ConfigUpdate, ConfigResponse
 
@@ -9,12 +10,20 @@ router = APIRouter()
 
 @router.get("/", response_model=List[ConfigResponse])
 async def get_configs(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=0, description="不设上限，与旧版本一致；导出大量数据时应按游标分页"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值，传入时忽略 skip"),
+    desc: bool = Query(False, description="按ID倒序"),
     db: Session = Depends(get_db)
 ):
     """获取爬虫配置列表"""
-    configs = db.query(SpiderConfig).offset(skip).limit(limit).all()
+    try:
+        configs, next_cursor = paginate(db.query(SpiderConfig), SpiderConfig.id, limit, cursor=cursor, skip=skip, descending=desc)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return configs
 
 @router.post("/", response_model=ConfigResponse)
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.core.database import get_db
+from app.core.pagination import paginate, InvalidCursor, NEXT_CURSOR_HEADER
 from app.models.spider_data import SpiderData
 from app.schemas.data import DataResponse
 
@@ -9,17 +10,25 @@ router = APIRouter()
 
 @router.get("/", response_model=List[DataResponse])
 async def get_data(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=0, description="不设上限，与旧版本一致；导出大量数据时应按游标分页"),
     task_id: int = None,
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值，传入时忽略 skip"),
+    desc: bool = Query(False, description="按ID倒序"),
     db: Session = Depends(get_db)
 ):
-    """获取爬虫数据列表"""
+    """获取爬虫数据列表，导出全部数据时应按游标逐页读取"""
     query = db.query(SpiderData)
     if task_id:
         query = query.filter(SpiderData.task_id == task_id)
     
-    data_list = query.offset(skip).limit(limit).all()
+    try:
+        data_list, next_cursor = paginate(query, SpiderData.id, limit, cursor=cursor, skip=skip, descending=desc)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return data_list
 
 @router.get("/{data_id}", response_model=DataResponse)
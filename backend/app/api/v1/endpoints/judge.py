@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Request
+from app.services.judge_service import build_echo_payload, build_ip_payload
+
+router = APIRouter()
+
+@router.get("/get")
+async def echo(request: Request):
+    """回显来源IP和请求头（httpbin /get 格式）"""
+    client_ip = request.client.host if request.client else ''
+    return build_echo_payload(client_ip, request.headers, str(request.url), request.query_params)
+
+@router.get("/ip")
+async def echo_ip(request: Request):
+    """回显来源IP（httpbin /ip 格式）"""
+    client_ip = request.client.host if request.client else ''
+    return build_ip_payload(client_ip)
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.core.database import get_db
+from app.core.pagination import InvalidCursor, NEXT_CURSOR_HEADER
 from app.services.proxy_service import ProxyWebsiteService, ProxyService
+from app.services.proxy_lease import proxy_lease_manager, proxy_feedback_buffer
+from app.services.proxy_transfer import ProxyImporter, MEDIA_TYPES, iter_export, stream_line_batches
 from app.schemas.proxy import (
     ProxyWebsiteCreate, ProxyWebsiteUpdate, ProxyWebsiteResponse,
-    ProxyCreate, ProxyUpdate, ProxyResponse, ProxyStats
+    ProxyCreate, ProxyUpdate, ProxyResponse, ProxyStats,
+    ProxyLeaseRequest, ProxyLeaseResponse, ProxyFeedbackRequest, ProxyFeedbackResponse
 )
 
 router = APIRouter()
@@ -21,12 +27,21 @@ def create_proxy_website(
 
 @router.get("/websites/", response_model=List[ProxyWebsiteResponse])
 def get_proxy_websites(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值，传入时忽略 skip"),
+    desc: bool = Query(False, description="按ID倒序"),
     db: Session = Depends(get_db)
 ):
     service = ProxyWebsiteService(db)
-    return service.get_proxy_websites(skip=skip, limit=limit)
+    try:
+        websites, next_cursor = service.get_proxy_websites_page(limit=limit, cursor=cursor, skip=skip, descending=desc)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return websites
 
 @router.get("/websites/{website_id}", response_model=ProxyWebsiteResponse)
 def get_proxy_website(website_id: int, db: Session = Depends(get_db)):
@@ -60,16 +75,26 @@ def delete_proxy_website(website_id: int, db: Session = Depends(get_db)):
 @router.post("/", response_model=ProxyResponse)
 def create_proxy(proxy: ProxyCreate, db: Session = Depends(get_db)):
     service = ProxyService(db)
-    return service.create_proxy(proxy)
+    db_proxy = service.create_proxy(proxy)
+    if not db_proxy:
+        raise HTTPException(status_code=400, detail="代理已存在")
+    return db_proxy
 
 @router.get("/", response_model=List[ProxyResponse])
 def get_proxies(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值，传入时忽略 skip"),
+    sort: str = Query("id", pattern="^(id|updated_at)$", description="排序键"),
+    desc: bool = Query(False, description="倒序"),
     protocol: Optional[str] = Query(None),
     country: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
     source_website_id: Optional[int] = Query(None),
+    max_connect_ms: Optional[int] = Query(None, ge=0, description="建立连接耗时上限(ms)"),
+    max_tls_ms: Optional[int] = Query(None, ge=0, description="TLS握手耗时上限(ms)"),
+    max_ttfb_ms: Optional[int] = Query(None, ge=0, description="首字节耗时上限(ms)"),
     db: Session = Depends(get_db)
 ):
     service = ProxyService(db)
@@ -77,17 +102,70 @@ def get_proxies(
         'protocol': protocol,
         'country': country,
         'is_active': is_active,
-        'source_website_id': source_website_id
+        'source_website_id': source_website_id,
+        'max_connect_ms': max_connect_ms,
+        'max_tls_ms': max_tls_ms,
+        'max_ttfb_ms': max_ttfb_ms
     }
     # 移除None值
     filters = {k: v for k, v in filters.items() if v is not None}
-    return service.get_proxies(skip=skip, limit=limit, filters=filters)
+    try:
+        proxies, next_cursor = service.get_proxies_page(
+            limit=limit, filters=filters, cursor=cursor, skip=skip, sort=sort, descending=desc
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return proxies
 
 @router.get("/stats", response_model=ProxyStats)
 def get_proxy_stats(db: Session = Depends(get_db)):
     service = ProxyService(db)
     return service.get_proxy_stats()
 
+@router.post("/import")
+async def import_proxies(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="请求体格式，默认按 Content-Type 判断"),
+    overwrite: bool = Query(False, description="已存在的代理用导入的值覆盖，默认只补全空缺字段"),
+    batch_size: int = Query(5000, ge=100, le=50000, description="每批写入的行数"),
+    db: Session = Depends(get_db)
+):
+    """流式导入 NDJSON 或 CSV，边读请求体边按批写入，返回行数、写入数和无效行"""
+    if format is None:
+        format = 'csv' if 'csv' in request.headers.get('content-type', '') else 'ndjson'
+    importer = ProxyImporter(db, format, overwrite)
+    try:
+        async for batch in stream_line_batches(request.stream(), batch_size, format):
+            await run_in_threadpool(importer.feed, batch)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail=f"请求体不是UTF-8编码，已导入 {importer.imported} 个代理")
+    return importer.result()
+
+@router.get("/export")
+def export_proxies(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    protocol: Optional[str] = Query(None),
+    country: Optional[str] = Query(None),
+    is_active: Optional[bool] = Query(None),
+    source_website_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """流式导出 NDJSON 或 CSV，可直接用于 /import"""
+    filters = {
+        'protocol': protocol,
+        'country': country,
+        'is_active': is_active,
+        'source_website_id': source_website_id
+    }
+    filters = {k: v for k, v in filters.items() if v is not None}
+    return StreamingResponse(
+        iter_export(db, format, filters),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="proxies.{format}"'}
+    )
+
 @router.get("/{proxy_id}", response_model=ProxyResponse)
 def get_proxy(proxy_id: int, db: Session = Depends(get_db)):
     service = ProxyService(db)
@@ -127,3 +205,39 @@ def get_random_proxy(
     if not proxy:
         raise HTTPException(status_code=404, detail="没有可用的代理")
     return proxy
+
+@router.post("/lease", response_model=ProxyLeaseResponse)
+def lease_proxies(request: ProxyLeaseRequest, db: Session = Depends(get_db)):
+    """按评分租用一批不重复的代理，租约期内本进程的其他租约尽量避开这些代理"""
+    proxy_feedback_buffer.maybe_flush(db)
+    lease = proxy_lease_manager.lease(
+        db, request.count, protocol=request.protocol, country=request.country, ttl=request.ttl
+    )
+    if not lease:
+        raise HTTPException(status_code=404, detail="没有可用的代理")
+    return lease
+
+@router.delete("/lease/{lease_id}")
+def release_lease(lease_id: str):
+    if not proxy_lease_manager.release(lease_id):
+        raise HTTPException(status_code=404, detail="租约不存在或已过期")
+    return {"message": "租约已归还"}
+
+@router.post("/feedback", response_model=ProxyFeedbackResponse)
+def report_feedback(feedback: ProxyFeedbackRequest, db: Session = Depends(get_db)):
+    """批量上报代理的使用结果，几秒内合并进健康统计和选择权重
+
+    带 lease_id 时只接受该租约中的代理的结果，其余计入 rejected
+    """
+    results = feedback.results
+    rejected = 0
+    if feedback.lease_id:
+        leased = proxy_lease_manager.lease_proxy_ids(feedback.lease_id)
+        if leased is None:
+            raise HTTPException(status_code=404, detail="租约不存在或已过期")
+        results = [item for item in feedback.results if item.proxy_id in leased]
+        rejected = len(feedback.results) - len(results)
+    accepted = proxy_feedback_buffer.add(item.dict() for item in results)
+    released = proxy_lease_manager.release(feedback.lease_id) if feedback.lease_id and feedback.release else False
+    proxy_feedback_buffer.maybe_flush(db)
+    return {"accepted": accepted, "rejected": rejected, "released": released}
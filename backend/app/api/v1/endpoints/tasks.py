@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.core.database import get_db
+from app.core.pagination import paginate, InvalidCursor, NEXT_CURSOR_HEADER
 from app.models.spider_task import SpiderTask, TaskStatus
 from app.schemas.task import TaskCreate, TaskUpdate, TaskResponse
 from app.services.spider_service import SpiderService
@@ -10,12 +11,20 @@ router = APIRouter()
 
 @router.get("/", response_model=List[TaskResponse])
 async def get_tasks(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=0, description="不设上限，与旧版本一致；导出大量数据时应按游标分页"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值，传入时忽略 skip"),
+    desc: bool = Query(False, description="按ID倒序"),
     db: Session = Depends(get_db)
 ):
     """获取爬虫任务列表"""
-    tasks = db.query(SpiderTask).offset(skip).limit(limit).all()
+    try:
+        tasks, next_cursor = paginate(db.query(SpiderTask), SpiderTask.id, limit, cursor=cursor, skip=skip, descending=desc)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return tasks
 
 @router.post("/", response_model=TaskResponse)
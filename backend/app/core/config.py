@@ -34,6 +34,21 @@ class Settings(BaseSettings):
     REQUEST_TIMEOUT: int = 30
     MAX_RETRIES: int = 3
     
+    # 代理验证配置
+    # 回显接口需返回 httpbin /get 格式的来源IP和请求头，可指向内置的 /api/v1/judge/get
+    # 或 app/scripts/proxy_judge.py 启动的独立服务；回显接口由被测代理访问，须部署在公网可达的地址。
+    # PROXY_JUDGE_IP_URL 用于直连获取本机出口IP，须为外部接口，返回 {"origin": ...}、{"ip": ...} 或纯文本IP
+    PROXY_JUDGE_URLS: List[str] = [
+        "http://httpbin.org/get",
+        "https://httpbin.org/get"
+    ]
+    PROXY_JUDGE_IP_URL: str = "http://httpbin.org/ip"
+    
+    # 代理池配置
+    # memory: 每个进程内维护加权选择器；redis: 多个 worker 共享 Redis 中按协议/国家分片的有序集合
+    PROXY_POOL_BACKEND: str = "memory"
+    PROXY_POOL_REDIS_PREFIX: str = "proxy:pool"
+    
     # 文件上传配置
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
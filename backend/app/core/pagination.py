@@ -0,0 +1,77 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+# 列表接口通过该响应头返回下一页的游标，没有更多数据时不返回
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class InvalidCursor(ValueError):
+    """游标格式错误，或与当前的排序方式不匹配"""
+
+def encode_cursor(sort: str, descending: bool, value: Any, row_id: int) -> str:
+    """把 (排序键, ID) 编码为不透明的游标"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort, "d": descending, "v": value, "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, descending: bool, value_type: type = int) -> Tuple[Any, int]:
+    """解析游标，返回 (排序键的值, ID)"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["s"] != sort or payload["d"] != descending:
+            raise InvalidCursor("游标与当前的排序方式不匹配")
+        value, row_id = payload["v"], int(payload["id"])
+        if value_type is datetime and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, row_id
+    except InvalidCursor:
+        raise
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("无效的游标") from e
+
+def paginate(query: Query, id_column, limit: int, cursor: Optional[str] = None, skip: int = 0,
+             sort_column=None, descending: bool = False) -> Tuple[List[Any], Optional[str]]:
+    """按 (排序键, ID) 分页，返回 (本页数据, 下一页游标)
+
+    传入游标时使用键集分页，直接定位到上一页最后一行之后，深翻页与第一页的开销相同；
+    不传游标时按 skip 偏移分页以兼容旧的调用方式，同样返回下一页游标。
+    排序键为空时只按ID排序；排序列的值不能为 NULL。
+    """
+    sort_column = sort_column if sort_column is not None else id_column
+    sort_name = sort_column.key
+    by_id_only = sort_column is id_column
+    value_type = sort_column.type.python_type
+
+    if descending:
+        order = [sort_column.desc()] if by_id_only else [sort_column.desc(), id_column.desc()]
+    else:
+        order = [sort_column.asc()] if by_id_only else [sort_column.asc(), id_column.asc()]
+    query = query.order_by(*order)
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_name, descending, value_type)
+        if by_id_only:
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        elif descending:
+            query = query.filter(or_(sort_column < value, and_(sort_column == value, id_column < last_id)))
+        else:
+            query = query.filter(or_(sort_column > value, and_(sort_column == value, id_column > last_id)))
+    elif skip:
+        query = query.offset(skip)
+
+    if limit <= 0:
+        return [], None
+
+    # 多取一行用于判断是否还有下一页
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_name, descending, getattr(last, sort_name), getattr(last, id_column.key))
+    return rows, next_cursor
@@ -0,0 +1,38 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+class TokenBucket:
+    """令牌桶限速器，rate 为每秒补充的令牌数，capacity 为允许的突发量"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """预占令牌，返回需要等待的秒数（0 表示可立即执行）"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            # 令牌不足时记为欠账，调用方等待欠账被补齐
+            return -self.tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0):
+        """阻塞直到获得令牌"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        """异步等待直到获得令牌"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
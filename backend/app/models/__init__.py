@@ -4,6 +4,8 @@ from .spider_data import SpiderData
 from .spider_config import SpiderConfig
 from .proxy_website import ProxyWebsite
 from .proxy import Proxy
+from .proxy_source_page import ProxySourcePage
+from .proxy_stats import ProxyStatsGroup
 
 __all__ = [
     "User",
@@ -11,5 +13,7 @@ __all__ = [
     "SpiderData",
     "SpiderConfig",
     "ProxyWebsite",
-    "Proxy"
+    "Proxy",
+    "ProxySourcePage",
+    "ProxyStatsGroup"
 ]
@@ -1,15 +1,18 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Float, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Float, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from app.core.database import Base
 
 class Proxy(Base):
     __tablename__ = "proxies"
+    __table_args__ = (
+        UniqueConstraint("ip", "port", "protocol", name="uq_proxies_ip_port_protocol"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     ip = Column(String(45), nullable=False, comment="代理IP")
     port = Column(Integer, nullable=False, comment="代理端口")
-    protocol = Column(String(10), default="http", comment="协议类型")
+    protocol = Column(String(10), nullable=False, default="http", comment="协议类型")
     country = Column(String(50), comment="国家/地区")
     region = Column(String(100), comment="省份/州")
     city = Column(String(100), comment="城市")
@@ -17,11 +20,43 @@ class Proxy(Base):
     anonymity = Column(String(20), default="unknown", comment="匿名度")
     speed = Column(Float, comment="响应速度(ms)")
     success_rate = Column(Float, default=0.0, comment="成功率")
+    ewma_success = Column(Float, comment="平滑成功率(0-1)")
+    ewma_latency = Column(Float, comment="平滑响应时间(ms)")
+    latency_p50 = Column(Float, comment="响应时间P50估计(ms)")
+    latency_p95 = Column(Float, comment="响应时间P95估计(ms)")
+    check_count = Column(Integer, default=0, comment="累计检测次数")
+    quality_score = Column(Float, default=0.0, comment="质量评分(0-100)")
+    connect_ms = Column(Integer, comment="建立连接耗时(ms)")
+    tls_ms = Column(Integer, comment="TLS握手耗时(ms)")
+    ttfb_ms = Column(Integer, comment="首字节耗时(ms)")
     last_check_time = Column(DateTime, comment="最后检测时间")
+    fail_count = Column(Integer, default=0, comment="连续失败次数")
     is_active = Column(Boolean, default=True, comment="是否有效")
     source_website_id = Column(Integer, ForeignKey("proxy_websites.id"), comment="来源网站ID")
-    created_at = Column(DateTime, default=func.now(), comment="创建时间")
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间")
+    # 时间统一由应用按 UTC 写入（不用数据库的 now()），代理选择器按 updated_at 水位线增量刷新，
+    # 混用数据库本地时间和 UTC 会使水位线超前而漏读更新
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
     
     # 关系
     source_website = relationship("ProxyWebsite", back_populates="proxies")
+
+# 代理选择、筛选和统计的查询路径对应的索引（迁移见 alembic/versions/0003_proxy_query_indexes.py）
+# 有效代理通常只占一小部分，按评分选择和排序的索引在 PostgreSQL / SQLite 上建为只含有效代理的部分索引，
+# MySQL 不支持部分索引，忽略 WHERE 条件建为普通索引
+ACTIVE_PROXY_CONDITIONS = {
+    'postgresql_where': text('is_active = true'),
+    'sqlite_where': text('is_active = 1'),
+}
+
+# 按协议/国家筛选有效代理并按评分排序（get_random_proxy、Redis代理池重建）
+Index('ix_proxies_active_selection', Proxy.protocol, Proxy.country, Proxy.quality_score.desc(),
+      Proxy.success_rate.desc(), **ACTIVE_PROXY_CONDITIONS)
+# 不带筛选条件时按评分排序的有效代理
+Index('ix_proxies_active_ranking', Proxy.quality_score.desc(), Proxy.success_rate.desc(), **ACTIVE_PROXY_CONDITIONS)
+# get_proxies 的协议/国家/有效性筛选，以及按 (协议, 国家) 分组的统计
+Index('ix_proxies_protocol_country_active', Proxy.protocol, Proxy.country, Proxy.is_active)
+# 按来源网站筛选和统计（count_proxies_by_source）
+Index('ix_proxies_source_active', Proxy.source_website_id, Proxy.is_active)
+# 代理选择器按 updated_at 水位线增量刷新
+Index('ix_proxies_updated_at', Proxy.updated_at)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class ProxySourcePage(Base):
+    __tablename__ = "proxy_source_pages"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(500), nullable=False, unique=True, comment="页面URL")
+    website_id = Column(Integer, ForeignKey("proxy_websites.id"), comment="所属网站ID")
+    etag = Column(String(255), comment="ETag响应头")
+    last_modified = Column(String(100), comment="Last-Modified响应头")
+    content_hash = Column(String(64), comment="页面内容SHA-256")
+    content_length = Column(Integer, default=0, comment="页面大小(字节)")
+    last_fetch_time = Column(DateTime, comment="最后抓取时间")
+    last_changed_time = Column(DateTime, comment="内容最后变化时间")
+    created_at = Column(DateTime, default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间")
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint
+from datetime import datetime
+from app.core.database import Base
+
+class ProxyStatsGroup(Base):
+    """按 (协议, 国家) 汇总的代理计数，与 proxies 表的写入在同一事务中按差量更新"""
+    __tablename__ = "proxy_stats_groups"
+    __table_args__ = (
+        UniqueConstraint("protocol", "country", name="uq_proxy_stats_groups_protocol_country"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    protocol = Column(String(10), nullable=False, comment="协议类型")
+    # 唯一约束中 NULL 互不相等，国家为空的代理记为空字符串
+    country = Column(String(50), nullable=False, default="", comment="国家/地区，空字符串表示未知")
+    total = Column(Integer, nullable=False, default=0, comment="代理数")
+    active = Column(Integer, nullable=False, default=0, comment="有效代理数")
+    speed_sum = Column(Float, nullable=False, default=0.0, comment="响应速度之和(ms)")
+    speed_count = Column(Integer, nullable=False, default=0, comment="有响应速度的代理数")
+    success_sum = Column(Float, nullable=False, default=0.0, comment="成功率之和")
+    success_count = Column(Integer, nullable=False, default=0, comment="有成功率的代理数")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
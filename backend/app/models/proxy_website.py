@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Float, JSON
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -12,7 +12,11 @@ class ProxyWebsite(Base):
     description = Column(Text, comment="网站描述")
     is_active = Column(Boolean, default=True, comment="是否启用")
     crawl_interval = Column(Integer, default=3600, comment="爬取间隔(秒)")
+    crawl_rules = Column(JSON(none_as_null=True), comment="抓取规则(URL模板、分页、行选择器/正则、列映射)")
     last_crawl_time = Column(DateTime, comment="最后爬取时间")
+    adaptive_interval = Column(Integer, comment="按产出自适应调整后的爬取间隔(秒)")
+    consecutive_failures = Column(Integer, default=0, comment="连续爬取失败次数")
+    next_crawl_time = Column(DateTime, comment="下次爬取时间")
     success_rate = Column(Float, default=0.0, comment="成功率")
     total_proxies = Column(Integer, default=0, comment="总代理数量")
     valid_proxies = Column(Integer, default=0, comment="有效代理数量")
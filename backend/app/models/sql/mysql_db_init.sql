@@ -6,7 +6,11 @@ CREATE TABLE `proxy_websites` (
   `description` TEXT NULL COMMENT '网站描述',
   `is_active` TINYINT(1) NOT NULL DEFAULT 1 COMMENT '是否启用',
   `crawl_interval` INT NOT NULL DEFAULT 3600 COMMENT '爬取间隔(秒)',
+  `crawl_rules` JSON NULL COMMENT '抓取规则(URL模板、分页、行选择器/正则、列映射)',
   `last_crawl_time` DATETIME NULL COMMENT '最后爬取时间',
+  `adaptive_interval` INT NULL COMMENT '按产出自适应调整后的爬取间隔(秒)',
+  `consecutive_failures` INT NOT NULL DEFAULT 0 COMMENT '连续爬取失败次数',
+  `next_crawl_time` DATETIME NULL COMMENT '下次爬取时间',
   `success_rate` DOUBLE NOT NULL DEFAULT 0 COMMENT '成功率(0-100)',
   `total_proxies` INT NOT NULL DEFAULT 0 COMMENT '累计抓取的代理数量',
   `valid_proxies` INT NOT NULL DEFAULT 0 COMMENT '当前有效代理数量',
@@ -29,7 +33,17 @@ CREATE TABLE `proxies` (
   `anonymity` VARCHAR(20) NOT NULL DEFAULT 'unknown' COMMENT '匿名度(elite/anonymous/transparent/unknown)',
   `speed` DOUBLE NULL COMMENT '响应速度(毫秒)',
   `success_rate` DOUBLE NOT NULL DEFAULT 0 COMMENT '成功率(0-100)',
+  `ewma_success` DOUBLE NULL COMMENT '平滑成功率(0-1)',
+  `ewma_latency` DOUBLE NULL COMMENT '平滑响应时间(毫秒)',
+  `latency_p50` DOUBLE NULL COMMENT '响应时间P50估计(毫秒)',
+  `latency_p95` DOUBLE NULL COMMENT '响应时间P95估计(毫秒)',
+  `check_count` INT NOT NULL DEFAULT 0 COMMENT '累计检测次数',
+  `quality_score` DOUBLE NOT NULL DEFAULT 0 COMMENT '质量评分(0-100)',
+  `connect_ms` INT NULL COMMENT '建立连接耗时(毫秒)',
+  `tls_ms` INT NULL COMMENT 'TLS握手耗时(毫秒)',
+  `ttfb_ms` INT NULL COMMENT '首字节耗时(毫秒)',
   `last_check_time` DATETIME NULL COMMENT '最后检测时间',
+  `fail_count` INT NOT NULL DEFAULT 0 COMMENT '连续失败次数',
   `is_active` TINYINT(1) NOT NULL DEFAULT 1 COMMENT '是否有效',
   `source_website_id` BIGINT UNSIGNED NULL COMMENT '来源网站ID',
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
@@ -39,10 +53,55 @@ CREATE TABLE `proxies` (
   KEY `idx_proxies_protocol` (`protocol`),
   KEY `idx_proxies_country` (`country`),
   KEY `idx_proxies_source_site` (`source_website_id`),
+  -- 查询路径对应的复合索引（MySQL 不支持部分索引，is_active 作为普通列）
+  KEY `ix_proxies_active_selection` (`protocol`,`country`,`quality_score` DESC,`success_rate` DESC),
+  KEY `ix_proxies_active_ranking` (`quality_score` DESC,`success_rate` DESC),
+  KEY `ix_proxies_protocol_country_active` (`protocol`,`country`,`is_active`),
+  KEY `ix_proxies_source_active` (`source_website_id`,`is_active`),
+  KEY `ix_proxies_updated_at` (`updated_at`),
   CONSTRAINT `fk_proxies_source_site`
     FOREIGN KEY (`source_website_id`)
     REFERENCES `proxy_websites` (`id`)
     ON DELETE SET NULL
+    ON UPDATE CASCADE,
+  UNIQUE KEY `uq_proxies_ip_port_protocol` (`ip`,`port`,`protocol`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 代理来源页面缓存表（条件请求与内容哈希）
+CREATE TABLE `proxy_source_pages` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT COMMENT '主键',
+  `url` VARCHAR(500) NOT NULL COMMENT '页面URL',
+  `website_id` BIGINT UNSIGNED NULL COMMENT '所属网站ID',
+  `etag` VARCHAR(255) NULL COMMENT 'ETag响应头',
+  `last_modified` VARCHAR(100) NULL COMMENT 'Last-Modified响应头',
+  `content_hash` CHAR(64) NULL COMMENT '页面内容SHA-256',
+  `content_length` INT NOT NULL DEFAULT 0 COMMENT '页面大小(字节)',
+  `last_fetch_time` DATETIME NULL COMMENT '最后抓取时间',
+  `last_changed_time` DATETIME NULL COMMENT '内容最后变化时间',
+  `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_proxy_source_pages_url` (`url`),
+  KEY `idx_proxy_source_pages_website` (`website_id`),
+  CONSTRAINT `fk_proxy_source_pages_website`
+    FOREIGN KEY (`website_id`)
+    REFERENCES `proxy_websites` (`id`)
+    ON DELETE SET NULL
     ON UPDATE CASCADE
-  -- , UNIQUE KEY `uq_proxies_ip_port_protocol` (`ip`,`port`,`protocol`)  -- 可选：去重
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 代理统计汇总表（按协议、国家汇总，与 proxies 表的写入在同一事务中更新）
+CREATE TABLE `proxy_stats_groups` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT COMMENT '主键',
+  `protocol` VARCHAR(10) NOT NULL COMMENT '协议类型',
+  `country` VARCHAR(50) NOT NULL DEFAULT '' COMMENT '国家/地区，空字符串表示未知',
+  `total` INT NOT NULL DEFAULT 0 COMMENT '代理数',
+  `active` INT NOT NULL DEFAULT 0 COMMENT '有效代理数',
+  `speed_sum` DOUBLE NOT NULL DEFAULT 0 COMMENT '响应速度之和(ms)',
+  `speed_count` INT NOT NULL DEFAULT 0 COMMENT '有响应速度的代理数',
+  `success_sum` DOUBLE NOT NULL DEFAULT 0 COMMENT '成功率之和',
+  `success_count` INT NOT NULL DEFAULT 0 COMMENT '有成功率的代理数',
+  `updated_at` DATETIME NULL COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_proxy_stats_groups_protocol_country` (`protocol`, `country`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
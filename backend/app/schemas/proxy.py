@@ -1,5 +1,5 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional, List
+from pydantic import BaseModel, HttpUrl, Field
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 # ProxyWebsite schemas
@@ -9,6 +9,7 @@ class ProxyWebsiteBase(BaseModel):
     description: Optional[str] = None
     is_active: bool = True
     crawl_interval: int = 3600
+    crawl_rules: Optional[Dict[str, Any]] = None
 
 class ProxyWebsiteCreate(ProxyWebsiteBase):
     pass
@@ -19,10 +20,14 @@ class ProxyWebsiteUpdate(BaseModel):
     description: Optional[str] = None
     is_active: Optional[bool] = None
     crawl_interval: Optional[int] = None
+    crawl_rules: Optional[Dict[str, Any]] = None
 
 class ProxyWebsiteResponse(ProxyWebsiteBase):
     id: int
     last_crawl_time: Optional[datetime] = None
+    adaptive_interval: Optional[int] = None
+    consecutive_failures: int = 0
+    next_crawl_time: Optional[datetime] = None
     success_rate: float = 0.0
     total_proxies: int = 0
     valid_proxies: int = 0
@@ -55,16 +60,56 @@ class ProxyResponse(ProxyBase):
     id: int
     speed: Optional[float] = None
     success_rate: float = 0.0
+    quality_score: Optional[float] = None
+    latency_p50: Optional[float] = None
+    latency_p95: Optional[float] = None
+    check_count: Optional[int] = None
+    connect_ms: Optional[int] = None
+    tls_ms: Optional[int] = None
+    ttfb_ms: Optional[int] = None
     last_check_time: Optional[datetime] = None
     is_active: bool = True
-    source_website_id: int
+    source_website_id: Optional[int] = None  # 批量写入、导入的代理可以没有来源
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
 
+# 租约与使用反馈
+class ProxyLeaseRequest(BaseModel):
+    count: int = Field(10, ge=1, le=500)
+    protocol: Optional[str] = None
+    country: Optional[str] = None
+    ttl: int = Field(300, ge=10, le=3600, description="租期(秒)")
+
+class ProxyLeaseResponse(BaseModel):
+    lease_id: str
+    expires_at: datetime
+    proxies: List[ProxyResponse]
+
+class ProxyFeedbackItem(BaseModel):
+    proxy_id: int
+    success: bool
+    latency_ms: Optional[float] = Field(None, ge=0, description="本次使用的耗时(ms)")
+
+class ProxyFeedbackRequest(BaseModel):
+    lease_id: Optional[str] = None
+    release: bool = Field(False, description="上报后归还租约")
+    results: List[ProxyFeedbackItem] = Field(default_factory=list, max_length=10000)
+
+class ProxyFeedbackResponse(BaseModel):
+    accepted: int
+    rejected: int = Field(0, description="不属于所报租约的结果数")
+    released: bool = False
+
 # 统计信息
+class ProxyGroupStats(BaseModel):
+    total: int
+    active: int
+    avg_speed: Optional[float] = None
+    avg_success_rate: Optional[float] = None
+
 class ProxyStats(BaseModel):
     total_proxies: int
     active_proxies: int
@@ -75,3 +120,5 @@ class ProxyStats(BaseModel):
     countries_count: int
     avg_speed: Optional[float] = None
     avg_success_rate: Optional[float] = None
+    by_protocol: Dict[str, ProxyGroupStats] = {}
+    by_country: Dict[str, ProxyGroupStats] = {}
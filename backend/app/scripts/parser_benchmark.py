@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+代理列表解析基准测试脚本
+对比 bs4 / lxml / stream 三种解析后端在代理列表页面上的耗时和峰值内存，
+并校验三者的抽取结果完全一致。可使用保存下来的真实页面，也可按内置规则生成页面
+
+峰值内存由 tracemalloc 统计，只包含Python对象，不含 libxml2 在C层分配的树
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import json
+import logging
+import random
+import time
+import tracemalloc
+from typing import List, Dict, Tuple
+from app.scripts.proxy_extractor import BUILTIN_RULES, PARSERS, HAS_LXML, compile_rule
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def synthesize_page(rules: Dict, rows: int, seed: int = 42) -> str:
+    """按规则的列映射生成一个代理列表页面，附带导航、脚本等常见干扰内容"""
+    rng = random.Random(seed)
+    if rules.get('regex'):
+        body = '<br>\n'.join(
+            f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}:{rng.randint(1, 65535)}'
+            for _ in range(rows)
+        )
+        return f'<html><body><div class="list">{body}</div></body></html>'
+
+    fields_by_index = {index: field for field, index in rules.get('columns', {}).items()}
+    width = rules.get('min_columns') or max(fields_by_index) + 1
+    samples = {
+        'anonymity': ['高匿名', '普通匿名', '透明'],
+        'protocol': ['HTTP', 'HTTPS'],
+        'country': ['中国'],
+        'region': ['北京', '上海', '广东 深圳'],
+        'isp': ['电信', '联通', '移动'],
+        'speed': ['0.5秒', '1.2秒', '3秒']
+    }
+
+    lines = []
+    for _ in range(rows):
+        cells = []
+        for index in range(width):
+            field = fields_by_index.get(index)
+            if field == 'ip':
+                value = f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+            elif field == 'port':
+                value = str(rng.randint(1, 65535))
+            elif field in samples:
+                value = rng.choice(samples[field])
+            else:
+                value = f'<span class="c{index}">{rng.randint(1, 30)}天</span>'
+            cells.append(f'<td data-title="{field or index}">\n  {value}\n</td>')
+        lines.append('<tr>' + ''.join(cells) + '</tr>')
+
+    header = '<tr>' + ''.join(f'<th>{index}</th>' for index in range(width)) + '</tr>'
+    nav = ''.join(f'<li><a href="/free/{i}/">第{i}页</a></li>' for i in range(1, 50))
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>免费代理</title>'
+        '<script>var _hmt = _hmt || []; function track(){ return "<tr><td>"; }</script></head>'
+        f'<body><ul class="nav">{nav}</ul>'
+        f'<table id="ip_list" class="table"><thead>{header}</thead><tbody>\n'
+        + '\n'.join(lines)
+        + '\n</tbody></table><div class="footer">&copy; 2024</div></body></html>'
+    )
+
+def benchmark_page(rules: Dict, html: str, repeat: int = 20) -> Dict:
+    """用各解析后端解析同一页面，返回耗时、峰值内存，并断言结果一致"""
+    rule = compile_rule(rules)
+    parsers = [parser for parser in PARSERS if HAS_LXML or parser == 'bs4']
+
+    outputs = {}
+    report = {'bytes': len(html.encode('utf-8')), 'parsers': {}}
+    for parser in parsers:
+        # 预热，同时记录输出用于对比
+        outputs[parser] = rule.extract(html, parser=parser)
+
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            rule.extract(html, parser=parser)
+        elapsed = (time.perf_counter() - start_time) / repeat
+
+        tracemalloc.start()
+        rule.extract(html, parser=parser)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        report['parsers'][parser] = {
+            'ms_per_page': round(elapsed * 1000, 3),
+            'rows_per_second': round(len(outputs[parser]) / elapsed) if elapsed else None,
+            'peak_py_memory_kb': round(peak_memory / 1024, 1)
+        }
+
+    report['proxies'] = len(outputs['bs4'])
+    for parser in parsers:
+        if outputs[parser] != outputs['bs4']:
+            raise AssertionError(f"{parser} 的抽取结果与 bs4 不一致")
+        report['parsers'][parser]['speedup'] = round(
+            report['parsers']['bs4']['ms_per_page'] / report['parsers'][parser]['ms_per_page'], 2
+        )
+    return report
+
+def load_pages(specs: List[str]) -> List[Tuple[str, str, str]]:
+    """解析 规则名=页面文件 形式的参数，返回 (规则名, 文件名, 页面内容)"""
+    pages = []
+    for spec in specs:
+        name, _, path = spec.partition('=')
+        if name not in BUILTIN_RULES:
+            raise ValueError(f"未知的规则: {name}，可选: {', '.join(BUILTIN_RULES)}")
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append((name, path, f.read()))
+    return pages
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理列表解析基准测试")
+    parser.add_argument("--page", action="append", default=[],
+                        help="保存的页面，格式为 规则名=文件路径，可重复；不指定时按内置规则生成页面")
+    parser.add_argument("--rows", type=int, default=200, help="生成页面的行数")
+    parser.add_argument("--repeat", type=int, default=20, help="每个页面的重复解析次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+
+    args = parser.parse_args()
+
+    if not HAS_LXML:
+        logger.warning("未安装 lxml/cssselect，只能测试 bs4 后端")
+
+    if args.page:
+        pages = load_pages(args.page)
+    else:
+        pages = [
+            (name, f'synthetic:{args.rows}', synthesize_page(rules, args.rows, seed=args.seed))
+            for name, rules in BUILTIN_RULES.items()
+        ]
+
+    results = []
+    for name, source, html in pages:
+        report = benchmark_page(BUILTIN_RULES[name], html, repeat=args.repeat)
+        report.update({'rule': name, 'page': source})
+        results.append(report)
+        logger.info(f"{name} ({source}): {report['proxies']} 个代理，三种后端结果一致")
+
+    print("\n解析基准测试结果:")
+    print(json.dumps(results, indent=2, ensure_ascii=False))
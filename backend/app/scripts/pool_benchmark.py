@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+代理池内存基准测试脚本
+对比几种常见的内存表示在大量代理下的构建耗时、查找耗时和内存占用：
+- dicts:     字典列表 + "ip:port:protocol" 字符串键集合（原爬虫去重的做法）
+- tuple_map: (ip, port, protocol) 元组键 -> 元组值的字典（原流水线已知代理索引的做法）
+- int_set:   打包后的整数键集合（只去重，不带字段）
+- compact:   CompactProxyPool
+
+构建和查找耗时在未开启 tracemalloc 时测量，内存在单独的一轮中测量
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import gc
+import json
+import logging
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List, Dict, Tuple, Callable, Any
+from app.services.proxy_pool import CompactProxyPool, PROTOCOLS, pack_key
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COUNTRIES = ['中国', '美国', '日本', '德国', '俄罗斯', '巴西', None]
+
+def synthesize_proxies(count: int, seed: int = 42) -> List[Dict]:
+    """生成不重复的代理数据"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    proxies = []
+    seen = set()
+    while len(proxies) < count:
+        ip = f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+        port = rng.randint(1, 65535)
+        protocol = rng.choice(PROTOCOLS)
+        if (ip, port, protocol) in seen:
+            continue
+        seen.add((ip, port, protocol))
+        proxies.append({
+            'id': len(proxies) + 1,
+            'ip': ip,
+            'port': port,
+            'protocol': protocol,
+            'country': rng.choice(COUNTRIES),
+            'is_active': rng.random() < 0.3,
+            'success_rate': round(rng.uniform(0, 100), 2),
+            'quality_score': round(rng.uniform(0, 100), 2),
+            'fail_count': rng.randint(0, 10),
+            'last_check_time': now - timedelta(seconds=rng.randint(0, 7 * 24 * 3600))
+        })
+    return proxies
+
+def build_dicts(proxies: List[Dict]) -> Any:
+    rows = [dict(proxy) for proxy in proxies]
+    keys = {f"{proxy['ip']}:{proxy['port']}:{proxy['protocol']}" for proxy in proxies}
+    return rows, keys
+
+def build_tuple_map(proxies: List[Dict]) -> Any:
+    return {
+        (proxy['ip'], proxy['port'], proxy['protocol']): (proxy['id'], proxy['last_check_time'])
+        for proxy in proxies
+    }
+
+def build_int_set(proxies: List[Dict]) -> Any:
+    return {pack_key(proxy['ip'], proxy['port'], proxy['protocol']) for proxy in proxies}
+
+def build_compact(proxies: List[Dict]) -> Any:
+    pool = CompactProxyPool()
+    for proxy in proxies:
+        pool.add_key(
+            pack_key(proxy['ip'], proxy['port'], proxy['protocol']),
+            proxy_id=proxy['id'], country=proxy['country'], is_active=proxy['is_active'],
+            success_rate=proxy['success_rate'], quality_score=proxy['quality_score'],
+            fail_count=proxy['fail_count'], last_check_time=proxy['last_check_time']
+        )
+    pool.compact()
+    return pool
+
+# 名称 -> (构建函数, 按 (ip, port, protocol) 查找的函数)
+STRUCTURES: Dict[str, Tuple[Callable, Callable]] = {
+    'dicts': (build_dicts, lambda built, key: f'{key[0]}:{key[1]}:{key[2]}' in built[1]),
+    'tuple_map': (build_tuple_map, lambda built, key: built.get(key) is not None),
+    'int_set': (build_int_set, lambda built, key: pack_key(*key) in built),
+    'compact': (build_compact, lambda built, key: built.get(*key) is not None),
+}
+
+def benchmark(proxies: List[Dict], lookups: int = 100000, seed: int = 42) -> Dict[str, Dict]:
+    rng = random.Random(seed)
+    probes = [
+        (proxy['ip'], proxy['port'], proxy['protocol'])
+        for proxy in rng.sample(proxies, min(lookups, len(proxies)))
+    ]
+
+    report = {}
+    for name, (build, lookup) in STRUCTURES.items():
+        gc.collect()
+        start_time = time.perf_counter()
+        built = build(proxies)
+        build_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for probe in probes:
+            if not lookup(built, probe):
+                raise AssertionError(f"{name} 中缺少 {probe}")
+        lookup_seconds = time.perf_counter() - start_time
+        del built
+
+        gc.collect()
+        tracemalloc.start()
+        built = build(proxies)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del built
+
+        report[name] = {
+            'build_seconds': round(build_seconds, 2),
+            'lookup_us': round(lookup_seconds / len(probes) * 1e6, 2) if probes else None,
+            'memory_mb': round(memory / 1024 / 1024, 1),
+            'bytes_per_proxy': round(memory / len(proxies), 1) if proxies else None
+        }
+        logger.info(f"{name}: {report[name]}")
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理池内存基准测试")
+    parser.add_argument("--count", type=int, default=1000000, help="代理数量")
+    parser.add_argument("--lookups", type=int, default=100000, help="查找次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+
+    args = parser.parse_args()
+
+    proxies = synthesize_proxies(args.count, seed=args.seed)
+    logger.info(f"已生成 {len(proxies)} 个代理")
+    results = benchmark(proxies, lookups=args.lookups, seed=args.seed)
+
+    print("\n代理池基准测试结果:")
+    print(json.dumps(results, indent=2, ensure_ascii=False))
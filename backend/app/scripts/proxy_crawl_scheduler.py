@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+代理来源爬取调度脚本
+按 ProxyWebsite 的爬取间隔定时爬取到期的来源（带随机抖动），并根据每次新增的有效代理数
+自适应调整间隔：产出高的来源更频繁地爬取，没有产出的来源逐步放缓，连续失败时熔断退避
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import random
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple, Callable
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.scripts.proxy_crawler import ProxyCrawler
+from app.scripts.proxy_pipeline import ProxyPipeline
+from app.scripts.proxy_validator import ProxyValidator
+from app.services.proxy_service import ProxyWebsiteService, ProxyService, ProxySourcePageService
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CrawlScheduler:
+    def __init__(self, crawler: ProxyCrawler, validator: ProxyValidator,
+                 session_factory: Callable[[], Session] = SessionLocal, tick: int = 30,
+                 jitter: float = 0.1, high_yield: int = 20, failure_threshold: int = 3,
+                 max_backoff: int = 24 * 3600, min_factor: float = 0.25, max_factor: float = 8.0):
+        self.crawler = crawler
+        self.validator = validator
+        self.session_factory = session_factory
+        self.tick = tick  # 检查到期来源的周期(秒)
+        self.jitter = jitter  # 下次爬取时间的随机抖动比例，避免各来源同时到期
+        self.high_yield = high_yield  # 一次新增这么多有效代理视为高产出
+        self.failure_threshold = failure_threshold  # 连续失败达到该次数后熔断
+        self.max_backoff = max_backoff  # 熔断退避上限(秒)
+        # 自适应间隔的范围：crawl_interval * [min_factor, max_factor]
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self._stopped = False
+
+    def _is_due(self, site: Dict, now: datetime) -> bool:
+        if site['next_crawl_time'] is not None:
+            return site['next_crawl_time'] <= now
+        if site['last_crawl_time'] is None:
+            return True
+        interval = site['adaptive_interval'] or site['crawl_interval']
+        return site['last_crawl_time'] + timedelta(seconds=interval) <= now
+
+    def plan_next(self, site: Dict, outcome: Dict, now: datetime) -> Tuple[int, int, datetime]:
+        """根据本次爬取结果计算 (自适应间隔, 连续失败次数, 下次爬取时间)"""
+        base = site['crawl_interval'] or 3600
+        interval = site['adaptive_interval'] or base
+        failures = site['consecutive_failures'] or 0
+
+        if outcome['failed']:
+            failures += 1
+            if failures >= self.failure_threshold:
+                # 熔断：按连续失败次数指数退避，间隔本身保持不变，恢复后按原节奏爬取
+                delay = min(self.max_backoff, interval * 2 ** (failures - self.failure_threshold + 1))
+                logger.warning(f"{site['name']} 连续失败 {failures} 次，{int(delay)}s 后重试")
+            else:
+                delay = interval
+        else:
+            failures = 0
+            if outcome['new_valid'] >= self.high_yield:
+                interval *= 0.5
+            elif outcome['new_valid'] == 0:
+                interval *= 1.5
+            interval = int(min(base * self.max_factor, max(base * self.min_factor, interval)))
+            delay = interval
+
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return int(interval), failures, now + timedelta(seconds=delay)
+
+    def _load_websites(self, db: Session) -> List[Dict]:
+        return [
+            {
+                'id': site.id,
+                'name': site.name,
+                'crawl_rules': site.crawl_rules,
+                'crawl_interval': site.crawl_interval,
+                'adaptive_interval': site.adaptive_interval,
+                'consecutive_failures': site.consecutive_failures,
+                'last_crawl_time': site.last_crawl_time,
+                'next_crawl_time': site.next_crawl_time
+            }
+            for site in ProxyWebsiteService(db).get_crawlable_websites()
+        ]
+
+    def run_once(self) -> int:
+        """爬取当前到期的来源，返回爬取的来源数"""
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            due = [site for site in self._load_websites(db) if self._is_due(site, now)]
+            db.rollback()  # 结束只读事务，下次能看到新数据
+            if not due:
+                return 0
+            logger.info(f"到期来源: {', '.join(site['name'] for site in due)}")
+
+            pipeline = ProxyPipeline(self.crawler, self.validator, session_factory=self.session_factory)
+            pipeline.run(due)
+
+            now = datetime.utcnow()
+            website_service = ProxyWebsiteService(db)
+            counts = ProxyService(db).count_proxies_by_source([site['id'] for site in due])
+            for site in due:
+                crawl_stats = self.crawler.source_stats.get(site['id'], {'pages': 0, 'failed': 0})
+                yield_stats = pipeline.source_stats.get(site['id'], {'new_valid': 0})
+                outcome = {
+                    'failed': crawl_stats['pages'] == 0 or crawl_stats['failed'] == crawl_stats['pages'],
+                    'new_valid': yield_stats['new_valid']
+                }
+                if not outcome['failed']:
+                    total, valid = counts.get(site['id'], (0, 0))
+                    website_service.update_crawl_stats(site['id'], total, valid)
+
+                interval, failures, next_crawl_time = self.plan_next(site, outcome, now)
+                website_service.update_crawl_schedule(site['id'], interval, failures, next_crawl_time)
+                logger.info(
+                    f"{site['name']}: 新增有效 {outcome['new_valid']} 个，"
+                    f"{'失败' if outcome['failed'] else '成功'}，间隔 {interval}s，"
+                    f"下次 {next_crawl_time:%Y-%m-%d %H:%M:%S}"
+                )
+
+            ProxySourcePageService(db).save_page_cache(self.crawler.export_page_cache())
+            return len(due)
+        finally:
+            db.close()
+
+    def run(self):
+        """持续调度，直到调用 stop()"""
+        db = self.session_factory()
+        try:
+            self.crawler.load_page_cache(ProxySourcePageService(db).load_page_cache())
+        finally:
+            db.close()
+
+        while not self._stopped:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"调度出错: {e}")
+            time.sleep(self.tick)
+
+    def stop(self):
+        self._stopped = True
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理来源爬取调度")
+    parser.add_argument("--tick", type=int, default=30, help="检查到期来源的周期(秒)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="下次爬取时间的随机抖动比例")
+    parser.add_argument("--high-yield", type=int, default=20, help="一次新增多少有效代理视为高产出")
+    parser.add_argument("--failure-threshold", type=int, default=3, help="连续失败多少次后熔断")
+    parser.add_argument("--max-workers", type=int, default=50, help="验证线程数")
+
+    args = parser.parse_args()
+
+    scheduler = CrawlScheduler(
+        ProxyCrawler(), ProxyValidator(max_workers=args.max_workers),
+        tick=args.tick, jitter=args.jitter, high_yield=args.high_yield,
+        failure_threshold=args.failure_threshold
+    )
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        logger.info("爬取调度已停止")
+    finally:
+        scheduler.crawler.close()
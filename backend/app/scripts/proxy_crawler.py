@@ -4,296 +4,328 @@
 支持从多个免费代理网站爬取代理信息
 """
 
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
 import requests
-import re
 import time
-import random
-from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+import hashlib
+import threading
+import concurrent.futures
+from typing import List, Dict, Optional, Callable, Any, Tuple
+from urllib.parse import urljoin, urlparse
+from datetime import datetime
+from requests.adapters import HTTPAdapter
 import logging
+from app.core.rate_limit import TokenBucket
+from app.scripts.proxy_extractor import BUILTIN_RULES, compile_rule
+from app.services.proxy_pool import CompactProxyPool
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ProxyCrawler:
-    def __init__(self):
+    def __init__(self, max_workers: int = 16, host_rate: float = 0.5, host_burst: int = 1):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.timeout = 10
+        self.max_workers = max_workers
+        # 每个站点一个令牌桶：默认每2秒一个请求，替代原来的全局随机sleep；
+        # 令牌在提交页面之前由来源线程获取，抓取线程不会因限速而空等
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self._host_buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._page_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        # 每个页面的 ETag / Last-Modified / 内容哈希，用于条件请求和跳过未变化的页面
+        self.page_cache: Dict[str, Dict] = {}
+        self._stats_lock = threading.Lock()
+        self.fetch_stats = self._new_fetch_stats()
+        # 各来源最近一次爬取的页面数、失败页面数和代理数，键为网站id，内置来源（无id）为来源名
+        self.source_stats: Dict[Any, Dict[str, int]] = {}
+    
+    def close(self):
+        """关闭页面抓取线程池和HTTP会话"""
+        self._page_executor.shutdown(wait=True)
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _get_host_bucket(self, url: str) -> TokenBucket:
+        host = urlparse(url).hostname or ''
+        with self._buckets_lock:
+            bucket = self._host_buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.host_rate, capacity=self.host_burst)
+                self._host_buckets[host] = bucket
+            return bucket
+    
+    def _new_fetch_stats(self) -> Dict[str, int]:
+        return {
+            'fetched': 0,         # 下载并解析的页面
+            'not_modified': 0,    # 服务器返回304的页面
+            'unchanged': 0,       # 下载后内容哈希未变、跳过解析的页面
+            'failed': 0,
+            'bytes_downloaded': 0,
+            'bytes_saved': 0      # 因304而未下载的字节数（按上次的页面大小估算）
+        }
+    
+    def _add_fetch_stats(self, **counts):
+        with self._stats_lock:
+            for key, value in counts.items():
+                self.fetch_stats[key] += value
+    
+    def load_page_cache(self, entries: Dict[str, Dict]):
+        """载入上次保存的页面缓存，键为URL"""
+        self.page_cache.update(entries)
+    
+    def export_page_cache(self) -> Dict[str, Dict]:
+        """导出页面缓存，供持久化"""
+        return dict(self.page_cache)
+    
+    def _fetch(self, url: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """抓取页面，返回 (页面内容, 新的缓存项)，页面未变化时内容为 None
+
+        调用前须已获取该站点的令牌（见 _crawl_pages）；
+        新的缓存项由调用方在页面处理成功后再写入 page_cache，
+        解析或下游处理失败时保留旧的缓存项，下次仍会重新抓取该页面
+        """
+        cached = self.page_cache.get(url)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
         
-    def crawl_kuaidaili(self) -> List[Dict]:
-        """爬取快代理"""
+        response = self.session.get(url, timeout=self.timeout, headers=headers)
+        now = datetime.utcnow()
+        if response.status_code == 304 and cached:
+            cached['last_fetch_time'] = now
+            self._add_fetch_stats(not_modified=1, bytes_saved=cached.get('content_length') or 0)
+            return None, None
+        response.raise_for_status()
+        
+        content = response.content
+        content_hash = hashlib.sha256(content).hexdigest()
+        unchanged = bool(cached) and cached.get('content_hash') == content_hash
+        entry = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': content_hash,
+            'content_length': len(content),
+            'last_fetch_time': now,
+            'last_changed_time': cached.get('last_changed_time') if unchanged else now
+        }
+        if unchanged:
+            self._add_fetch_stats(unchanged=1, bytes_downloaded=len(content))
+            return None, entry
+        self._add_fetch_stats(fetched=1, bytes_downloaded=len(content))
+        return response.text, entry
+    
+    def _crawl_pages(self, name: str, urls: List[str], parse_page: Callable[[str], List[Dict]],
+                     stats_key: Any = None) -> List[Dict]:
+        """并发抓取同一来源的多个页面，单页失败不影响其他页面
+
+        每个页面在当前（来源）线程中取得站点令牌后才提交到共享的抓取线程池，
+        被限速的站点只阻塞自己的来源线程，不会占住抓取线程拖慢其他站点
+        """
+        failed_urls = []
+        
+        def crawl_page(url: str) -> List[Dict]:
+            try:
+                html, entry = self._fetch(url)
+                page_proxies = parse_page(html) if html is not None else []
+                # 页面处理成功后才记录新的缓存项
+                if entry is not None:
+                    self.page_cache[url] = entry
+                return page_proxies
+            except Exception as e:
+                failed_urls.append(url)
+                self._add_fetch_stats(failed=1)
+                logger.error(f"爬取{name} {url} 失败: {e}")
+                return []
+        
+        futures = []
+        for url in urls:
+            self._get_host_bucket(url).acquire()
+            futures.append(self._page_executor.submit(crawl_page, url))
         proxies = []
-        try:
-            urls = [
-                'https://www.kuaidaili.com/free/inha/',
-                'https://www.kuaidaili.com/free/intr/',
-                'https://www.kuaidaili.com/free/outha/'
-            ]
-            
-            for url in urls:
-                try:
-                    response = self.session.get(url, timeout=self.timeout)
-                    response.raise_for_status()
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    rows = soup.select('tbody tr')
-                    for row in rows:
-                        cols = row.select('td')
-                        if len(cols) >= 7:
-                            ip = cols[0].text.strip()
-                            port = cols[1].text.strip()
-                            anonymity = cols[2].text.strip()
-                            protocol = cols[3].text.strip().lower()
-                            country = cols[4].text.strip()
-                            region = cols[5].text.strip()
-                            speed = cols[6].text.strip()
-                            
-                            if self._is_valid_ip(ip) and self._is_valid_port(port):
-                                proxies.append({
-                                    'ip': ip,
-                                    'port': int(port),
-                                    'protocol': protocol,
-                                    'country': country,
-                                    'region': region,
-                                    'anonymity': self._normalize_anonymity(anonymity),
-                                    'speed': self._parse_speed(speed)
-                                })
-                    
-                    time.sleep(random.uniform(1, 3))  # 随机延迟
-                    
-                except Exception as e:
-                    logger.error(f"爬取快代理 {url} 失败: {e}")
-                    continue
-                    
-        except Exception as e:
-            logger.error(f"爬取快代理失败: {e}")
-            
+        for future in futures:
+            proxies.extend(future.result())
+        with self._stats_lock:
+            self.source_stats[name if stats_key is None else stats_key] = {'pages': len(urls), 'failed': len(failed_urls), 'proxies': len(proxies)}
+        return proxies
+        
+    def crawl_source(self, name: str, rules: Dict[str, Any], source_website_id: Optional[int] = None,
+                     on_page: Optional[Callable[[List[Dict]], None]] = None) -> List[Dict]:
+        """按声明式规则爬取一个代理源
+
+        on_page 在每个页面解析完成后立即以该页的代理调用（在抓取线程中执行），
+        下游可以不等整个来源爬完就开始处理
+        """
+        rule = compile_rule(rules)
+        
+        def parse_page(html: str) -> List[Dict]:
+            page_proxies = rule.extract(html)
+            if source_website_id is not None:
+                for proxy in page_proxies:
+                    proxy['source_website_id'] = source_website_id
+            if on_page and page_proxies:
+                on_page(page_proxies)
+            return page_proxies
+        
+        proxies = self._crawl_pages(name, rule.urls, parse_page, stats_key=source_website_id)
+        if source_website_id is not None:
+            for url in rule.urls:
+                if url in self.page_cache:
+                    self.page_cache[url]['website_id'] = source_website_id
         return proxies
     
+    def crawl_kuaidaili(self) -> List[Dict]:
+        """爬取快代理"""
+        return self.crawl_source('快代理', BUILTIN_RULES['快代理'])
+    
     def crawl_89ip(self) -> List[Dict]:
         """爬取89IP代理"""
-        proxies = []
-        try:
-            urls = [
-                'http://www.89ip.cn/index_1.html',
-                'http://www.89ip.cn/index_2.html',
-                'http://www.89ip.cn/index_3.html'
-            ]
-            
-            for url in urls:
-                try:
-                    response = self.session.get(url, timeout=self.timeout)
-                    response.raise_for_status()
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    rows = soup.select('tbody tr')
-                    for row in rows:
-                        cols = row.select('td')
-                        if len(cols) >= 4:
-                            ip = cols[0].text.strip()
-                            port = cols[1].text.strip()
-                            region = cols[2].text.strip()
-                            isp = cols[3].text.strip()
-                            
-                            if self._is_valid_ip(ip) and self._is_valid_port(port):
-                                proxies.append({
-                                    'ip': ip,
-                                    'port': int(port),
-                                    'protocol': 'http',
-                                    'country': '中国',
-                                    'region': region,
-                                    'isp': isp,
-                                    'anonymity': 'unknown'
-                                })
-                    
-                    time.sleep(random.uniform(1, 2))
-                    
-                except Exception as e:
-                    logger.error(f"爬取89IP {url} 失败: {e}")
-                    continue
-                    
-        except Exception as e:
-            logger.error(f"爬取89IP失败: {e}")
-            
-        return proxies
+        return self.crawl_source('89IP', BUILTIN_RULES['89IP'])
     
     def crawl_66ip(self) -> List[Dict]:
         """爬取66IP代理"""
-        proxies = []
-        try:
-            url = 'http://www.66ip.cn/mo.php?tqsl=100'
-            response = self.session.get(url, timeout=self.timeout)
-            response.raise_for_status()
-            
-            # 使用正则表达式提取IP和端口
-            pattern = r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(\d+)'
-            matches = re.findall(pattern, response.text)
-            
-            for ip, port in matches:
-                if self._is_valid_ip(ip) and self._is_valid_port(port):
-                    proxies.append({
-                        'ip': ip,
-                        'port': int(port),
-                        'protocol': 'http',
-                        'country': '中国',
-                        'region': '未知',
-                        'anonymity': 'unknown'
-                    })
-                    
-        except Exception as e:
-            logger.error(f"爬取66IP失败: {e}")
-            
-        return proxies
+        return self.crawl_source('66IP', BUILTIN_RULES['66IP'])
     
     def crawl_xicidaili(self) -> List[Dict]:
         """爬取西刺代理"""
-        proxies = []
-        try:
-            urls = [
-                'http://www.xicidaili.com/nn/',
-                'http://www.xicidaili.com/nt/',
-                'http://www.xicidaili.com/wn/'
-            ]
-            
-            for url in urls:
-                try:
-                    response = self.session.get(url, timeout=self.timeout)
-                    response.raise_for_status()
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    rows = soup.select('#ip_list tr')
-                    for row in rows[1:]:  # 跳过表头
-                        cols = row.select('td')
-                        if len(cols) >= 7:
-                            ip = cols[1].text.strip()
-                            port = cols[2].text.strip()
-                            protocol = cols[5].text.strip().lower()
-                            country = cols[3].text.strip()
-                            region = cols[4].text.strip()
-                            speed = cols[6].text.strip()
-                            
-                            if self._is_valid_ip(ip) and self._is_valid_port(port):
-                                proxies.append({
-                                    'ip': ip,
-                                    'port': int(port),
-                                    'protocol': protocol,
-                                    'country': country,
-                                    'region': region,
-                                    'anonymity': 'unknown',
-                                    'speed': self._parse_speed(speed)
-                                })
-                    
-                    time.sleep(random.uniform(2, 4))
-                    
-                except Exception as e:
-                    logger.error(f"爬取西刺代理 {url} 失败: {e}")
-                    continue
-                    
-        except Exception as e:
-            logger.error(f"爬取西刺代理失败: {e}")
-            
-        return proxies
+        return self.crawl_source('西刺代理', BUILTIN_RULES['西刺代理'])
     
-    def _is_valid_ip(self, ip: str) -> bool:
-        """验证IP地址格式"""
-        try:
-            parts = ip.split('.')
-            if len(parts) != 4:
-                return False
-            for part in parts:
-                if not 0 <= int(part) <= 255:
-                    return False
-            return True
-        except:
-            return False
-    
-    def _is_valid_port(self, port: str) -> bool:
-        """验证端口号格式"""
-        try:
-            port_num = int(port)
-            return 1 <= port_num <= 65535
-        except:
-            return False
-    
-    def _normalize_anonymity(self, anonymity: str) -> str:
-        """标准化匿名度"""
-        anonymity = anonymity.lower()
-        if '高匿' in anonymity or 'elite' in anonymity:
-            return 'elite'
-        elif '匿名' in anonymity or 'anonymous' in anonymity:
-            return 'anonymous'
-        elif '透明' in anonymity or 'transparent' in anonymity:
-            return 'transparent'
-        else:
-            return 'unknown'
-    
-    def _parse_speed(self, speed_str: str) -> Optional[float]:
-        """解析速度字符串"""
-        try:
-            # 提取数字
-            numbers = re.findall(r'\d+\.?\d*', speed_str)
-            if numbers:
-                return float(numbers[0])
-        except:
-            pass
-        return None
-    
-    def crawl_all(self) -> List[Dict]:
-        """爬取所有代理源"""
+    def crawl_all(self, websites: Optional[List[Dict]] = None,
+                  on_page: Optional[Callable[[List[Dict]], None]] = None) -> List[Dict]:
+        """并发爬取所有代理源
+
+        websites 为数据库中配置了抓取规则的网站（含 id、name、crawl_rules），
+        未提供时使用内置规则。各来源同时开始，页面也并发抓取，
+        礼貌性由每个站点的令牌桶保证，总耗时约等于最慢的单个来源；
+        on_page 见 crawl_source
+        """
         all_proxies = []
+        start_time = time.time()
+        self.fetch_stats = self._new_fetch_stats()
+        self.source_stats = {}
         
         logger.info("开始爬取代理...")
         
-        # 爬取各个代理源
-        sources = [
-            ('快代理', self.crawl_kuaidaili),
-            ('89IP', self.crawl_89ip),
-            ('66IP', self.crawl_66ip),
-            ('西刺代理', self.crawl_xicidaili)
-        ]
+        if websites is None:
+            sources = [(name, rules, None) for name, rules in BUILTIN_RULES.items()]
+        else:
+            sources = [(site['name'], site['crawl_rules'], site['id']) for site in websites]
+        if not sources:
+            logger.info("没有可爬取的代理源")
+            return []
         
-        for name, crawler_func in sources:
-            try:
-                logger.info(f"正在爬取 {name}...")
-                proxies = crawler_func()
-                logger.info(f"{name} 爬取到 {len(proxies)} 个代理")
-                all_proxies.extend(proxies)
-                time.sleep(random.uniform(2, 5))  # 源之间延迟
-            except Exception as e:
-                logger.error(f"爬取 {name} 失败: {e}")
-                continue
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            future_to_name = {
+                executor.submit(self.crawl_source, name, rules, website_id, on_page): name
+                for name, rules, website_id in sources
+            }
+            for future in concurrent.futures.as_completed(future_to_name):
+                name = future_to_name[future]
+                try:
+                    proxies = future.result()
+                    logger.info(f"{name} 爬取到 {len(proxies)} 个代理")
+                    all_proxies.extend(proxies)
+                except Exception as e:
+                    logger.error(f"爬取 {name} 失败: {e}")
         
         # 去重
         unique_proxies = self._deduplicate_proxies(all_proxies)
-        logger.info(f"总共爬取到 {len(all_proxies)} 个代理，去重后 {len(unique_proxies)} 个")
+        logger.info(
+            f"总共爬取到 {len(all_proxies)} 个代理，去重后 {len(unique_proxies)} 个，"
+            f"耗时 {time.time() - start_time:.1f}s"
+        )
+        stats = self.fetch_stats
+        logger.info(
+            f"页面抓取：解析 {stats['fetched']} 个，未变化跳过 {stats['not_modified'] + stats['unchanged']} 个"
+            f"（304: {stats['not_modified']}，内容相同: {stats['unchanged']}），失败 {stats['failed']} 个，"
+            f"下载 {stats['bytes_downloaded']} 字节，节省 {stats['bytes_saved']} 字节"
+        )
         
         return unique_proxies
     
     def _deduplicate_proxies(self, proxies: List[Dict]) -> List[Dict]:
-        """去重代理"""
-        seen = set()
+        """按 (ip, port, protocol) 去重，键打包为整数存放在紧凑代理池中；无法打包的代理按元组去重后保留"""
+        seen = CompactProxyPool()
+        seen_other = set()
         unique_proxies = []
         
         for proxy in proxies:
-            key = f"{proxy['ip']}:{proxy['port']}"
-            if key not in seen:
-                seen.add(key)
+            try:
+                added = seen.add(proxy['ip'], proxy['port'], proxy['protocol'])
+            except ValueError:
+                key = (proxy['ip'], proxy['port'], proxy['protocol'])
+                added = key not in seen_other
+                seen_other.add(key)
+            if added:
                 unique_proxies.append(proxy)
         
+        if seen_other:
+            logger.info(f"{len(seen_other)} 个代理的地址或协议无法打包为整数键，按元组去重")
         return unique_proxies
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理爬取")
+    parser.add_argument("--from-db", action="store_true", help="使用数据库中启用且配置了抓取规则的网站")
+    parser.add_argument("--save", action="store_true", help="将爬取结果批量写入代理表（已存在的代理只补全空缺字段）")
+    args = parser.parse_args()
+
     crawler = ProxyCrawler()
-    proxies = crawler.crawl_all()
+    websites = None
+    if args.from_db:
+        from app.core.database import SessionLocal
+        from app.services.proxy_service import ProxyWebsiteService, ProxySourcePageService
+
+        db = SessionLocal()
+        try:
+            websites = [
+                {'id': site.id, 'name': site.name, 'crawl_rules': site.crawl_rules}
+                for site in ProxyWebsiteService(db).get_crawlable_websites()
+            ]
+            crawler.load_page_cache(ProxySourcePageService(db).load_page_cache())
+        finally:
+            db.close()
+
+    with crawler:
+        proxies = crawler.crawl_all(websites)
+
+    if args.from_db or args.save:
+        from app.core.database import SessionLocal
+        from app.services.proxy_service import ProxyService, ProxySourcePageService
+
+        db = SessionLocal()
+        try:
+            if args.from_db:
+                ProxySourcePageService(db).save_page_cache(crawler.export_page_cache())
+            if args.save:
+                saved = ProxyService(db).bulk_upsert_proxies(proxies)
+                print(f"已写入 {saved} 个代理")
+        finally:
+            db.close()
     
     print(f"\n爬取结果:")
     for i, proxy in enumerate(proxies[:10]):  # 只显示前10个
-        print(f"{i+1}. {proxy['ip']}:{proxy['port']} ({proxy['protocol']}) - {proxy['country']} {proxy['region']}")
+        print(f"{i+1}. {proxy['ip']}:{proxy['port']} ({proxy['protocol']}) - {proxy.get('country', '')} {proxy.get('region', '')}")
     
     if len(proxies) > 10:
         print(f"... 还有 {len(proxies) - 10} 个代理")
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+代理列表通用抽取引擎
+根据 ProxyWebsite.crawl_rules 中的声明式规则（URL模板、分页、行选择器或正则、列映射）
+从页面中抽取代理，规则编译一次后缓存复用
+
+表格解析有三种后端：
+- bs4:    BeautifulSoup + html.parser，兼容性最好
+- lxml:   lxml 建树 + 预编译的CSS选择器，默认使用
+- stream: lxml iterparse 逐行解析，处理完的行立即释放，不保留整棵树；
+          行选择器只能依赖祖先元素（不支持 :nth-child、兄弟选择器等位置相关的写法）
+"""
+
+import io
+import re
+import json
+import functools
+from typing import List, Dict, Optional, Any, Iterator
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    from lxml.cssselect import CSSSelector
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# 规则示例：
+# {
+#     "urls": ["https://www.kuaidaili.com/free/inha/{page}/"],
+#     "pages": {"start": 1, "end": 3},
+#     "row_selector": "tbody tr",
+#     "skip_rows": 0,
+#     "columns": {"ip": 0, "port": 1, "anonymity": 2, "protocol": 3},
+#     "defaults": {"protocol": "http", "country": "中国"}
+# }
+# 不使用表格的页面可用 "regex" 代替 "row_selector"，用命名分组 ip / port / ... 对应字段
+
+PROXY_FIELDS = ['ip', 'port', 'protocol', 'country', 'region', 'city', 'isp', 'anonymity', 'speed']
+
+PARSERS = ('bs4', 'lxml', 'stream')
+DEFAULT_PARSER = 'lxml' if HAS_LXML else 'bs4'
+
+if HAS_LXML:
+    # 页面统一按UTF-8字节交给lxml，避免页面内的 charset 声明与已解码的文本冲突
+    _HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+    _CELL_XPATH = etree.XPath('.//td')
+    _TEXT_XPATH = etree.XPath('string()')
+
+# 内置来源的规则，数据库中未配置规则时使用
+BUILTIN_RULES = {
+    '快代理': {
+        'urls': [
+            'https://www.kuaidaili.com/free/inha/',
+            'https://www.kuaidaili.com/free/intr/',
+            'https://www.kuaidaili.com/free/outha/'
+        ],
+        'row_selector': 'tbody tr',
+        'columns': {'ip': 0, 'port': 1, 'anonymity': 2, 'protocol': 3, 'country': 4, 'region': 5, 'speed': 6},
+        'min_columns': 7
+    },
+    '89IP': {
+        'urls': ['http://www.89ip.cn/index_{page}.html'],
+        'pages': {'start': 1, 'end': 3},
+        'row_selector': 'tbody tr',
+        'columns': {'ip': 0, 'port': 1, 'region': 2, 'isp': 3},
+        'defaults': {'protocol': 'http', 'country': '中国', 'anonymity': 'unknown'}
+    },
+    '66IP': {
+        'urls': ['http://www.66ip.cn/mo.php?tqsl=100'],
+        'regex': r'(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(?P<port>\d+)',
+        'defaults': {'protocol': 'http', 'country': '中国', 'region': '未知', 'anonymity': 'unknown'}
+    },
+    '西刺代理': {
+        'urls': [
+            'http://www.xicidaili.com/nn/',
+            'http://www.xicidaili.com/nt/',
+            'http://www.xicidaili.com/wn/'
+        ],
+        'row_selector': '#ip_list tr',
+        'skip_rows': 1,  # 跳过表头
+        'columns': {'ip': 1, 'port': 2, 'country': 3, 'region': 4, 'protocol': 5, 'speed': 6},
+        'min_columns': 7,
+        'defaults': {'anonymity': 'unknown'}
+    }
+}
+
+def is_valid_ip(ip: str) -> bool:
+    """验证IP地址格式"""
+    try:
+        parts = ip.split('.')
+        if len(parts) != 4:
+            return False
+        for part in parts:
+            if not 0 <= int(part) <= 255:
+                return False
+        return True
+    except:
+        return False
+
+def is_valid_port(port: str) -> bool:
+    """验证端口号格式"""
+    try:
+        port_num = int(port)
+        return 1 <= port_num <= 65535
+    except:
+        return False
+
+def normalize_anonymity(anonymity: str) -> str:
+    """标准化匿名度"""
+    anonymity = anonymity.lower()
+    if '高匿' in anonymity or 'elite' in anonymity:
+        return 'elite'
+    elif '匿名' in anonymity or 'anonymous' in anonymity:
+        return 'anonymous'
+    elif '透明' in anonymity or 'transparent' in anonymity:
+        return 'transparent'
+    else:
+        return 'unknown'
+
+def parse_speed(speed_str: str) -> Optional[float]:
+    """解析速度字符串"""
+    try:
+        # 提取数字
+        numbers = re.findall(r'\d+\.?\d*', speed_str)
+        if numbers:
+            return float(numbers[0])
+    except:
+        pass
+    return None
+
+class CompiledRule:
+    """编译后的抓取规则：展开URL、预编译正则、固定列映射"""
+
+    def __init__(self, rules: Dict[str, Any]):
+        self.urls = self._expand_urls(rules)
+        self.row_selector = rules.get('row_selector')
+        self.regex = re.compile(rules['regex']) if rules.get('regex') else None
+        if not self.row_selector and not self.regex:
+            raise ValueError("抓取规则需要 row_selector 或 regex")
+
+        self.parser = rules.get('parser', DEFAULT_PARSER)
+        if self.parser not in PARSERS:
+            raise ValueError(f"未知的解析后端: {self.parser}")
+        if not HAS_LXML:
+            self.parser = 'bs4'
+        self._row_css = CSSSelector(self.row_selector) if HAS_LXML and self.row_selector else None
+
+        self.skip_rows = rules.get('skip_rows', 0)
+        self.columns = [
+            (field, index) for field, index in (rules.get('columns') or {}).items()
+            if field in PROXY_FIELDS
+        ]
+        if self.row_selector and not any(field == 'ip' for field, _ in self.columns):
+            raise ValueError("抓取规则的 columns 必须包含 ip")
+        self.min_columns = rules.get('min_columns') or (max(index for _, index in self.columns) + 1 if self.columns else 0)
+        self.defaults = {
+            field: value for field, value in (rules.get('defaults') or {}).items()
+            if field in PROXY_FIELDS
+        }
+
+    def _expand_urls(self, rules: Dict[str, Any]) -> List[str]:
+        """按分页配置展开URL模板"""
+        templates = rules.get('urls') or []
+        pages = rules.get('pages')
+        if not pages:
+            return list(templates)
+        page_numbers = range(pages.get('start', 1), pages['end'] + 1, pages.get('step', 1))
+        return [template.format(page=page) for template in templates for page in page_numbers]
+
+    def extract(self, html: str, parser: Optional[str] = None) -> List[Dict]:
+        """从页面中抽取代理，parser 可临时覆盖规则中的解析后端"""
+        parser = parser or self.parser
+        if self.regex:
+            records = (match.groupdict() for match in self.regex.finditer(html))
+        elif parser == 'lxml' and self._row_css is not None:
+            records = self._extract_rows_lxml(html)
+        elif parser == 'stream' and self._row_css is not None:
+            records = self._extract_rows_stream(html)
+        else:
+            records = self._extract_rows_bs4(html)
+
+        proxies = []
+        for record in records:
+            proxy = self.build_proxy(record)
+            if proxy:
+                proxies.append(proxy)
+        return proxies
+
+    def _extract_rows_bs4(self, html: str) -> Iterator[Dict[str, str]]:
+        soup = BeautifulSoup(html, 'html.parser')
+        rows = soup.select(self.row_selector)
+        for row in rows[self.skip_rows:]:
+            cols = row.select('td')
+            if len(cols) >= self.min_columns:
+                yield {field: cols[index].text.strip() for field, index in self.columns}
+
+    def _extract_rows_lxml(self, html: str) -> Iterator[Dict[str, str]]:
+        if not html.strip():
+            return
+        root = lxml_html.document_fromstring(html.encode('utf-8'), parser=_HTML_PARSER)
+        rows = self._row_css(root)
+        for row in rows[self.skip_rows:]:
+            cols = _CELL_XPATH(row)
+            if len(cols) >= self.min_columns:
+                yield {field: _TEXT_XPATH(cols[index]).strip() for field, index in self.columns}
+
+    def _extract_rows_stream(self, html: str) -> Iterator[Dict[str, str]]:
+        if not html.strip():
+            return
+        context = etree.iterparse(
+            io.BytesIO(html.encode('utf-8')), events=('end',), tag='tr',
+            html=True, encoding='utf-8', recover=True
+        )
+        matched = 0
+        pending = set()
+        for _, row in context:
+            # 解析器会预读一段内容，一次选择器匹配即可覆盖已读入的所有行；
+            # 之前的行都已删除，所以每次匹配只涉及新读入的部分
+            if row not in pending:
+                pending = set(self._row_css(row.getroottree().getroot()))
+            if row in pending:
+                pending.discard(row)
+                matched += 1
+                if matched > self.skip_rows:
+                    cols = _CELL_XPATH(row)
+                    if len(cols) >= self.min_columns:
+                        yield {field: _TEXT_XPATH(cols[index]).strip() for field, index in self.columns}
+            # 释放已处理的行，以及各级祖先之前已解析完的兄弟节点，
+            # 残留的树只剩当前行到根的一条路径
+            row.clear()
+            node = row
+            while node.getparent() is not None:
+                parent = node.getparent()
+                while node.getprevious() is not None:
+                    del parent[0]
+                node = parent
+
+    def build_proxy(self, record: Dict[str, Optional[str]]) -> Optional[Dict]:
+        """把抽取到的原始字段转换为代理字典，IP或端口非法时返回 None"""
+        ip = (record.get('ip') or '').strip()
+        port = (record.get('port') or '').strip()
+        if not (is_valid_ip(ip) and is_valid_port(port)):
+            return None
+
+        proxy = dict(self.defaults)
+        for field, value in record.items():
+            if value is not None and field in PROXY_FIELDS:
+                proxy[field] = value.strip()
+        proxy['ip'] = ip
+        proxy['port'] = int(port)
+        proxy['protocol'] = (proxy.get('protocol') or 'http').lower()
+        # 正则的可选分组未匹配时值为 None，与表格中的空单元格一样按空字符串处理
+        if 'anonymity' in record:
+            proxy['anonymity'] = normalize_anonymity(proxy.get('anonymity') or '')
+        if 'speed' in record:
+            proxy['speed'] = parse_speed(proxy.get('speed') or '')
+        return proxy
+
+@functools.lru_cache(maxsize=256)
+def _compile_rule_cached(rules_json: str) -> CompiledRule:
+    return CompiledRule(json.loads(rules_json))
+
+def compile_rule(rules: Dict[str, Any]) -> CompiledRule:
+    """编译规则，内容相同的规则只编译一次"""
+    return _compile_rule_cached(json.dumps(rules, sort_keys=True, ensure_ascii=False))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+代理验证回显服务
+独立运行的轻量级 judge 服务，返回来源IP和请求头，供代理验证器离线或内网使用
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+from app.services.judge_service import build_echo_payload, build_ip_payload
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class JudgeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持keep-alive
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        client_ip = self.client_address[0]
+        if parts.path in ('/get', '/'):
+            host = self.headers.get('Host', '')
+            url = self.path if parts.scheme else f"http://{host}{self.path}"
+            payload = build_echo_payload(client_ip, self.headers, url, dict(parse_qsl(parts.query)))
+        elif parts.path == '/ip':
+            payload = build_ip_payload(client_ip)
+        else:
+            self.send_error(404)
+            return
+
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 大批量验证时不逐条记录访问日志
+        pass
+
+def create_judge_server(host: str = '0.0.0.0', port: int = 8001) -> ThreadingHTTPServer:
+    """创建回显服务（调用方负责 serve_forever / shutdown）"""
+    server = ThreadingHTTPServer((host, port), JudgeRequestHandler)
+    server.daemon_threads = True
+    return server
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理验证回显服务")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=8001, help="监听端口")
+
+    args = parser.parse_args()
+
+    server = create_judge_server(args.host, args.port)
+    logger.info(f"回显服务已启动: http://{args.host}:{args.port}/get")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+代理爬取-验证流水线
+爬虫每解析完一个页面就把新代理放入有界队列，验证线程同时从队列中取出验证，结果分批写库；
+队列满时抓取线程阻塞，形成背压。已知且最近检测过的代理在入队前丢弃
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import queue
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Iterator, Set
+from app.core.database import SessionLocal
+from app.scripts.proxy_crawler import ProxyCrawler
+from app.scripts.proxy_validator import ProxyValidator
+from app.services.proxy_service import ProxyService, ValidationResultWriter
+from app.services.proxy_pool import CompactProxyPool, ProxyKey, proxy_key
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 队列结束标记
+_DONE = object()
+
+class ProxyPipeline:
+    def __init__(self, crawler: ProxyCrawler, validator: ProxyValidator, session_factory=SessionLocal,
+                 queue_size: int = 2000, recheck_interval: int = 3600, batch_size: int = 200):
+        self.crawler = crawler
+        self.validator = validator
+        self.session_factory = session_factory
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        # 写库跟不上时结果队列也会满，验证线程随之阻塞
+        self.results: queue.Queue = queue.Queue(maxsize=queue_size)
+        # 在这段时间内检测过的已知代理不再重复验证
+        self.recheck_interval = recheck_interval
+        self.batch_size = batch_size
+
+        # 已知代理和本次已见过的代理都以打包后的整数键存放在紧凑代理池中，
+        # 无法打包的代理（协议写法不规范、IP带前导零等）按元组键另存，照常验证入库
+        self._known = CompactProxyPool()
+        self._seen = CompactProxyPool()
+        self._seen_other: Set[ProxyKey] = set()
+        self._seen_lock = threading.Lock()
+        # 新代理在验证期间保留爬取到的元数据，验证有效后入库
+        self._discovered: Dict[ProxyKey, Dict] = {}
+        self._new_valid: List[Dict] = []
+        # 每个代理来自哪个网站，用于按来源统计产出
+        self._sources: Dict[ProxyKey, Optional[int]] = {}
+        self.source_stats: Dict[Optional[int], Dict[str, int]] = {}
+        self.stats = {
+            'discovered': 0,
+            'duplicate': 0,
+            'unpackable': 0,  # 无法打包为整数键、按元组去重的代理数
+            'skipped_recent': 0,
+            'queued': 0,
+            'validated': 0,
+            'valid': 0,
+            'inserted': 0,
+            'updated': 0,
+            'first_valid_after': None,
+            'producer_blocked': 0.0  # 抓取线程因队列满而等待的总秒数
+        }
+
+    def _enqueue_page(self, proxies: List[Dict]):
+        """on_page 回调：去重、过滤最近检测过的代理后放入队列（队列满时阻塞）"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.recheck_interval)
+        accepted = []
+        with self._seen_lock:
+            for proxy in proxies:
+                source_stats = self._source_stats(proxy.get('source_website_id'))
+                self.stats['discovered'] += 1
+                source_stats['discovered'] += 1
+                key = proxy_key(proxy['ip'], proxy['port'], proxy['protocol'])
+                if isinstance(key, int):
+                    added = self._seen.add_key(key)
+                else:
+                    added = key not in self._seen_other
+                    if added:
+                        self._seen_other.add(key)
+                        self.stats['unpackable'] += 1
+                if not added:
+                    self.stats['duplicate'] += 1
+                    continue
+
+                # 已知代理池只收录可打包的代理，其余视为新代理，入库时按 (ip, port, protocol) 合并
+                known = self._known.get_key(key) if isinstance(key, int) else None
+                if known:
+                    if known.last_check_time and known.last_check_time >= cutoff:
+                        self.stats['skipped_recent'] += 1
+                        continue
+                    proxy['id'] = known.id
+                else:
+                    self._discovered[key] = proxy
+                    source_stats['new'] += 1
+                self._sources[key] = proxy.get('source_website_id')
+                accepted.append(proxy)
+
+        for proxy in accepted:
+            start_time = time.time()
+            self.queue.put(proxy)
+            with self._seen_lock:
+                self.stats['queued'] += 1
+                self.stats['producer_blocked'] += time.time() - start_time
+
+    def _source_stats(self, website_id: Optional[int]) -> Dict[str, int]:
+        stats = self.source_stats.get(website_id)
+        if stats is None:
+            stats = {'discovered': 0, 'new': 0, 'validated': 0, 'valid': 0, 'new_valid': 0}
+            self.source_stats[website_id] = stats
+        return stats
+
+    def _produce(self, websites: Optional[List[Dict]]):
+        try:
+            self.crawler.crawl_all(websites, on_page=self._enqueue_page)
+        except Exception as e:
+            logger.error(f"爬取失败: {e}")
+        finally:
+            self.queue.put(_DONE)
+
+    def _validate_worker(self):
+        """验证线程：从队列逐个取出代理验证，结果放入结果队列"""
+        while True:
+            proxy = self.queue.get()
+            if proxy is _DONE:
+                self.queue.put(_DONE)  # 让其他验证线程也能退出
+                self.results.put(_DONE)
+                return
+            try:
+                result = self.validator.validate_proxy(proxy)
+            except Exception as e:
+                logger.error(f"验证代理 {proxy['ip']}:{proxy['port']} 时出错: {e}")
+                result = self.validator._error_result(proxy, str(e))
+            result.pop('test_results', None)
+            self.results.put(result)
+
+    def _iter_results(self, workers: int) -> Iterator[Dict]:
+        finished = 0
+        while finished < workers:
+            result = self.results.get()
+            if result is _DONE:
+                finished += 1
+                continue
+            yield result
+
+    def _flush_new(self, service: ProxyService, writer: ValidationResultWriter):
+        """新发现的有效代理入库，再交给写入器合并健康统计"""
+        if not self._new_valid:
+            return
+        batch, self._new_valid = self._new_valid, []
+        proxies = []
+        for result in batch:
+            proxy = self._discovered.pop(proxy_key(result['ip'], result['port'], result['protocol']))
+            proxies.append({**proxy, 'anonymity': result['anonymity']})
+        for result, proxy_id in zip(batch, service.insert_discovered_proxies(proxies)):
+            result['proxy_id'] = proxy_id
+            writer.write(result)
+        self.stats['inserted'] += len(batch)
+
+    def run(self, websites: Optional[List[Dict]] = None) -> Dict:
+        """运行一次完整的爬取+验证，返回统计信息"""
+        start_time = time.time()
+        db = self.session_factory()
+        try:
+            service = ProxyService(db)
+            self._known = service.load_proxy_pool()
+            logger.info(f"已载入 {len(self._known)} 个已知代理")
+
+            self.validator._ensure_origin_ip()
+            workers = [
+                threading.Thread(target=self._validate_worker, daemon=True)
+                for _ in range(self.validator.max_workers)
+            ]
+            for worker in workers:
+                worker.start()
+            producer = threading.Thread(target=self._produce, args=(websites,), daemon=True)
+            producer.start()
+
+            with ValidationResultWriter(db, batch_size=self.batch_size) as writer:
+                for result in self._iter_results(len(workers)):
+                    key = proxy_key(result['ip'], result['port'], result['protocol'])
+                    with self._seen_lock:
+                        source_stats = self._source_stats(self._sources.pop(key, None))
+                    self.stats['validated'] += 1
+                    source_stats['validated'] += 1
+                    if result['is_valid']:
+                        self.stats['valid'] += 1
+                        source_stats['valid'] += 1
+                        if not result.get('proxy_id'):
+                            source_stats['new_valid'] += 1
+                        if self.stats['first_valid_after'] is None:
+                            self.stats['first_valid_after'] = round(time.time() - start_time, 2)
+
+                    if result.get('proxy_id'):
+                        writer.write(result)
+                        self.stats['updated'] += 1
+                    elif result['is_valid']:
+                        self._new_valid.append(result)
+                        if len(self._new_valid) >= self.batch_size:
+                            self._flush_new(service, writer)
+                    else:
+                        # 无效的新代理不入库
+                        self._discovered.pop(key, None)
+                self._flush_new(service, writer)
+
+            producer.join()
+        finally:
+            db.close()
+
+        self.stats['producer_blocked'] = round(self.stats['producer_blocked'], 2)
+        self.stats['elapsed'] = round(time.time() - start_time, 2)
+        logger.info(f"流水线完成: {self.stats}")
+        return self.stats
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理爬取-验证流水线")
+    parser.add_argument("--from-db", action="store_true", help="使用数据库中启用且配置了抓取规则的网站")
+    parser.add_argument("--queue-size", type=int, default=2000, help="待验证队列容量，队列满时暂停抓取")
+    parser.add_argument("--recheck-interval", type=int, default=3600, help="已知代理在该秒数内检测过则跳过")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批写回数据库的结果数")
+    parser.add_argument("--max-workers", type=int, default=50, help="验证线程数")
+
+    args = parser.parse_args()
+
+    websites = None
+    if args.from_db:
+        from app.services.proxy_service import ProxyWebsiteService
+
+        db = SessionLocal()
+        try:
+            websites = [
+                {'id': site.id, 'name': site.name, 'crawl_rules': site.crawl_rules}
+                for site in ProxyWebsiteService(db).get_crawlable_websites()
+            ]
+        finally:
+            db.close()
+
+    with ProxyCrawler() as crawler:
+        pipeline = ProxyPipeline(
+            crawler, ProxyValidator(max_workers=args.max_workers),
+            queue_size=args.queue_size, recheck_interval=args.recheck_interval, batch_size=args.batch_size
+        )
+        stats = pipeline.run(websites)
+    print(f"\n发现 {stats['discovered']} 个代理，验证 {stats['validated']} 个，有效 {stats['valid']} 个，"
+          f"新增入库 {stats['inserted']} 个，耗时 {stats['elapsed']}s")
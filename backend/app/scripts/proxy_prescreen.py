@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+代理预筛脚本
+在完整的HTTP验证之前，用非阻塞socket快速剔除无法连接的代理
+"""
+
+import asyncio
+import time
+import logging
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ProxyPrescreener:
+    def __init__(self, timeout: float = 3.0, concurrency: int = 2000,
+                 target_host: str = 'httpbin.org', target_port: int = 443):
+        self.timeout = timeout
+        self.concurrency = concurrency
+        # CONNECT / SOCKS4 握手时请求代理连接的目标
+        self.target_host = target_host
+        self.target_port = target_port
+
+    async def screen_proxy(self, proxy: Dict) -> Tuple[bool, Optional[str]]:
+        """预筛单个代理，返回 (是否通过, 失败原因)"""
+        protocol = proxy.get('protocol', 'http')
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(proxy['ip'], int(proxy['port'])),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            return False, 'connect_timeout'
+        except OSError as e:
+            return False, f'connect_error: {e.strerror or e}'
+        except (ValueError, OverflowError, UnicodeError):
+            # 端口不是数字或超出范围、主机名无法编码等，只影响这一个代理
+            return False, 'invalid_address'
+
+        try:
+            if protocol == 'socks5':
+                ok = await asyncio.wait_for(self._socks5_handshake(reader, writer), timeout=self.timeout)
+            elif protocol == 'socks4':
+                ok = await asyncio.wait_for(self._socks4_handshake(reader, writer), timeout=self.timeout)
+            elif protocol == 'https':
+                ok = await asyncio.wait_for(self._http_connect_handshake(reader, writer), timeout=self.timeout)
+            else:
+                ok = True  # 普通HTTP代理只要求TCP可连接
+            return ok, None if ok else 'handshake_rejected'
+        except asyncio.TimeoutError:
+            return False, 'handshake_timeout'
+        except (OSError, asyncio.IncompleteReadError) as e:
+            return False, f'handshake_error: {e}'
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _socks5_handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """SOCKS5 问候：只提供无认证方式"""
+        writer.write(b'\x05\x01\x00')
+        await writer.drain()
+        reply = await reader.readexactly(2)
+        return reply[0] == 0x05 and reply[1] == 0x00
+
+    async def _socks4_handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """SOCKS4a CONNECT 请求，由代理解析目标域名"""
+        request = (
+            b'\x04\x01'
+            + self.target_port.to_bytes(2, 'big')
+            + b'\x00\x00\x00\x01'  # 0.0.0.x 表示使用 SOCKS4a 域名
+            + b'\x00'
+            + self.target_host.encode('idna')
+            + b'\x00'
+        )
+        writer.write(request)
+        await writer.drain()
+        reply = await reader.readexactly(8)
+        return reply[1] == 0x5A
+
+    async def _http_connect_handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """HTTP CONNECT 隧道握手，只检查状态行"""
+        target = f'{self.target_host}:{self.target_port}'
+        writer.write(f'CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n'.encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        parts = status_line.split()
+        return len(parts) >= 2 and parts[0].startswith(b'HTTP/') and parts[1] == b'200'
+
+    async def screen_batch_async(self, proxies: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, str]], Dict]:
+        """批量预筛，返回 (通过的代理, [(未通过的代理, 原因)], 统计信息)"""
+        start_time = time.time()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        failure_reasons = {}
+
+        async def check(proxy: Dict) -> Tuple[bool, Optional[str]]:
+            async with semaphore:
+                return await self.screen_proxy(proxy)
+
+        outcomes = await asyncio.gather(*(check(proxy) for proxy in proxies))
+        passed_proxies = []
+        failed_proxies = []
+        for proxy, (passed, reason) in zip(proxies, outcomes):
+            if passed:
+                passed_proxies.append(proxy)
+            else:
+                failed_proxies.append((proxy, reason))
+                key = reason.split(':', 1)[0]
+                failure_reasons[key] = failure_reasons.get(key, 0) + 1
+
+        stats = {
+            'input': len(proxies),
+            'passed': len(passed_proxies),
+            'failed': len(proxies) - len(passed_proxies),
+            'elapsed': round(time.time() - start_time, 3),
+            'failure_reasons': failure_reasons
+        }
+        logger.info(
+            f"预筛完成：{stats['input']} 个代理中 {stats['passed']} 个通过，"
+            f"耗时 {stats['elapsed']}s，失败原因: {failure_reasons}"
+        )
+        return passed_proxies, failed_proxies, stats
+
+    def screen_batch(self, proxies: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, str]], Dict]:
+        """同步入口（不能在已运行的事件循环中调用）"""
+        return asyncio.run(self.screen_batch_async(proxies))
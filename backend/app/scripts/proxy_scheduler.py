@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+代理持续复检调度脚本
+按优先级队列持续复检 proxies 表：健康的代理频繁复检，长期失效的代理指数退避，
+整体检测速度受固定的每秒检测数预算限制
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import asyncio
+import heapq
+import itertools
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Set, Tuple, Callable
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core.rate_limit import TokenBucket
+from app.services.proxy_service import ProxyService
+from app.services.proxy_pool import CompactProxyPool, ProxyKey, ProxyRecord, proxy_key
+from app.scripts.proxy_validator import ProxyValidator
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+class RevalidationScheduler:
+    def __init__(self, validator: ProxyValidator, session_factory: Callable[[], Session] = SessionLocal,
+                 checks_per_second: float = 20.0, min_interval: int = 300,
+                 max_interval: int = 7 * 24 * 3600, refresh_interval: int = 60,
+                 flush_interval: int = 5, batch_size: int = 200, sync_overlap: int = 5):
+        self.validator = validator
+        self.session_factory = session_factory
+        self.bucket = TokenBucket(checks_per_second, capacity=checks_per_second)
+        self.min_interval = min_interval  # 健康代理的复检间隔
+        self.max_interval = max_interval  # 失效代理退避的上限
+        self.refresh_interval = refresh_interval  # 加载新代理、同步其他进程写入的周期
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # 按 updated_at 同步时水位线向前多取的秒数，避免同一时刻的更新或提交延迟导致漏读
+        self.sync_overlap = timedelta(seconds=sync_overlap)
+
+        # 堆元素: (下次检测时间戳, -成功率, 序号, 代理池键)；序号保证整数键和元组键不会互相比较
+        self.queue: List[Tuple[float, float, int, ProxyKey]] = []
+        self._sequence = itertools.count()
+        self.pool = CompactProxyPool()
+        # 无法打包为整数键的代理（协议写法不规范、IP带前导零等）按元组键另存
+        self.others: Dict[Tuple, ProxyRecord] = {}
+        # 已取出检测、结果尚未写回的代理，写回后才重新排期
+        self._checking: Set[ProxyKey] = set()
+        self.max_loaded_id = 0
+        self.synced_at: Optional[datetime] = None
+        self.pending_results: List[Dict] = []
+        self.stats = {'checked': 0, 'valid': 0, 'evicted': 0, 'synced': 0}
+        self._stopped = False
+
+    def next_check_delay(self, proxy: ProxyRecord) -> float:
+        """根据代理健康状况计算复检间隔（秒）"""
+        if proxy.is_active:
+            # 成功率越高越"热"，复检越频繁：min_interval ~ 2 * min_interval
+            return self.min_interval * (2 - (proxy.success_rate or 0) / 100)
+        # 连续失败次数越多，间隔指数增长
+        backoff = self.min_interval * 2 ** min(proxy.fail_count, 20)
+        return min(self.max_interval, backoff)
+
+    def _next_check(self, proxy: ProxyRecord) -> float:
+        if proxy.last_check_time is None:
+            return 0.0  # 从未检测过的代理立即检测
+        last_check = (proxy.last_check_time - EPOCH).total_seconds()
+        return last_check + self.next_check_delay(proxy)
+
+    def _schedule(self, proxy: ProxyRecord):
+        heapq.heappush(self.queue, (self._next_check(proxy), -(proxy.success_rate or 0), next(self._sequence), proxy.key))
+
+    def _get(self, key: ProxyKey) -> Optional[ProxyRecord]:
+        return self.pool.get_key(key) if isinstance(key, int) else self.others.get(key)
+
+    def _add(self, key: ProxyKey, proxy: Dict) -> bool:
+        """加入代理池，已存在时返回 False"""
+        fields = {
+            'proxy_id': proxy['id'], 'country': proxy['country'], 'is_active': proxy['is_active'],
+            'success_rate': proxy['success_rate'], 'fail_count': proxy['fail_count'],
+            'last_check_time': proxy['last_check_time']
+        }
+        if isinstance(key, int):
+            return self.pool.add_key(key, **fields)
+        if key in self.others:
+            return False
+        record = ProxyRecord()
+        record.key = key
+        record.ip, record.port, record.protocol = key
+        record.quality_score = 0.0
+        self.others[key] = record
+        self._update(key, **fields)
+        return True
+
+    def _update(self, key: ProxyKey, **fields):
+        if isinstance(key, int):
+            self.pool.update_key(key, **fields)
+            return
+        record = self.others.get(key)
+        if record is not None:
+            for name, value in fields.items():
+                setattr(record, 'id' if name == 'proxy_id' else name, value)
+
+    def _discard(self, key: ProxyKey) -> bool:
+        if isinstance(key, int):
+            return self.pool.discard_key(key)
+        return self.others.pop(key, None) is not None
+
+    def _load_new_proxies(self, db: Session) -> int:
+        """加载上次加载之后新增的代理"""
+        if self.synced_at is None:
+            # 之后按 updated_at 同步从加载开始的时刻算起，加载期间的写入也不会漏掉
+            self.synced_at = datetime.utcnow()
+        count = 0
+        for proxy in ProxyService(db).iter_proxies_for_validation(start_id=self.max_loaded_id):
+            self.max_loaded_id = max(self.max_loaded_id, proxy['id'])
+            key = proxy_key(proxy['ip'], proxy['port'], proxy['protocol'])
+            if self._add(key, proxy):
+                self._schedule(self._get(key))
+                count += 1
+        db.rollback()  # 结束只读事务，下次加载能看到新数据
+        if count:
+            logger.info(f"加载 {count} 个新代理，队列长度 {len(self.queue)}")
+        return count
+
+    def _sync_updated(self, db: Session) -> int:
+        """同步其他进程（流水线、接口的使用反馈等）写入的检测结果，按新的状态重新排期"""
+        count = 0
+        watermark = self.synced_at
+        for proxy in ProxyService(db).iter_proxies_updated_since(self.synced_at - self.sync_overlap):
+            if proxy['updated_at'] and proxy['updated_at'] > watermark:
+                watermark = proxy['updated_at']
+            key = proxy_key(proxy['ip'], proxy['port'], proxy['protocol'])
+            if key in self._checking:
+                continue  # 本进程正在检测，写回时会按合并后的结果排期
+            record = self._get(key)
+            if record is None:
+                if self._add(key, proxy):
+                    self._schedule(self._get(key))
+                    count += 1
+                continue
+            next_check = self._next_check(record)
+            self._update(
+                key, is_active=proxy['is_active'], success_rate=proxy['success_rate'],
+                fail_count=proxy['fail_count'], last_check_time=proxy['last_check_time']
+            )
+            record = self._get(key)
+            # 排期未变时（如本进程自己的写回）不重复入队
+            if self._next_check(record) != next_check:
+                self._schedule(record)
+                count += 1
+        db.rollback()
+        self.synced_at = watermark
+        if count:
+            self.stats['synced'] += count
+            logger.info(f"同步 {count} 个在其他进程中更新的代理")
+        return count
+
+    def _refresh(self, db: Session):
+        self._load_new_proxies(db)
+        self._sync_updated(db)
+
+    def _flush_results(self, db: Session, batch: List[Dict]) -> Dict[int, Dict]:
+        return ProxyService(db).apply_validation_results(batch)
+
+    def _reschedule(self, batch: List[Dict], written: Dict[int, Dict]):
+        """按写入数据库的平滑健康统计更新代理池并重新排期，数据库中已不存在的代理移出代理池"""
+        evicted = 0
+        for result in batch:
+            key = proxy_key(result['ip'], result['port'], result['protocol'])
+            self._checking.discard(key)
+            mapping = written.get(result['proxy_id'])
+            if mapping is None:
+                # 代理已被删除（或去重时合并），不再复检
+                evicted += self._discard(key)
+                continue
+            self._update(
+                key, is_active=mapping['is_active'], success_rate=mapping['success_rate'],
+                quality_score=mapping['quality_score'], fail_count=result['fail_count'],
+                last_check_time=mapping['last_check_time']
+            )
+            record = self._get(key)
+            if record is not None:
+                self._schedule(record)
+        if evicted:
+            self.stats['evicted'] += evicted
+            logger.info(f"移除 {evicted} 个已删除的代理")
+
+    async def _check(self, record: ProxyRecord, semaphore: asyncio.Semaphore):
+        proxy = record.to_dict()
+        try:
+            result = await self.validator.validate_proxy_async(proxy)
+        except Exception as e:
+            logger.error(f"验证代理 {proxy['ip']}:{proxy['port']} 时出错: {e}")
+            result = self.validator._error_result(proxy, str(e))
+        finally:
+            semaphore.release()
+
+        # 结果写回数据库后才按平滑健康统计重新排期，写回前代理不在队列中
+        result['fail_count'] = 0 if result['is_valid'] else record.fail_count + 1
+        result.pop('test_results', None)
+        self.pending_results.append(result)
+        self.stats['checked'] += 1
+        if result['is_valid']:
+            self.stats['valid'] += 1
+
+    async def _flush(self, db: Session):
+        if not self.pending_results:
+            return
+        loop = asyncio.get_running_loop()
+        batch, self.pending_results = self.pending_results, []
+        try:
+            written = await loop.run_in_executor(None, self._flush_results, db, batch)
+        except Exception as e:
+            logger.error(f"写回 {len(batch)} 条验证结果失败，稍后重试: {e}")
+            db.rollback()
+            self.pending_results = batch + self.pending_results
+            return
+        self._reschedule(batch, written)
+
+    async def run(self, concurrency: Optional[int] = None):
+        """持续调度，直到调用 stop()"""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency or self.validator.concurrency)
+        tasks = set()
+        db = self.session_factory()
+        try:
+            await self.validator._ensure_origin_ip_async()
+            await loop.run_in_executor(None, self._load_new_proxies, db)
+            last_refresh = last_flush = last_report = time.time()
+
+            while not self._stopped:
+                now = time.time()
+                if now - last_refresh >= self.refresh_interval:
+                    await loop.run_in_executor(None, self._refresh, db)
+                    last_refresh = now
+                if len(self.pending_results) >= self.batch_size or now - last_flush >= self.flush_interval:
+                    await self._flush(db)
+                    last_flush = now
+                if now - last_report >= 60:
+                    logger.info(
+                        f"已复检 {self.stats['checked']} 次，有效 {self.stats['valid']} 次，"
+                        f"队列长度 {len(self.queue)}，进行中 {len(tasks)}"
+                    )
+                    last_report = now
+
+                if not self.queue or self.queue[0][0] > now:
+                    wait = self.queue[0][0] - now if self.queue else 1.0
+                    await asyncio.sleep(min(1.0, wait))
+                    continue
+
+                next_check, _, _, key = heapq.heappop(self.queue)
+                proxy = self._get(key)
+                # 已移除、正在检测，或排期已被更新（队列中有更新的元素）的跳过
+                if proxy is None or key in self._checking or next_check != self._next_check(proxy):
+                    continue
+                self._checking.add(key)
+
+                # 先取令牌再占并发名额，保证检测速度不超过预算
+                await self.bucket.acquire_async()
+                await semaphore.acquire()
+                task = asyncio.create_task(self._check(proxy, semaphore))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks)
+            await self._flush(db)
+        finally:
+            db.close()
+
+    def stop(self):
+        self._stopped = True
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理持续复检调度")
+    parser.add_argument("--rate", type=float, default=20.0, help="每秒最多检测次数")
+    parser.add_argument("--concurrency", type=int, default=200, help="同时进行的检测数上限")
+    parser.add_argument("--min-interval", type=int, default=300, help="健康代理的复检间隔(秒)")
+    parser.add_argument("--max-interval", type=int, default=7 * 24 * 3600, help="失效代理退避上限(秒)")
+
+    args = parser.parse_args()
+
+    scheduler = RevalidationScheduler(
+        ProxyValidator(concurrency=args.concurrency),
+        checks_per_second=args.rate,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval
+    )
+    try:
+        asyncio.run(scheduler.run())
+    except KeyboardInterrupt:
+        logger.info("复检调度已停止")
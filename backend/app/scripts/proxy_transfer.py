@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+代理批量导入导出脚本
+把 proxies 表导出为 NDJSON / CSV 文件，或从文件导入（与 /api/v1/proxy/export、/import 接口的格式相同），
+用于在不同环境之间迁移代理数据。文件名以 .csv 结尾时按 CSV 处理，其余按 NDJSON
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import logging
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.services.proxy_transfer import ProxyImporter, batched_lines, iter_export
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _format(path: str, fmt: str = None) -> str:
+    return fmt or ('csv' if path.endswith('.csv') else 'ndjson')
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理批量导入导出")
+    parser.add_argument("action", choices=["import", "export"], help="导入或导出")
+    parser.add_argument("path", help="文件路径，- 表示标准输入/输出")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default=None, help="文件格式，默认按扩展名判断")
+    parser.add_argument("--database-url", default=None, help="数据库连接串，默认使用 DATABASE_URL")
+    parser.add_argument("--batch-size", type=int, default=5000, help="每批读写的行数")
+    parser.add_argument("--overwrite", action="store_true", help="导入时用文件中的值覆盖已存在的代理")
+    parser.add_argument("--active-only", action="store_true", help="只导出有效代理")
+
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url or settings.DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    fmt = _format(args.path, args.format)
+    start_time = time.time()
+    try:
+        if args.action == "export":
+            filters = {'is_active': True} if args.active_only else None
+            output = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8", newline="")
+            try:
+                for chunk in iter_export(db, fmt, filters, batch_size=args.batch_size):
+                    output.write(chunk)
+            finally:
+                if output is not sys.stdout:
+                    output.close()
+            logger.info(f"导出完成，耗时 {time.time() - start_time:.1f}s")
+        else:
+            importer = ProxyImporter(db, fmt, overwrite=args.overwrite)
+            source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+            try:
+                for batch in batched_lines(source, args.batch_size, fmt):
+                    importer.feed(batch)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+            result = importer.result()
+            logger.info(
+                f"导入完成，共 {result['lines']} 行，写入 {result['imported']} 个代理，"
+                f"无效 {result['rejected']} 行，耗时 {time.time() - start_time:.1f}s"
+            )
+            for error in result['errors']:
+                logger.warning(error)
+    finally:
+        db.close()
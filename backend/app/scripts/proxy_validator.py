@@ -4,38 +4,344 @@
 检测代理的有效性、响应速度等指标
 """
 
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
 import requests
+import httpx
+import asyncio
 import time
 import concurrent.futures
+import ipaddress
+import itertools
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator, AsyncIterator
 from urllib.parse import urlparse
 import json
+from app.core.config import settings
+from app.services.proxy_health import quality_score, TIMING_PHASES
+from app.scripts.proxy_prescreen import ProxyPrescreener
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+logging.getLogger('httpx').setLevel(logging.WARNING)  # 避免逐请求日志刷屏
+
+# 检测请求头，用于判断代理是否篡改请求头
+PROBE_HEADER = 'X-Proxy-Probe'
+PROBE_VALUE = 'spider-proxy-check'
+
+# 可能泄露真实IP的请求头
+REAL_IP_HEADERS = [
+    'x-forwarded-for',
+    'x-real-ip',
+    'x-client-ip',
+    'cf-connecting-ip',
+    'true-client-ip'
+]
+
+# 暴露代理特征的请求头
+PROXY_HEADERS = [
+    'via',
+    'forwarded',
+    'x-forwarded-for',
+    'proxy-connection',
+    'x-proxy-id'
+]
+
+# 匿名度由低到高
+ANONYMITY_LEVELS = {
+    'transparent': 0,
+    'anonymous': 1,
+    'elite': 2
+}
+
+class _PhaseRecorder:
+    """通过 httpcore 的 trace 扩展记录一次请求各阶段的耗时"""
+    
+    def __init__(self):
+        self.events = []
+    
+    def trace(self, name: str, info: Dict) -> None:
+        self.events.append((name, time.perf_counter()))
+    
+    async def atrace(self, name: str, info: Dict) -> None:
+        self.trace(name, info)
+    
+    def _span(self, suffix: str, last: bool = False) -> Optional[float]:
+        """某一事件 started 到 complete 的耗时(ms)，last=True 时取最后一次"""
+        started = [t for name, t in self.events if name.endswith(f'{suffix}.started')]
+        completed = [t for name, t in self.events if name.endswith(f'{suffix}.complete')]
+        if not started or not completed:
+            return None
+        if last:
+            return (completed[-1] - started[-1]) * 1000
+        return (completed[0] - started[0]) * 1000
+    
+    def phases(self) -> Dict[str, Optional[float]]:
+        """各阶段耗时(ms)；复用连接时 connect / tls 为 None
+
+        connect 包含到代理的TCP连接和HTTPS隧道的CONNECT往返；
+        目标域名由代理解析，这部分耗时计入 connect(隧道) 或 ttfb；
+        代理地址为域名时其解析耗时计入 connect，不单独统计
+        """
+        connect = self._span('connect_tcp')
+        tls = self._span('start_tls')
+        if connect is not None and tls is not None:
+            # 隧道：CONNECT 请求发出到收到响应头，位于TCP连接和TLS握手之间
+            tls_started = next(t for name, t in self.events if name.endswith('start_tls.started'))
+            sends = [t for name, t in self.events if name.endswith('send_request_headers.started') and t < tls_started]
+            receives = [t for name, t in self.events if name.endswith('receive_response_headers.complete') and t < tls_started]
+            if sends and receives:
+                connect += (receives[-1] - sends[0]) * 1000
+        
+        send_started = [t for name, t in self.events if name.endswith('send_request_headers.started')]
+        headers_received = [t for name, t in self.events if name.endswith('receive_response_headers.complete')]
+        ttfb = (headers_received[-1] - send_started[-1]) * 1000 if send_started and headers_received else None
+        
+        return {
+            'connect': connect,
+            'tls': tls,
+            'ttfb': ttfb
+        }
 
 class ProxyValidator:
-    def __init__(self, timeout: int = 10, max_workers: int = 50):
+    def __init__(self, timeout: int = 10, max_workers: int = 50, concurrency: int = 1000,
+                 origin_ip: Optional[str] = None):
         self.timeout = timeout
         self.max_workers = max_workers
-        self.test_urls = [
-            'http://httpbin.org/ip',
-            'http://httpbin.org/get',
-            'https://httpbin.org/ip',
-            'https://httpbin.org/get'
-        ]
+        self.concurrency = concurrency  # 异步模式下同时进行的检测数上限
+        self.stage_stats = {}  # 最近一次分阶段验证的统计
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+        # 回显接口：返回来源IP和收到的请求头，每个协议一次请求即可完成全部检测
+        self.test_urls = list(settings.PROXY_JUDGE_URLS)
+        self.origin_ip_url = settings.PROXY_JUDGE_IP_URL
+        self.origin_ip = origin_ip  # 本机出口IP，None 表示首次验证时自动获取
+        self._ssl_context = None
         
     def validate_proxy(self, proxy: Dict) -> Dict:
-        """验证单个代理"""
+        """验证单个代理
+
+        每个协议只请求一次回显接口，同时得到存活、延迟、匿名度和请求头篡改情况；
+        同一代理的所有请求共用一个客户端，检测结束即关闭
+        """
         proxy_url = f"{proxy['protocol']}://{proxy['ip']}:{proxy['port']}"
-        proxies = {
-            'http': proxy_url,
-            'https': proxy_url
+        result = self._new_result(proxy)
+        
+        try:
+            client = httpx.Client(proxies=proxy_url, **self._client_options())
+        except Exception as e:
+            # 例如 socks 代理缺少 socksio 依赖
+            result['error_message'] = str(e)
+            return result
+        
+        with client:
+            for test_url in self._get_test_urls(proxy):
+                try:
+                    start_time = time.time()
+                    recorder = _PhaseRecorder()
+                    response = client.get(test_url, extensions={'trace': recorder.trace})
+                    end_time = time.time()
+                    self._record_response(result, test_url, response.status_code,
+                                          (end_time - start_time) * 1000, response.text,
+                                          recorder.phases())
+                    
+                except httpx.TimeoutException:
+                    self._record_error(result, test_url, 'timeout')
+                    
+                except Exception as e:
+                    self._record_error(result, test_url, str(e))
+        
+        return self._finalize_result(result)
+    
+    async def validate_proxy_async(self, proxy: Dict) -> Dict:
+        """异步验证单个代理，返回结构与 validate_proxy 相同"""
+        proxy_url = f"{proxy['protocol']}://{proxy['ip']}:{proxy['port']}"
+        result = self._new_result(proxy)
+        
+        try:
+            client = httpx.AsyncClient(proxies=proxy_url, **self._client_options())
+        except Exception as e:
+            # 例如 socks 代理缺少 socksio 依赖
+            result['error_message'] = str(e)
+            return result
+        
+        async with client:
+            for test_url in self._get_test_urls(proxy):
+                try:
+                    start_time = time.time()
+                    recorder = _PhaseRecorder()
+                    response = await client.get(test_url, extensions={'trace': recorder.atrace})
+                    end_time = time.time()
+                    self._record_response(result, test_url, response.status_code,
+                                          (end_time - start_time) * 1000, response.text,
+                                          recorder.phases())
+                        
+                except httpx.TimeoutException:
+                    self._record_error(result, test_url, 'timeout')
+                    
+                except Exception as e:
+                    self._record_error(result, test_url, str(e))
+        
+        return self._finalize_result(result)
+    
+    def _client_options(self) -> Dict:
+        """单个代理检测期间使用的客户端参数"""
+        if self._ssl_context is None:
+            # 所有客户端共用一个SSL上下文，避免每次加载CA证书带来的大量CPU开销
+            self._ssl_context = httpx.create_ssl_context()
+        return {
+            'timeout': self.timeout,
+            'headers': self._probe_headers(),
+            'verify': self._ssl_context
         }
+    
+    def _probe_headers(self) -> Dict[str, str]:
+        """检测请求头，回显中用于判断代理是否篡改请求头"""
+        return {**self.headers, PROBE_HEADER: PROBE_VALUE}
+    
+    def _record_response(self, result: Dict, test_url: str, status_code: int,
+                         response_time: float, body: str,
+                         timings: Optional[Dict[str, Optional[float]]] = None) -> None:
+        """记录一次回显请求的结果，并据此更新匿名度"""
+        echo = None
+        if status_code == 200:
+            try:
+                echo = json.loads(body)
+            except ValueError:
+                echo = None
+        
+        if not isinstance(echo, dict):
+            # 状态码异常或返回内容被代理替换
+            result['test_results'].append({
+                'url': test_url,
+                'status_code': status_code,
+                'response_time': None,
+                'success': False,
+                'error': None if status_code != 200 else 'invalid echo response'
+            })
+            return
+        
+        result['test_results'].append({
+            'url': test_url,
+            'status_code': status_code,
+            'response_time': response_time,
+            'timings': timings,
+            'success': True
+        })
+        
+        # 更新速度（取最快响应时间）
+        if result['speed'] is None or response_time < result['speed']:
+            result['speed'] = response_time
+        
+        # 多个协议的结果取暴露程度最高的匿名度
+        anonymity = self._analyze_echo(echo)
+        current = result.get('anonymity', 'unknown')
+        if current == 'unknown' or ANONYMITY_LEVELS[anonymity['anonymity']] < ANONYMITY_LEVELS[current]:
+            result['anonymity'] = anonymity['anonymity']
+            result['anonymity_details'] = anonymity['details']
+        result['header_tampered'] = result.get('header_tampered', False) or anonymity['header_tampered']
+    
+    def _record_error(self, result: Dict, test_url: str, error: str) -> None:
+        """记录一次失败的请求"""
+        result['test_results'].append({
+            'url': test_url,
+            'status_code': None,
+            'response_time': None,
+            'success': False,
+            'error': error
+        })
+    
+    def _analyze_echo(self, echo: Dict) -> Dict:
+        """根据回显的来源IP和请求头判断匿名度"""
+        headers = {k.lower(): str(v) for k, v in (echo.get('headers') or {}).items()}
+        origin = str(echo.get('origin', ''))
+        
+        header_tampered = (
+            headers.get(PROBE_HEADER.lower()) != PROBE_VALUE
+            or headers.get('user-agent') != self.headers['User-Agent']
+        )
+        
+        # 检查是否泄露真实IP：回显和请求头中可能是逗号分隔的IP列表，逐个精确比较
+        if self.origin_ip:
+            leaked = any(
+                self.origin_ip in self._split_ips(value)
+                for value in [origin] + [headers.get(header, '') for header in REAL_IP_HEADERS]
+            )
+        else:
+            leaked = any(headers.get(header) for header in REAL_IP_HEADERS)
+        if leaked:
+            return {'anonymity': 'transparent', 'details': '泄露真实IP', 'header_tampered': header_tampered}
+        
+        if any(header in headers for header in PROXY_HEADERS):
+            return {'anonymity': 'anonymous', 'details': '匿名，但暴露了代理特征头', 'header_tampered': header_tampered}
+        
+        if header_tampered:
+            return {'anonymity': 'anonymous', 'details': '匿名，但修改了请求头', 'header_tampered': True}
         
-        result = {
+        return {'anonymity': 'elite', 'details': '完全匿名，不修改请求头', 'header_tampered': False}
+    
+    @staticmethod
+    def _split_ips(value: str) -> List[str]:
+        """把 "1.2.3.4, 5.6.7.8" 这样的IP列表拆成单个IP"""
+        return [ip.strip() for ip in value.split(',')]
+    
+    def _ensure_origin_ip(self) -> None:
+        """直连回显接口获取本机出口IP，用于判断代理是否泄露真实IP"""
+        if self.origin_ip is not None:
+            return
+        try:
+            response = requests.get(self.origin_ip_url, timeout=self.timeout)
+            self.origin_ip = self._parse_origin_ip(response.text)
+        except Exception as e:
+            logger.warning(f"获取本机出口IP失败，将只根据请求头判断匿名度: {e}")
+            self.origin_ip = ''
+    
+    async def _ensure_origin_ip_async(self) -> None:
+        """_ensure_origin_ip 的异步版本"""
+        if self.origin_ip is not None:
+            return
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.get(self.origin_ip_url)
+            self.origin_ip = self._parse_origin_ip(response.text)
+        except Exception as e:
+            logger.warning(f"获取本机出口IP失败，将只根据请求头判断匿名度: {e}")
+            self.origin_ip = ''
+    
+    def _parse_origin_ip(self, text: str) -> str:
+        """从出口IP接口的响应中取出IP，支持 {"origin": ...}、{"ip": ...} 和纯文本
+
+        回环、内网等非公网地址说明接口部署在本机或内网，不是真实的出口IP，返回空字符串
+        """
+        try:
+            data = json.loads(text)
+            value = (data.get('origin') or data.get('ip') or '') if isinstance(data, dict) else str(data)
+        except ValueError:
+            value = text
+        ip = str(value).split(',')[0].strip()
+        if not ip:
+            raise ValueError(f"{self.origin_ip_url} 未返回IP")
+        if not ipaddress.ip_address(ip).is_global:
+            logger.warning(
+                f"{self.origin_ip_url} 返回的出口IP {ip} 不是公网地址，请改为外部接口；将只根据请求头判断匿名度"
+            )
+            return ''
+        return ip
+    
+    def _get_test_urls(self, proxy: Dict) -> List[str]:
+        """获取适用于该代理的测试URL"""
+        if proxy['protocol'] == 'http':
+            # HTTP代理不能测试HTTPS
+            return [url for url in self.test_urls if not url.startswith('https')]
+        return list(self.test_urls)
+    
+    def _new_result(self, proxy: Dict) -> Dict:
+        """创建空的验证结果"""
+        return {
             'proxy_id': proxy.get('id'),
             'ip': proxy['ip'],
             'port': proxy['port'],
@@ -44,93 +350,48 @@ class ProxyValidator:
             'speed': None,
             'success_rate': 0.0,
             'error_message': None,
+            'anonymity': 'unknown',
+            'anonymity_details': None,
+            'header_tampered': False,
+            'timings': {phase: None for phase in TIMING_PHASES},
             'test_results': []
         }
+    
+    def _error_result(self, proxy: Dict, error_message: str) -> Dict:
+        """验证过程异常时的结果"""
+        result = self._new_result(proxy)
+        result['error_message'] = error_message
+        return result
+    
+    def _finalize_result(self, result: Dict) -> Dict:
+        """计算成功率并判断是否有效，汇总各阶段耗时"""
+        total_tests = len(result['test_results'])
+        success_count = sum(1 for test in result['test_results'] if test['success'])
         
-        success_count = 0
-        total_tests = 0
+        # 各阶段取成功请求中实际发生该阶段的平均值（复用连接的请求没有 connect / tls）
+        for phase in TIMING_PHASES:
+            values = [
+                test['timings'][phase] for test in result['test_results']
+                if test['success'] and test.get('timings') and test['timings'][phase] is not None
+            ]
+            result['timings'][phase] = round(sum(values) / len(values), 2) if values else None
         
-        for test_url in self.test_urls:
-            if test_url.startswith('https') and proxy['protocol'] == 'http':
-                continue  # HTTP代理不能测试HTTPS
-                
-            try:
-                start_time = time.time()
-                response = requests.get(
-                    test_url,
-                    proxies=proxies,
-                    timeout=self.timeout,
-                    headers={
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                    }
-                )
-                end_time = time.time()
-                
-                if response.status_code == 200:
-                    response_time = (end_time - start_time) * 1000  # 转换为毫秒
-                    success_count += 1
-                    total_tests += 1
-                    
-                    result['test_results'].append({
-                        'url': test_url,
-                        'status_code': response.status_code,
-                        'response_time': response_time,
-                        'success': True
-                    })
-                    
-                    # 更新速度（取最快响应时间）
-                    if result['speed'] is None or response_time < result['speed']:
-                        result['speed'] = response_time
-                        
-                else:
-                    total_tests += 1
-                    result['test_results'].append({
-                        'url': test_url,
-                        'status_code': response.status_code,
-                        'response_time': None,
-                        'success': False
-                    })
-                    
-            except requests.exceptions.ProxyError as e:
-                total_tests += 1
-                result['test_results'].append({
-                    'url': test_url,
-                    'status_code': None,
-                    'response_time': None,
-                    'success': False,
-                    'error': str(e)
-                })
-                
-            except requests.exceptions.Timeout as e:
-                total_tests += 1
-                result['test_results'].append({
-                    'url': test_url,
-                    'status_code': None,
-                    'response_time': None,
-                    'success': False,
-                    'error': 'timeout'
-                })
-                
-            except Exception as e:
-                total_tests += 1
-                result['test_results'].append({
-                    'url': test_url,
-                    'status_code': None,
-                    'response_time': None,
-                    'success': False,
-                    'error': str(e)
-                })
-        
-        # 计算成功率
         if total_tests > 0:
             result['success_rate'] = (success_count / total_tests) * 100
             result['is_valid'] = result['success_rate'] >= 30  # 30%以上成功率认为有效
         
         return result
     
-    def validate_proxies_batch(self, proxies: List[Dict]) -> List[Dict]:
-        """批量验证代理"""
+    def validate_proxies_batch(self, proxies: List[Dict], use_async: bool = False) -> List[Dict]:
+        """批量验证代理
+
+        use_async=True 时使用 asyncio 引擎，同时检测的代理数由 concurrency 控制
+        """
+        if use_async:
+            return self.validate_proxies_async(proxies)
+        
         logger.info(f"开始验证 {len(proxies)} 个代理...")
+        self._ensure_origin_ip()
         
         results = []
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
@@ -154,17 +415,7 @@ class ProxyValidator:
                 except Exception as e:
                     proxy = future_to_proxy[future]
                     logger.error(f"验证代理 {proxy['ip']}:{proxy['port']} 时出错: {e}")
-                    results.append({
-                        'proxy_id': proxy.get('id'),
-                        'ip': proxy['ip'],
-                        'port': proxy['port'],
-                        'protocol': proxy['protocol'],
-                        'is_valid': False,
-                        'speed': None,
-                        'success_rate': 0.0,
-                        'error_message': str(e),
-                        'test_results': []
-                    })
+                    results.append(self._error_result(proxy, str(e)))
         
         # 按成功率排序
         results.sort(key=lambda x: x['success_rate'], reverse=True)
@@ -174,116 +425,192 @@ class ProxyValidator:
         
         return results
     
-    def validate_proxy_anonymity(self, proxy: Dict) -> Dict:
-        """检测代理匿名度"""
-        proxy_url = f"{proxy['protocol']}://{proxy['ip']}:{proxy['port']}"
-        proxies = {
-            'http': proxy_url,
-            'https': proxy_url
+    def validate_proxies_async(self, proxies: List[Dict]) -> List[Dict]:
+        """使用 asyncio 批量验证代理（不能在已运行的事件循环中调用）"""
+        return asyncio.run(self.validate_proxies_batch_async(proxies))
+    
+    def validate_proxies_staged(self, proxies: List[Dict]) -> List[Dict]:
+        """两阶段验证：先用socket握手预筛，只有通过的代理才进行HTTP验证
+
+        各阶段的数量和耗时保存在 self.stage_stats 中
+        """
+        return asyncio.run(self.validate_proxies_staged_async(proxies))
+    
+    async def validate_proxies_staged_async(self, proxies: List[Dict]) -> List[Dict]:
+        """两阶段验证的异步实现"""
+        # CONNECT / SOCKS4 握手的目标取自HTTPS测试URL
+        https_urls = [url for url in self.test_urls if url.startswith('https')]
+        target = urlparse(https_urls[0] if https_urls else self.test_urls[0])
+        prescreener = ProxyPrescreener(
+            timeout=min(self.timeout, 3),
+            concurrency=self.concurrency,
+            target_host=target.hostname,
+            target_port=target.port or (443 if target.scheme == 'https' else 80)
+        )
+        passed, failed, prescreen_stats = await prescreener.screen_batch_async(proxies)
+        
+        start_time = time.time()
+        results = await self.validate_proxies_batch_async(passed)
+        http_elapsed = time.time() - start_time
+        
+        for proxy, reason in failed:
+            results.append(self._error_result(proxy, f'prescreen: {reason}'))
+        
+        skipped_requests = sum(len(self._get_test_urls(proxy)) for proxy, _ in failed)
+        self.stage_stats = {
+            'prescreen': prescreen_stats,
+            'http': {
+                'input': len(passed),
+                'valid': sum(1 for r in results if r['is_valid']),
+                'elapsed': round(http_elapsed, 3)
+            },
+            'skipped_http_requests': skipped_requests
         }
+        logger.info(
+            f"分阶段验证完成：预筛 {prescreen_stats['input']} -> {prescreen_stats['passed']} "
+            f"({prescreen_stats['elapsed']}s)，HTTP验证有效 {self.stage_stats['http']['valid']} "
+            f"({self.stage_stats['http']['elapsed']}s)，省去 {skipped_requests} 次HTTP请求"
+        )
+        return results
+    
+    async def validate_proxies_batch_async(self, proxies: List[Dict]) -> List[Dict]:
+        """异步批量验证代理，按 validate_proxies_stream_async 的窗口逐个提交，在途任务数不超过 concurrency"""
+        logger.info(f"开始异步验证 {len(proxies)} 个代理，并发上限 {self.concurrency}...")
         
-        try:
-            # 测试1: 检查是否泄露真实IP
-            response = requests.get(
-                'http://httpbin.org/headers',
-                proxies=proxies,
-                timeout=self.timeout
-            )
+        results = []
+        valid_count = 0
+        async for result in self.validate_proxies_stream_async(proxies, keep_details=True):
+            results.append(result)
+            if result['is_valid']:
+                valid_count += 1
             
-            if response.status_code == 200:
-                headers = response.json().get('headers', {})
-                
-                # 检查常见的真实IP泄露头
-                real_ip_headers = [
-                    'X-Forwarded-For',
-                    'X-Real-IP',
-                    'X-Client-IP',
-                    'CF-Connecting-IP',
-                    'True-Client-IP'
-                ]
-                
-                has_real_ip = any(
-                    headers.get(header) for header in real_ip_headers
-                )
-                
-                if has_real_ip:
-                    return {'anonymity': 'transparent', 'details': '泄露真实IP'}
-                else:
-                    # 进一步测试
-                    return self._test_elite_anonymity(proxy, proxies)
-            else:
-                return {'anonymity': 'unknown', 'details': '无法连接'}
-                
-        except Exception as e:
-            return {'anonymity': 'unknown', 'details': str(e)}
+            # 实时显示进度
+            if len(results) % 100 == 0:
+                logger.info(f"已验证 {len(results)}/{len(proxies)} 个代理，有效: {valid_count}")
+        
+        # 按成功率排序
+        results.sort(key=lambda x: x['success_rate'], reverse=True)
+        
+        logger.info(f"验证完成！总共 {len(proxies)} 个代理，有效: {valid_count}，无效: {len(proxies) - valid_count}")
+        
+        return results
     
-    def _test_elite_anonymity(self, proxy: Dict, proxies: Dict) -> Dict:
-        """测试是否为高匿代理"""
-        try:
-            # 测试2: 检查代理是否修改了请求头
-            custom_headers = {
-                'X-Test-Header': 'test_value',
-                'User-Agent': 'Custom-User-Agent'
-            }
-            
-            response = requests.get(
-                'http://httpbin.org/headers',
-                proxies=proxies,
-                headers=custom_headers,
-                timeout=self.timeout
-            )
+    def validate_proxies_stream(self, proxies: Iterable[Dict], window: Optional[int] = None,
+                                keep_details: bool = False) -> Iterator[Dict]:
+        """流式验证：结果完成即产出，内存占用与代理总数无关
+
+        同时在途的任务数不超过 window（默认 max_workers 的2倍），输入可以是生成器；
+        keep_details=False 时丢弃 test_results 以进一步降低内存
+        """
+        window = window or self.max_workers * 2
+        self._ensure_origin_ip()
+        
+        proxy_iter = iter(proxies)
+        checked = 0
+        valid_count = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            for proxy in itertools.islice(proxy_iter, window):
+                pending[executor.submit(self.validate_proxy, proxy)] = proxy
             
-            if response.status_code == 200:
-                headers = response.json().get('headers', {})
-                
-                # 检查自定义头是否被保留
-                if headers.get('X-Test-Header') == 'test_value':
-                    return {'anonymity': 'elite', 'details': '完全匿名，不修改请求头'}
-                else:
-                    return {'anonymity': 'anonymous', 'details': '匿名，但修改了请求头'}
-            else:
-                return {'anonymity': 'unknown', 'details': '无法进行匿名度测试'}
-                
-        except Exception as e:
-            return {'anonymity': 'unknown', 'details': str(e)}
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    proxy = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"验证代理 {proxy['ip']}:{proxy['port']} 时出错: {e}")
+                        result = self._error_result(proxy, str(e))
+                    
+                    # 补充新任务，保持在途数量不变
+                    for next_proxy in itertools.islice(proxy_iter, 1):
+                        pending[executor.submit(self.validate_proxy, next_proxy)] = next_proxy
+                    
+                    checked += 1
+                    if result['is_valid']:
+                        valid_count += 1
+                    if checked % 1000 == 0:
+                        logger.info(f"已验证 {checked} 个代理，有效: {valid_count}")
+                    
+                    if not keep_details:
+                        result.pop('test_results', None)
+                    yield result
+        
+        logger.info(f"流式验证完成！总共 {checked} 个代理，有效: {valid_count}")
     
-    def get_proxy_quality_score(self, proxy_result: Dict) -> float:
-        """计算代理质量评分 (0-100)"""
-        if not proxy_result['is_valid']:
-            return 0.0
+    async def validate_proxies_stream_async(self, proxies: Iterable[Dict],
+                                            keep_details: bool = False) -> AsyncIterator[Dict]:
+        """validate_proxies_stream 的异步版本，在途任务数不超过 concurrency"""
+        await self._ensure_origin_ip_async()
         
-        score = 0.0
+        async def check(proxy: Dict) -> Dict:
+            try:
+                return await self.validate_proxy_async(proxy)
+            except Exception as e:
+                logger.error(f"验证代理 {proxy['ip']}:{proxy['port']} 时出错: {e}")
+                return self._error_result(proxy, str(e))
         
-        # 成功率权重: 40%
-        score += proxy_result['success_rate'] * 0.4
+        proxy_iter = iter(proxies)
+        pending = {
+            asyncio.ensure_future(check(proxy))
+            for proxy in itertools.islice(proxy_iter, self.concurrency)
+        }
+        checked = 0
+        valid_count = 0
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for next_proxy in itertools.islice(proxy_iter, 1):
+                        pending.add(asyncio.ensure_future(check(next_proxy)))
+                    
+                    result = task.result()
+                    checked += 1
+                    if result['is_valid']:
+                        valid_count += 1
+                    if checked % 1000 == 0:
+                        logger.info(f"已验证 {checked} 个代理，有效: {valid_count}")
+                    
+                    if not keep_details:
+                        result.pop('test_results', None)
+                    yield result
+        finally:
+            # 调用方提前停止迭代（或出错）时取消仍在途的检测
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
         
-        # 速度权重: 30%
-        if proxy_result['speed'] is not None:
-            # 速度越快分数越高，超过1000ms得0分
-            speed_score = max(0, 100 - (proxy_result['speed'] / 10))
-            score += speed_score * 0.3
+        logger.info(f"流式验证完成！总共 {checked} 个代理，有效: {valid_count}")
+    
+    def validate_proxy_anonymity(self, proxy: Dict) -> Dict:
+        """检测代理匿名度
+
+        匿名度已在 validate_proxy 的回显检测中一并得出，这里不再单独发请求
+        """
+        self._ensure_origin_ip()
+        result = self.validate_proxy(proxy)
+        if result['anonymity'] == 'unknown':
+            return {'anonymity': 'unknown', 'details': '无法连接'}
+        return {'anonymity': result['anonymity'], 'details': result['anonymity_details']}
+    
+    def get_proxy_quality_score(self, proxy_result: Dict) -> float:
+        """计算代理质量评分 (0-100)
+
+        结果中带有平滑统计(ewma_success / ewma_latency)时优先使用，避免单次波动影响评分
+        """
+        if not proxy_result['is_valid']:
+            return 0.0
         
-        # 匿名度权重: 20%
-        anonymity_scores = {
-            'elite': 100,
-            'anonymous': 80,
-            'transparent': 40,
-            'unknown': 50
-        }
-        anonymity = proxy_result.get('anonymity', 'unknown')
-        score += anonymity_scores.get(anonymity, 50) * 0.2
-        
-        # 协议支持权重: 10%
-        protocol_scores = {
-            'https': 100,
-            'http': 80,
-            'socks5': 90,
-            'socks4': 70
-        }
-        protocol = proxy_result.get('protocol', 'http')
-        score += protocol_scores.get(protocol, 80) * 0.1
+        if proxy_result.get('ewma_success') is not None:
+            success_rate = proxy_result['ewma_success'] * 100
+            speed = proxy_result.get('ewma_latency')
+        else:
+            success_rate = proxy_result['success_rate']
+            speed = proxy_result['speed']
         
-        return round(score, 2)
+        return quality_score(success_rate, speed, proxy_result.get('anonymity'), proxy_result.get('protocol'))
     
     def generate_validation_report(self, results: List[Dict]) -> Dict:
         """生成验证报告"""
@@ -319,6 +646,13 @@ class ProxyValidator:
         valid_success_rates = [r['success_rate'] for r in results if r['is_valid']]
         avg_success_rate = sum(valid_success_rates) / len(valid_success_rates) if valid_success_rates else 0
         
+        # 各阶段平均耗时
+        phase_averages = {}
+        for phase in TIMING_PHASES:
+            values = [r['timings'][phase] for r in results
+                      if r['is_valid'] and r.get('timings') and r['timings'].get(phase) is not None]
+            phase_averages[phase] = round(sum(values) / len(values), 2) if values else None
+        
         return {
             'summary': {
                 'total_proxies': total_proxies,
@@ -330,7 +664,8 @@ class ProxyValidator:
             'country_stats': country_stats,
             'performance': {
                 'avg_speed': round(avg_speed, 2),
-                'avg_success_rate': round(avg_success_rate, 2)
+                'avg_success_rate': round(avg_success_rate, 2),
+                'avg_phase_timings': phase_averages
             },
             'top_proxies': [
                 {
@@ -346,20 +681,42 @@ class ProxyValidator:
         }
 
 if __name__ == "__main__":
-    # 测试代理验证
-    validator = ProxyValidator()
-    
-    # 示例代理
-    test_proxies = [
-        {'id': 1, 'ip': '127.0.0.1', 'port': 8080, 'protocol': 'http'},
-        {'id': 2, 'ip': '127.0.0.1', 'port': 8081, 'protocol': 'http'},
-    ]
+    import argparse
     
-    print("开始验证代理...")
-    results = validator.validate_proxies_batch(test_proxies)
+    parser = argparse.ArgumentParser(description="代理验证脚本")
+    parser.add_argument("--from-db", action="store_true", help="流式验证数据库中的全部代理并分批写回")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批写回数据库的结果数")
     
-    # 生成报告
-    report = validator.generate_validation_report(results)
+    args = parser.parse_args()
+    validator = ProxyValidator()
     
-    print("\n验证报告:")
-    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.from_db:
+        from app.core.database import SessionLocal
+        from app.services.proxy_service import ProxyService, ValidationResultWriter
+        
+        reader_db = SessionLocal()
+        writer_db = SessionLocal()
+        try:
+            proxies = ProxyService(reader_db).iter_proxies_for_validation()
+            with ValidationResultWriter(writer_db, batch_size=args.batch_size) as writer:
+                for result in validator.validate_proxies_stream(proxies):
+                    writer.write(result)
+            print(f"验证完成，共写回 {writer.written} 条结果")
+        finally:
+            reader_db.close()
+            writer_db.close()
+    else:
+        # 示例代理
+        test_proxies = [
+            {'id': 1, 'ip': '127.0.0.1', 'port': 8080, 'protocol': 'http'},
+            {'id': 2, 'ip': '127.0.0.1', 'port': 8081, 'protocol': 'http'},
+        ]
+        
+        print("开始验证代理...")
+        results = validator.validate_proxies_batch(test_proxies)
+        
+        # 生成报告
+        report = validator.generate_validation_report(results)
+        
+        print("\n验证报告:")
+        print(json.dumps(report, indent=2, ensure_ascii=False))
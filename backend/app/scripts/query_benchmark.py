@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+代理查询基准测试脚本
+向指定数据库写入大量模拟代理（默认100万行），分别在删除和建立 proxies 表查询索引的情况下
+执行选择、筛选、统计等常用查询，输出执行计划和耗时中位数
+
+会在目标库中建表并写入数据，请使用单独的测试库，不要指向生产库
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import json
+import logging
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Callable
+from sqlalchemy import create_engine, select, func, case, insert, text
+from sqlalchemy.engine import Engine
+from app.core.database import Base
+from app.models.proxy import Proxy
+from app.models.proxy_website import ProxyWebsite
+import app.models  # noqa: F401  注册全部模型
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROTOCOLS = [('http', 50), ('https', 30), ('socks5', 15), ('socks4', 5)]
+COUNTRIES = ['中国', '美国', '日本', '德国', '俄罗斯', '巴西', '印度', '法国', '英国', '韩国',
+             '新加坡', '荷兰', '加拿大', '印度尼西亚', '越南', '泰国', '乌克兰', '波兰', '土耳其', '伊朗']
+
+# 直接使用表对象（Core），不依赖ORM映射
+proxies = Proxy.__table__
+websites = ProxyWebsite.__table__
+
+# 被测试的索引：模型上除主键索引外的查询索引
+QUERY_INDEXES = [index for index in proxies.indexes if index.name != 'ix_proxies_id']
+
+def _queries(now: datetime) -> Dict[str, Callable]:
+    """名称 -> 生成查询语句的函数，对应服务层中的查询路径"""
+    active = proxies.c.is_active == True
+    return {
+        # 原 get_random_proxy：按协议/国家筛选有效代理，取评分最高的一个
+        'select_best': lambda: select(proxies).where(active, proxies.c.protocol == 'https', proxies.c.country == '日本')
+            .order_by(proxies.c.quality_score.desc(), proxies.c.success_rate.desc()).limit(1),
+        # 不带筛选的有效代理排行
+        'ranking_top100': lambda: select(proxies.c.id, proxies.c.ip, proxies.c.port).where(active)
+            .order_by(proxies.c.quality_score.desc(), proxies.c.success_rate.desc()).limit(100),
+        # get_proxies 的常见筛选
+        'filter_protocol_country': lambda: select(proxies).where(
+            proxies.c.protocol == 'socks5', proxies.c.country == '德国', active).limit(100),
+        'filter_source': lambda: select(proxies).where(proxies.c.source_website_id == 7, active).limit(100),
+        # count_proxies_by_source
+        'count_by_source': lambda: select(
+            proxies.c.source_website_id, func.count(proxies.c.id), func.count(case((active, 1)))
+        ).where(proxies.c.source_website_id.in_([1, 2, 3])).group_by(proxies.c.source_website_id),
+        # 统计汇总表的重建（rebuild_stats）
+        'stats_group_by': lambda: select(
+            proxies.c.protocol, proxies.c.country, func.count(proxies.c.id)
+        ).group_by(proxies.c.protocol, proxies.c.country),
+        # 代理选择器的增量刷新
+        'updated_since': lambda: select(proxies).where(proxies.c.updated_at >= now - timedelta(minutes=1)),
+    }
+
+def seed(engine: Engine, rows: int, sources: int = 20, seed_value: int = 42, chunk_size: int = 10000) -> int:
+    """建表并补足模拟代理到 rows 行，返回新写入的行数"""
+    Base.metadata.create_all(engine)
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    protocols, weights = zip(*PROTOCOLS)
+
+    with engine.begin() as conn:
+        existing_sources = conn.execute(select(func.count(websites.c.id))).scalar()
+        if existing_sources < sources:
+            conn.execute(insert(websites), [
+                {'name': f'benchmark-{i}', 'url': f'http://benchmark-{i}.invalid/', 'is_active': True}
+                for i in range(existing_sources, sources)
+            ])
+        source_ids = list(conn.execute(select(websites.c.id)).scalars())
+        existing = conn.execute(select(func.count(proxies.c.id))).scalar()
+
+    inserted = 0
+    while existing + inserted < rows:
+        count = min(chunk_size, rows - existing - inserted)
+        base = existing + inserted
+        chunk = []
+        for offset in range(count):
+            number = base + offset
+            is_active = rng.random() < 0.2
+            chunk.append({
+                # 按序号生成IP，保证 (ip, port, protocol) 不重复
+                'ip': f'10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}',
+                'port': 1024 + (number >> 24),
+                'protocol': rng.choices(protocols, weights)[0],
+                'country': COUNTRIES[min(int(rng.paretovariate(1.2)) - 1, len(COUNTRIES) - 1)],
+                'anonymity': rng.choice(['elite', 'anonymous', 'transparent', 'unknown']),
+                'speed': round(rng.uniform(50, 5000), 1),
+                'success_rate': round(rng.uniform(30, 100), 2) if is_active else round(rng.uniform(0, 30), 2),
+                'quality_score': round(rng.uniform(0, 100), 2) if is_active else 0.0,
+                'is_active': is_active,
+                'source_website_id': rng.choice(source_ids),
+                'created_at': now,
+                'updated_at': now - timedelta(seconds=rng.randint(0, 7 * 24 * 3600))
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(proxies), chunk)
+        inserted += count
+        if inserted % (chunk_size * 10) == 0:
+            logger.info(f"已写入 {existing + inserted} 行")
+    return inserted
+
+def analyze(engine: Engine):
+    statement = {'sqlite': 'ANALYZE', 'postgresql': 'ANALYZE proxies', 'mysql': 'ANALYZE TABLE proxies'}
+    sql = statement.get(engine.dialect.name)
+    if sql:
+        with engine.begin() as conn:
+            conn.execute(text(sql))
+
+def explain(engine: Engine, stmt) -> List[str]:
+    sql = str(stmt.compile(engine, compile_kwargs={'literal_binds': True}))
+    prefix = {'sqlite': 'EXPLAIN QUERY PLAN ', 'postgresql': 'EXPLAIN (ANALYZE, BUFFERS) '}.get(engine.dialect.name, 'EXPLAIN ')
+    with engine.connect() as conn:
+        rows = conn.execute(text(prefix + sql)).all()
+    if engine.dialect.name == 'sqlite':
+        return [row[-1] for row in rows]
+    return [' | '.join(str(value) for value in row) for row in rows]
+
+def run_queries(engine: Engine, repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for name, build in _queries(datetime.utcnow()).items():
+        stmt = build()
+        timings = []
+        with engine.connect() as conn:
+            conn.execute(stmt).all()  # 预热
+            for _ in range(repeat):
+                start_time = time.perf_counter()
+                conn.execute(stmt).all()
+                timings.append(time.perf_counter() - start_time)
+        results[name] = {
+            'median_ms': round(statistics.median(timings) * 1000, 3),
+            'plan': explain(engine, stmt)
+        }
+    return results
+
+def benchmark(engine: Engine, repeat: int = 5) -> Dict[str, Dict]:
+    """先删除查询索引测一遍，再建立索引测一遍"""
+    for index in QUERY_INDEXES:
+        index.drop(engine, checkfirst=True)
+    analyze(engine)
+    before = run_queries(engine, repeat)
+
+    start_time = time.perf_counter()
+    for index in QUERY_INDEXES:
+        index.create(engine, checkfirst=True)
+    index_seconds = time.perf_counter() - start_time
+    analyze(engine)
+    after = run_queries(engine, repeat)
+
+    report = {}
+    for name in before:
+        report[name] = {
+            'before_ms': before[name]['median_ms'],
+            'after_ms': after[name]['median_ms'],
+            'speedup': round(before[name]['median_ms'] / after[name]['median_ms'], 1) if after[name]['median_ms'] else None,
+            'plan_before': before[name]['plan'],
+            'plan_after': after[name]['plan']
+        }
+    report['_index_build_seconds'] = round(index_seconds, 2)
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理查询基准测试（会写入测试数据，请使用单独的测试库）")
+    parser.add_argument("--database-url", default="sqlite:///proxy_query_benchmark.db", help="测试库连接串")
+    parser.add_argument("--rows", type=int, default=1000000, help="proxies 表的行数")
+    parser.add_argument("--repeat", type=int, default=5, help="每个查询的执行次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    start_time = time.time()
+    inserted = seed(engine, args.rows, seed_value=args.seed)
+    logger.info(f"写入 {inserted} 行模拟代理，耗时 {time.time() - start_time:.1f}s")
+
+    results = benchmark(engine, repeat=args.repeat)
+    print("\n查询基准测试结果:")
+    print(json.dumps(results, indent=2, ensure_ascii=False))
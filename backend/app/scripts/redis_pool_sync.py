@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Redis代理池同步脚本
+从数据库重新载入全部有效代理到Redis代理池（首次启用 PROXY_POOL_BACKEND=redis 或数据不一致时使用），
+之后验证结果会增量写入
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import logging
+from app.core.database import SessionLocal
+from app.services.redis_pool import RedisProxyPool
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Redis代理池同步")
+    parser.add_argument("--prefix", default=None, help="键前缀，默认使用 PROXY_POOL_REDIS_PREFIX")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批写入的代理数")
+
+    args = parser.parse_args()
+
+    pool = RedisProxyPool(prefix=args.prefix)
+    db = SessionLocal()
+    try:
+        count = pool.rebuild(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    logger.info(f"已载入 {count} 个有效代理，全部分片共 {pool.count()} 个")
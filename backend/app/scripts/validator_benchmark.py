@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+代理验证器基准测试脚本
+在本地启动一批模拟代理（可配置延迟分布、失败率、挂起和匿名度），
+用 ProxyValidator 验证它们并报告吞吐量、单代理耗时分位数、峰值内存和结果准确率，
+可保存为基线并与之后的改动对比，无需访问外网
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import socket
+import time
+import tracemalloc
+from typing import List, Dict, Optional
+from app.scripts.proxy_validator import ProxyValidator
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 模拟的本机出口IP，透明代理会在请求头中泄露它
+BENCH_ORIGIN_IP = '203.0.113.7'
+BENCH_JUDGE_URL = 'http://bench.judge.invalid/get'
+
+def build_proxy_specs(count: int, dead_ratio: float = 0.5, hang_ratio: float = 0.05,
+                      failure_rate: float = 0.0, latency_median: float = 200.0,
+                      latency_sigma: float = 0.5, anonymity_mix: Optional[Dict[str, float]] = None,
+                      seed: int = 42) -> List[Dict]:
+    """生成模拟代理的行为配置"""
+    rng = random.Random(seed)
+    anonymity_mix = anonymity_mix or {'elite': 0.4, 'anonymous': 0.4, 'transparent': 0.2}
+    levels = list(anonymity_mix)
+    weights = [anonymity_mix[level] for level in levels]
+
+    specs = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < dead_ratio:
+            behavior = 'dead'
+        elif roll < dead_ratio + hang_ratio:
+            behavior = 'hang'
+        else:
+            behavior = 'alive'
+        specs.append({
+            'index': i,
+            'behavior': behavior,
+            'failure_rate': failure_rate,
+            'latency_median': latency_median,
+            'latency_sigma': latency_sigma,
+            'anonymity': rng.choices(levels, weights)[0],
+            'exit_ip': f'198.51.100.{i % 254 + 1}'
+        })
+    return specs
+
+def expected_outcome(spec: Dict) -> Dict:
+    """模拟代理的预期验证结果"""
+    valid = spec['behavior'] == 'alive' and spec['failure_rate'] < 0.5
+    return {'is_valid': valid, 'anonymity': spec['anonymity'] if valid else 'unknown'}
+
+async def _handle_proxy_connection(spec: Dict, rng: random.Random,
+                                   reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """模拟代理：直接以回显接口的格式应答转发过来的请求"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip()] = value.strip()
+
+            if spec['behavior'] == 'hang':
+                await asyncio.sleep(3600)
+                break
+
+            latency = rng.lognormvariate(0, spec['latency_sigma']) * spec['latency_median'] / 1000
+            await asyncio.sleep(latency)
+
+            if rng.random() < spec['failure_rate']:
+                writer.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n')
+                await writer.drain()
+                continue
+
+            # 按匿名度加入代理会附加的请求头
+            headers.pop('Proxy-Connection', None)
+            if spec['anonymity'] == 'transparent':
+                headers['X-Forwarded-For'] = BENCH_ORIGIN_IP
+            elif spec['anonymity'] == 'anonymous':
+                headers['Via'] = '1.1 bench-proxy'
+
+            url = request_line.split()[1].decode('latin-1')
+            body = json.dumps({'args': {}, 'headers': headers, 'origin': spec['exit_ip'], 'url': url}).encode()
+            writer.write(
+                b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                + f'Content-Length: {len(body)}\r\n\r\n'.encode()
+                + body
+            )
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+def _reserve_closed_port() -> int:
+    """取一个当前未监听的端口，连接时会被拒绝"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _run_swarm(specs: List[Dict], ready_queue, stop_event, seed: int):
+    """子进程中运行模拟代理，避免与验证器争用GIL和混入内存统计"""
+    async def main():
+        rng = random.Random(seed)
+        servers = []
+        ports = []
+        for spec in specs:
+            if spec['behavior'] == 'dead':
+                ports.append(_reserve_closed_port())
+                continue
+            server = await asyncio.start_server(
+                lambda r, w, spec=spec: _handle_proxy_connection(spec, rng, r, w),
+                '127.0.0.1', 0, backlog=1024
+            )
+            servers.append(server)
+            ports.append(server.sockets[0].getsockname()[1])
+        ready_queue.put(ports)
+        while not stop_event.is_set():
+            await asyncio.sleep(0.2)
+        for server in servers:
+            server.close()
+
+    asyncio.run(main())
+
+class TimedProxyValidator(ProxyValidator):
+    """记录每个代理的检测总耗时"""
+
+    def validate_proxy(self, proxy: Dict) -> Dict:
+        start_time = time.perf_counter()
+        result = super().validate_proxy(proxy)
+        result['check_time'] = (time.perf_counter() - start_time) * 1000
+        return result
+
+    async def validate_proxy_async(self, proxy: Dict) -> Dict:
+        start_time = time.perf_counter()
+        result = await super().validate_proxy_async(proxy)
+        result['check_time'] = (time.perf_counter() - start_time) * 1000
+        return result
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return round(values[index], 2)
+
+def run_benchmark(specs: List[Dict], mode: str = 'async', timeout: float = 2.0,
+                  concurrency: int = 1000, max_workers: int = 50, seed: int = 42) -> Dict:
+    """启动模拟代理并运行一次验证，返回指标"""
+    ctx = multiprocessing.get_context('spawn')
+    ready_queue = ctx.Queue()
+    stop_event = ctx.Event()
+    swarm = ctx.Process(target=_run_swarm, args=(specs, ready_queue, stop_event, seed), daemon=True)
+    swarm.start()
+    try:
+        ports = ready_queue.get(timeout=120)
+        proxies = [
+            {'id': spec['index'], 'ip': '127.0.0.1', 'port': port, 'protocol': 'http'}
+            for spec, port in zip(specs, ports)
+        ]
+
+        validator = TimedProxyValidator(
+            timeout=timeout, max_workers=max_workers, concurrency=concurrency,
+            origin_ip=BENCH_ORIGIN_IP
+        )
+        validator.test_urls = [BENCH_JUDGE_URL]
+
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        if mode == 'sync':
+            results = validator.validate_proxies_batch(proxies)
+        elif mode == 'async':
+            results = validator.validate_proxies_batch(proxies, use_async=True)
+        elif mode == 'staged':
+            results = validator.validate_proxies_staged(proxies)
+        elif mode == 'stream':
+            results = list(validator.validate_proxies_stream(proxies))
+        else:
+            raise ValueError(f"未知的验证模式: {mode}")
+        elapsed = time.perf_counter() - start_time
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        stop_event.set()
+        swarm.join(timeout=10)
+
+    # 准确率：有效性判断与匿名度判断分别统计
+    spec_by_id = {spec['index']: spec for spec in specs}
+    validity_hits = 0
+    anonymity_total = 0
+    anonymity_hits = 0
+    for result in results:
+        expected = expected_outcome(spec_by_id[result['proxy_id']])
+        if result['is_valid'] == expected['is_valid']:
+            validity_hits += 1
+        if expected['is_valid'] and result['is_valid']:
+            anonymity_total += 1
+            if result.get('anonymity') == expected['anonymity']:
+                anonymity_hits += 1
+
+    check_times = [result['check_time'] for result in results if 'check_time' in result]
+    return {
+        'mode': mode,
+        'proxies': len(specs),
+        'elapsed': round(elapsed, 3),
+        'checks_per_second': round(len(results) / elapsed, 2) if elapsed else None,
+        'check_time_p50': _percentile(check_times, 50),
+        'check_time_p99': _percentile(check_times, 99),
+        'peak_memory_mb': round(peak_memory / 1024 / 1024, 2),
+        'validity_accuracy': round(validity_hits / len(results) * 100, 2) if results else None,
+        'anonymity_accuracy': round(anonymity_hits / anonymity_total * 100, 2) if anonymity_total else None
+    }
+
+def compare_with_baseline(report: Dict, baseline: Dict) -> Dict:
+    """与基线对比，给出各数值指标的变化百分比"""
+    changes = {}
+    for key, value in report.items():
+        base = baseline.get(key)
+        if isinstance(value, (int, float)) and isinstance(base, (int, float)) and base:
+            changes[key] = round((value - base) / base * 100, 2)
+    return changes
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代理验证器基准测试")
+    parser.add_argument("--proxies", type=int, default=500, help="模拟代理数量")
+    parser.add_argument("--mode", choices=["sync", "async", "staged", "stream"], default="async", help="验证模式")
+    parser.add_argument("--dead-ratio", type=float, default=0.5, help="拒绝连接的代理比例")
+    parser.add_argument("--hang-ratio", type=float, default=0.05, help="接受连接但不响应的代理比例")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="存活代理单次请求失败的概率")
+    parser.add_argument("--latency-median", type=float, default=200.0, help="响应延迟中位数(ms)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="对数正态延迟分布的sigma")
+    parser.add_argument("--anonymity-mix", default="elite:0.4,anonymous:0.4,transparent:0.2",
+                        help="匿名度分布，例如 elite:0.5,anonymous:0.5")
+    parser.add_argument("--timeout", type=float, default=2.0, help="验证超时(秒)")
+    parser.add_argument("--concurrency", type=int, default=1000, help="异步模式并发上限")
+    parser.add_argument("--max-workers", type=int, default=50, help="线程模式工作线程数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--save-baseline", help="将结果保存为基线文件")
+    parser.add_argument("--baseline", help="与指定的基线文件对比")
+
+    args = parser.parse_args()
+
+    mix = {}
+    for item in args.anonymity_mix.split(','):
+        level, _, weight = item.partition(':')
+        mix[level.strip()] = float(weight)
+
+    specs = build_proxy_specs(
+        args.proxies, dead_ratio=args.dead_ratio, hang_ratio=args.hang_ratio,
+        failure_rate=args.failure_rate, latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma, anonymity_mix=mix, seed=args.seed
+    )
+    report = run_benchmark(
+        specs, mode=args.mode, timeout=args.timeout, concurrency=args.concurrency,
+        max_workers=args.max_workers, seed=args.seed
+    )
+
+    print("\n基准测试结果:")
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print("\n相对基线的变化(%):")
+        print(json.dumps(compare_with_baseline(report, baseline), indent=2, ensure_ascii=False))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n基线已保存到 {args.save_baseline}")
@@ -0,0 +1,19 @@
+from typing import Dict, Any, Mapping, Optional
+
+def build_echo_payload(client_ip: str, headers: Mapping[str, str], url: str,
+                       args: Optional[Mapping[str, str]] = None) -> Dict[str, Any]:
+    """构造与 httpbin /get 格式一致的回显内容，供代理验证器判断匿名度"""
+    return {
+        'args': dict(args or {}),
+        'headers': {_title_case(key): value for key, value in headers.items()},
+        'origin': client_ip,
+        'url': url
+    }
+
+def build_ip_payload(client_ip: str) -> Dict[str, Any]:
+    """构造与 httpbin /ip 格式一致的回显内容"""
+    return {'origin': client_ip}
+
+def _title_case(header: str) -> str:
+    """统一请求头大小写，例如 x-forwarded-for -> X-Forwarded-For"""
+    return '-'.join(part.capitalize() for part in header.split('-'))
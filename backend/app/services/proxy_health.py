@@ -0,0 +1,115 @@
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# 平滑统计参数
+HEALTH_HALF_LIFE = 6 * 3600  # 历史观测的半衰期(秒)
+MIN_ALPHA = 0.1  # 单次观测的最小权重，保证高频检测时也能跟上变化
+QUANTILE_STEP = 0.05  # 分位数估计每次调整的相对步长
+ACTIVE_THRESHOLD = 0.3  # 平滑成功率达到30%视为有效，与单次验证的阈值一致
+
+# 单次检测分阶段计时的阶段名，对应 Proxy 表中的 connect_ms / tls_ms / ttfb_ms
+TIMING_PHASES = ['connect', 'tls', 'ttfb']
+
+ANONYMITY_SCORES = {
+    'elite': 100,
+    'anonymous': 80,
+    'transparent': 40,
+    'unknown': 50
+}
+
+PROTOCOL_SCORES = {
+    'https': 100,
+    'http': 80,
+    'socks5': 90,
+    'socks4': 70
+}
+
+def decay_alpha(elapsed_seconds: Optional[float], half_life: float = HEALTH_HALF_LIFE) -> float:
+    """新观测的权重：距上次观测越久，历史数据衰减得越多"""
+    if elapsed_seconds is None:
+        return 1.0
+    return max(MIN_ALPHA, 1 - 0.5 ** (max(elapsed_seconds, 0) / half_life))
+
+def update_quantile(estimate: Optional[float], value: float, quantile: float) -> float:
+    """流式分位数估计：只保存一个数，稳定后约有 quantile 比例的观测低于估计值"""
+    if estimate is None:
+        return value
+    step = QUANTILE_STEP * max(estimate, 1.0)
+    if value > estimate:
+        return estimate + step * quantile
+    return max(0.0, estimate - step * (1 - quantile))
+
+def update_health(state: Dict[str, Any], success: float, latency: Optional[float],
+                  now: Optional[datetime] = None,
+                  timings: Optional[Dict[str, Optional[float]]] = None,
+                  observations: int = 1) -> Dict[str, Any]:
+    """用一次检测结果更新平滑统计
+
+    state 需包含 ewma_success / ewma_latency / latency_p50 / latency_p95 /
+    check_count / last_check_time 以及各阶段的 *_ms 字段；success 为本次检测的
+    成功比例(0-1)，latency 为本次最快响应时间(ms)，失败时为 None；
+    timings 为本次各阶段耗时(ms)，未发生的阶段为 None；
+    observations 为合并进本次结果的观测次数（如一批使用反馈），权重相当于逐次更新 observations 次
+    """
+    now = now or datetime.utcnow()
+    last_check_time = state.get('last_check_time')
+    elapsed = (now - last_check_time).total_seconds() if last_check_time and state.get('check_count') else None
+    alpha = decay_alpha(elapsed)
+    if observations > 1:
+        alpha = 1 - (1 - alpha) ** observations
+
+    ewma_success = state.get('ewma_success')
+    ewma_success = success if ewma_success is None else ewma_success + alpha * (success - ewma_success)
+
+    ewma_latency = state.get('ewma_latency')
+    latency_p50 = state.get('latency_p50')
+    latency_p95 = state.get('latency_p95')
+    if latency is not None:
+        ewma_latency = latency if ewma_latency is None else ewma_latency + alpha * (latency - ewma_latency)
+        latency_p50 = update_quantile(latency_p50, latency, 0.5)
+        latency_p95 = update_quantile(latency_p95, latency, 0.95)
+
+    # 各阶段耗时以整数毫秒平滑保存
+    phase_fields = {}
+    for phase in TIMING_PHASES:
+        field = f'{phase}_ms'
+        previous = state.get(field)
+        value = (timings or {}).get(phase)
+        if value is None:
+            phase_fields[field] = previous
+        elif previous is None:
+            phase_fields[field] = int(round(value))
+        else:
+            phase_fields[field] = int(round(previous + alpha * (value - previous)))
+
+    return {
+        **phase_fields,
+        'ewma_success': ewma_success,
+        'ewma_latency': ewma_latency,
+        'latency_p50': latency_p50,
+        'latency_p95': latency_p95,
+        'check_count': (state.get('check_count') or 0) + max(observations, 1),
+        'last_check_time': now
+    }
+
+def quality_score(success_rate: float, speed: Optional[float], anonymity: Optional[str],
+                  protocol: Optional[str]) -> float:
+    """计算代理质量评分 (0-100)，success_rate 为 0-100，speed 单位为 ms"""
+    score = 0.0
+
+    # 成功率权重: 40%
+    score += (success_rate or 0) * 0.4
+
+    # 速度权重: 30%
+    if speed is not None:
+        # 速度越快分数越高，超过1000ms得0分
+        speed_score = max(0, 100 - (speed / 10))
+        score += speed_score * 0.3
+
+    # 匿名度权重: 20%
+    score += ANONYMITY_SCORES.get(anonymity or 'unknown', 50) * 0.2
+
+    # 协议支持权重: 10%
+    score += PROTOCOL_SCORES.get(protocol or 'http', 80) * 0.1
+
+    return round(score, 2)
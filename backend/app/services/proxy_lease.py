@@ -0,0 +1,203 @@
+"""
+代理租约与使用反馈
+
+爬虫 worker 一次租用多个代理，租约到期或归还前，同一进程内的其他租约尽量避开这些代理。
+worker 使用后批量上报每次使用的成败和耗时，反馈先在内存中按代理汇总，
+由后台线程每隔几秒合并进平滑健康统计写回数据库（一次批量更新），再让选择器立即增量刷新，
+真实流量的结果几秒内就会体现在选择权重中；写回失败的反馈放回缓存，下一次继续写回。
+
+租约只保存在当前进程内，多 worker 部署时各自维护；反馈写入数据库，所有 worker 共享。
+"""
+
+import heapq
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from app.services.proxy_selector import proxy_selector
+from app.services.proxy_service import ProxyService
+
+logger = logging.getLogger(__name__)
+
+class ProxyLeaseManager:
+    def __init__(self, default_ttl: int = 300, max_ttl: int = 3600):
+        self.default_ttl = default_ttl  # 默认租期(秒)
+        self.max_ttl = max_ttl
+        self._leases: Dict[str, Tuple[float, List[int]]] = {}  # 租约ID -> (到期时间, 代理ID)
+        self._leased: Dict[int, int] = {}  # 代理ID -> 持有它的未到期租约数
+        self._expiry: List[Tuple[float, str]] = []  # (到期时间, 租约ID) 的小顶堆
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            _, lease_id = heapq.heappop(self._expiry)
+            self._drop(lease_id)
+
+    def _drop(self, lease_id: str) -> bool:
+        lease = self._leases.pop(lease_id, None)
+        if lease is None:
+            return False
+        for proxy_id in lease[1]:
+            remaining = self._leased.get(proxy_id, 0) - 1
+            if remaining > 0:
+                self._leased[proxy_id] = remaining
+            else:
+                self._leased.pop(proxy_id, None)
+        return True
+
+    def lease_proxy_ids(self, lease_id: str) -> Optional[Set[int]]:
+        """租约中的代理ID，租约不存在或已过期时返回 None"""
+        with self._lock:
+            self._expire(time.monotonic())
+            lease = self._leases.get(lease_id)
+            return set(lease[1]) if lease else None
+
+    def leased_ids(self) -> Set[int]:
+        with self._lock:
+            self._expire(time.monotonic())
+            return set(self._leased)
+
+    def lease(self, db: Session, count: int, protocol: Optional[str] = None, country: Optional[str] = None,
+              ttl: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """租用最多 count 个代理，返回 {lease_id, expires_at, proxies}，没有可用代理时返回 None"""
+        ttl = min(ttl or self.default_ttl, self.max_ttl)
+        proxies = ProxyService(db).choose_proxies(count, protocol=protocol, country=country,
+                                                  exclude=self.leased_ids())
+        if not proxies:
+            return None
+
+        lease_id = uuid.uuid4().hex
+        expires = time.monotonic() + ttl
+        proxy_ids = [proxy['id'] for proxy in proxies]
+        with self._lock:
+            self._leases[lease_id] = (expires, proxy_ids)
+            heapq.heappush(self._expiry, (expires, lease_id))
+            for proxy_id in proxy_ids:
+                self._leased[proxy_id] = self._leased.get(proxy_id, 0) + 1
+        return {
+            'lease_id': lease_id,
+            'expires_at': datetime.utcnow() + timedelta(seconds=ttl),
+            'proxies': proxies
+        }
+
+    def release(self, lease_id: str) -> bool:
+        """提前归还租约，租约不存在或已过期时返回 False"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._drop(lease_id)
+
+class ProxyFeedbackBuffer:
+    def __init__(self, flush_interval: float = 2.0, max_pending: int = 5000):
+        self.flush_interval = flush_interval  # 写回数据库的最小间隔(秒)
+        self.max_pending = max_pending  # 缓存的代理数达到该值时不等间隔立即写回
+        # 代理ID -> [成功次数, 失败次数, 成功时的耗时之和, 有耗时的成功次数]
+        self._pending: Dict[int, List[float]] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, feedback: Iterable[Dict[str, Any]]) -> int:
+        """记录一批使用结果（proxy_id, success, latency_ms），返回记录的条数"""
+        count = 0
+        with self._lock:
+            for item in feedback:
+                values = self._pending.setdefault(item['proxy_id'], [0, 0, 0.0, 0])
+                if item['success']:
+                    values[0] += 1
+                    if item.get('latency_ms') is not None:
+                        values[2] += item['latency_ms']
+                        values[3] += 1
+                else:
+                    values[1] += 1
+                count += 1
+        return count
+
+    def flush(self, db: Session) -> int:
+        """把缓存的反馈合并进健康统计并写回数据库，返回写入的代理数"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        results = []
+        for proxy_id, (successes, failures, latency_sum, latency_count) in pending.items():
+            results.append({
+                'proxy_id': proxy_id,
+                'success_rate': successes / (successes + failures) * 100,
+                'speed': latency_sum / latency_count if latency_count else None,
+                'observations': int(successes + failures)
+            })
+        try:
+            ProxyService(db).apply_validation_results(results)
+        except Exception:
+            db.rollback()
+            self._restore(pending)
+            raise
+        proxy_selector.mark_stale()
+        return len(results)
+
+    def _restore(self, pending: Dict[int, List[float]]):
+        """写回失败时把这批反馈合并回缓存，与期间新收到的反馈累加"""
+        with self._lock:
+            for proxy_id, values in pending.items():
+                current = self._pending.get(proxy_id)
+                if current is None:
+                    self._pending[proxy_id] = values
+                else:
+                    for index, value in enumerate(values):
+                        current[index] += value
+
+    def maybe_flush(self, db: Session) -> int:
+        """距上次写回超过间隔或缓存过多时写回；已有请求在写回时直接返回"""
+        if not self._pending:
+            return 0
+        if len(self._pending) < self.max_pending and time.monotonic() - self._last_flush < self.flush_interval:
+            return 0
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self.flush(db)
+        except Exception as e:
+            logger.error(f"写回代理使用反馈失败，稍后重试: {e}")
+            return 0
+        finally:
+            self._flush_lock.release()
+
+    def start(self, session_factory: Callable[[], Session]):
+        """启动后台写回线程，空闲的 worker 上的反馈也会按间隔写回"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(session_factory,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台写回线程（不写回剩余反馈，退出前由调用方 flush）"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, session_factory: Callable[[], Session]):
+        while not self._stop.wait(self.flush_interval):
+            if not self._pending:
+                continue
+            db = session_factory()
+            try:
+                self.maybe_flush(db)
+            finally:
+                db.close()
+
+# 进程内共享的租约表和反馈缓存
+proxy_lease_manager = ProxyLeaseManager()
+proxy_feedback_buffer = ProxyFeedbackBuffer()
@@ -0,0 +1,306 @@
+"""
+紧凑的内存代理池
+
+(ip, port, protocol) 打包为一个整数键：地址左移后带一位IPv6标记，端口占16位，协议占3位。
+IPv4 的键不超过64位，按列存放在有序的 array 中（键 8 字节，其余列共约 25 字节），
+查找用二分；新增的代理先进入增量字典，积累到一定数量再整体排序合并。
+IPv6 的键超过64位，始终保存在增量字典中。
+"""
+
+import socket
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Iterator, Any, Union
+
+PROTOCOLS = ('http', 'https', 'socks4', 'socks5')
+PROTOCOL_CODES = {protocol: code for code, protocol in enumerate(PROTOCOLS)}
+
+EPOCH = datetime(1970, 1, 1)
+
+_MAX_PACKED = 1 << 64
+_ACTIVE = 1
+_DELETED = 2
+
+# 除键以外的列：(属性名, array类型码)，增量字典中的记录按同样的顺序存放
+# 去重键：能打包时为整数，否则为 (ip, port, protocol) 元组
+ProxyKey = Union[int, Tuple[str, Any, str]]
+
+_COLUMNS = (
+    ('_ids', 'q'),
+    ('_countries', 'H'),
+    ('_flags', 'B'),
+    ('_success', 'f'),
+    ('_quality', 'f'),
+    ('_fails', 'H'),
+    ('_last_check', 'I'),
+)
+
+def pack_key(ip: str, port: int, protocol: str) -> int:
+    """把 (ip, port, protocol) 打包为整数键，格式非法时抛出 ValueError"""
+    try:
+        address = int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big') << 1
+    except OSError:
+        try:
+            address = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big') << 1 | 1
+        except OSError:
+            raise ValueError(f"非法的IP地址: {ip}")
+    port = int(port)
+    if not 0 <= port <= 0xFFFF:
+        raise ValueError(f"非法的端口: {port}")
+    code = PROTOCOL_CODES.get(protocol)
+    if code is None:
+        raise ValueError(f"不支持的协议: {protocol}")
+    return (address << 19) | (port << 3) | code
+
+def proxy_key(ip: str, port: int, protocol: str) -> ProxyKey:
+    """去重用的键：优先打包为整数，无法打包的（如 "http,https" 这样的协议、带前导零的IP）退回为元组，不丢弃"""
+    try:
+        return pack_key(ip, port, protocol)
+    except ValueError:
+        return (ip, port, protocol)
+
+def unpack_key(key: int) -> Tuple[str, int, str]:
+    """pack_key 的逆操作"""
+    address = key >> 19
+    if address & 1:
+        ip = socket.inet_ntop(socket.AF_INET6, (address >> 1).to_bytes(16, 'big'))
+    else:
+        ip = socket.inet_ntop(socket.AF_INET, (address >> 1).to_bytes(4, 'big'))
+    return ip, (key >> 3) & 0xFFFF, PROTOCOLS[key & 7]
+
+def _to_epoch(value: Optional[datetime]) -> int:
+    return int((value - EPOCH).total_seconds()) if value else 0
+
+def _from_epoch(value: int) -> Optional[datetime]:
+    return EPOCH + timedelta(seconds=value) if value else None
+
+class ProxyRecord:
+    """代理池中一条记录的只读视图"""
+    __slots__ = ('key', 'id', 'ip', 'port', 'protocol', 'country', 'is_active',
+                 'success_rate', 'quality_score', 'fail_count', 'last_check_time')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'key'}
+
+class CompactProxyPool:
+    def __init__(self, merge_ratio: float = 0.5, min_merge: int = 65536):
+        self._keys = array('Q')
+        for name, typecode in _COLUMNS:
+            setattr(self, name, array(typecode))
+        self._delta: Dict[int, list] = {}
+        self._pending = 0  # 增量字典中等待合并的IPv4记录数
+        self._deleted = 0
+        # 增量字典达到 max(min_merge, 主段长度 * merge_ratio) 时合并
+        self.merge_ratio = merge_ratio
+        self.min_merge = min_merge
+        self._merge_at = min_merge
+        # 国家名编码为小整数，0 表示未知
+        self._country_names: List[Optional[str]] = [None]
+        self._country_codes: Dict[Optional[str], int] = {None: 0}
+
+    def _country_code(self, country: Optional[str]) -> int:
+        code = self._country_codes.get(country)
+        if code is None:
+            code = len(self._country_names)
+            self._country_names.append(country)
+            self._country_codes[country] = code
+        return code
+
+    def _find(self, key: int) -> int:
+        """主段中的位置，不存在或已删除时返回 -1"""
+        if key >= _MAX_PACKED:
+            return -1
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key and not self._flags[index] & _DELETED:
+            return index
+        return -1
+
+    def _normalize_key(self, item: Union[int, Tuple[str, int, str]]) -> int:
+        return item if isinstance(item, int) else pack_key(*item)
+
+    def __contains__(self, item: Union[int, Tuple[str, int, str]]) -> bool:
+        try:
+            key = self._normalize_key(item)
+        except ValueError:
+            return False
+        return key in self._delta or self._find(key) >= 0
+
+    def __len__(self) -> int:
+        return len(self._keys) - self._deleted + len(self._delta)
+
+    def add(self, ip: str, port: int, protocol: str, **fields) -> bool:
+        """添加代理，已存在时不做修改并返回 False"""
+        return self.add_key(pack_key(ip, port, protocol), **fields)
+
+    def add_key(self, key: int, proxy_id: int = 0, country: Optional[str] = None, is_active: bool = True,
+                success_rate: float = 0.0, quality_score: float = 0.0, fail_count: int = 0,
+                last_check_time: Optional[datetime] = None) -> bool:
+        if key in self._delta or self._find(key) >= 0:
+            return False
+        self._delta[key] = [
+            proxy_id or 0, self._country_code(country), _ACTIVE if is_active else 0,
+            success_rate or 0.0, quality_score or 0.0, min(fail_count or 0, 0xFFFF), _to_epoch(last_check_time)
+        ]
+        if key < _MAX_PACKED:
+            self._pending += 1
+            if self._pending >= self._merge_at:
+                self.compact()
+        return True
+
+    def update_key(self, key: int, **fields) -> bool:
+        """更新已有代理的字段，代理不存在时返回 False"""
+        values = {}
+        for name, value in fields.items():
+            if name == 'proxy_id':
+                values['_ids'] = value or 0
+            elif name == 'country':
+                values['_countries'] = self._country_code(value)
+            elif name == 'is_active':
+                values['_flags'] = _ACTIVE if value else 0
+            elif name == 'success_rate':
+                values['_success'] = value or 0.0
+            elif name == 'quality_score':
+                values['_quality'] = value or 0.0
+            elif name == 'fail_count':
+                values['_fails'] = min(value or 0, 0xFFFF)
+            elif name == 'last_check_time':
+                values['_last_check'] = _to_epoch(value)
+            else:
+                raise TypeError(f"未知的字段: {name}")
+
+        record = self._delta.get(key)
+        if record is not None:
+            for position, (name, _) in enumerate(_COLUMNS):
+                if name in values:
+                    record[position] = values[name]
+            return True
+        index = self._find(key)
+        if index < 0:
+            return False
+        for name, value in values.items():
+            getattr(self, name)[index] = value
+        return True
+
+    def discard_key(self, key: int) -> bool:
+        if self._delta.pop(key, None) is not None:
+            if key < _MAX_PACKED:
+                self._pending -= 1
+            return True
+        index = self._find(key)
+        if index < 0:
+            return False
+        self._flags[index] |= _DELETED
+        self._deleted += 1
+        return True
+
+    def get_key(self, key: int) -> Optional[ProxyRecord]:
+        record = self._delta.get(key)
+        if record is not None:
+            return self._make_record(key, record)
+        index = self._find(key)
+        return self._record_at(index) if index >= 0 else None
+
+    def get(self, ip: str, port: int, protocol: str) -> Optional[ProxyRecord]:
+        try:
+            return self.get_key(pack_key(ip, port, protocol))
+        except ValueError:
+            return None
+
+    def _record_at(self, index: int) -> ProxyRecord:
+        return self._make_record(self._keys[index], [getattr(self, name)[index] for name, _ in _COLUMNS])
+
+    def _make_record(self, key: int, values: list) -> ProxyRecord:
+        record = ProxyRecord()
+        record.key = key
+        record.ip, record.port, record.protocol = unpack_key(key)
+        record.id = values[0] or None
+        record.country = self._country_names[values[1]]
+        record.is_active = bool(values[2] & _ACTIVE)
+        record.success_rate = values[3]
+        record.quality_score = values[4]
+        record.fail_count = values[5]
+        record.last_check_time = _from_epoch(values[6])
+        return record
+
+    def keys(self) -> Iterator[int]:
+        flags = self._flags
+        for index, key in enumerate(self._keys):
+            if not flags[index] & _DELETED:
+                yield key
+        yield from list(self._delta)
+
+    def __iter__(self) -> Iterator[ProxyRecord]:
+        for key in self.keys():
+            yield self.get_key(key)
+
+    def filter(self, protocol: Optional[str] = None, country: Optional[str] = None,
+               is_active: Optional[bool] = None, min_quality: Optional[float] = None) -> Iterator[ProxyRecord]:
+        """按列扫描筛选，只为命中的行构造记录"""
+        protocol_code = PROTOCOL_CODES.get(protocol) if protocol else None
+        if protocol and protocol_code is None:
+            return
+        country_code = None
+        if country is not None:
+            country_code = self._country_codes.get(country)
+            if country_code is None:
+                return
+
+        def matches(key: int, country_value: int, flags: int, quality: float) -> bool:
+            return (
+                not flags & _DELETED
+                and (protocol_code is None or key & 7 == protocol_code)
+                and (country_code is None or country_value == country_code)
+                and (is_active is None or bool(flags & _ACTIVE) == is_active)
+                and (min_quality is None or quality >= min_quality)
+            )
+
+        for index, values in enumerate(zip(self._keys, self._countries, self._flags, self._quality)):
+            if matches(*values):
+                yield self._record_at(index)
+        for key, record in list(self._delta.items()):
+            if matches(key, record[1], record[2], record[4]):
+                yield self._make_record(key, record)
+
+    def compact(self):
+        """把增量字典中的IPv4记录合并进有序主段，同时清理已删除的行"""
+        narrow = [(key, record) for key, record in self._delta.items() if key < _MAX_PACKED]
+        if not narrow and not self._deleted:
+            return
+
+        if self._deleted:
+            live = [not flags & _DELETED for flags in self._flags]
+            keys = [key for key, keep in zip(self._keys, live) if keep]
+        else:
+            live = None
+            keys = self._keys.tolist()
+        keys.extend(key for key, _ in narrow)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+
+        self._keys = array('Q', map(keys.__getitem__, order))
+        for position, (name, typecode) in enumerate(_COLUMNS):
+            column = getattr(self, name)
+            if live is not None:
+                values = [value for value, keep in zip(column, live) if keep]
+            else:
+                values = column.tolist()
+            values.extend(record[position] for _, record in narrow)
+            setattr(self, name, array(typecode, map(values.__getitem__, order)))
+
+        for key, _ in narrow:
+            del self._delta[key]
+        self._pending = 0
+        self._deleted = 0
+        self._merge_at = max(self.min_merge, int(len(self._keys) * self.merge_ratio))
+
+    def memory_bytes(self) -> int:
+        """估算占用的内存（数组缓冲区 + 增量字典）"""
+        import sys
+        total = self._keys.buffer_info()[1] * self._keys.itemsize
+        for name, _ in _COLUMNS:
+            column = getattr(self, name)
+            total += column.buffer_info()[1] * column.itemsize
+        total += sys.getsizeof(self._delta)
+        for key, record in self._delta.items():
+            total += sys.getsizeof(key) + sys.getsizeof(record)
+        return total
@@ -0,0 +1,251 @@
+"""
+进程内的代理选择器
+
+在内存中保存有效代理的快照，按质量评分加权随机挑选（别名法，每次选择 O(1)），
+协议、国家及其组合的筛选使用刷新时预建的索引。快照按 updated_at 水位线增量刷新，
+并定期全量重载以清除已删除的代理。增量刷新只重建有变化的分组的别名表，
+刷新时整体替换快照，选择时无需加锁。
+
+刷新使用单独的会话，不影响调用方（请求）会话中的事务。
+updated_at 由写入方在提交之前按本机时钟生成，水位线只向前重叠 overlap 秒：
+提交晚于 updated_at 超过 overlap 秒的写入（长事务、写入方时钟落后）在增量刷新中可能读不到，
+这类变化最迟在下一次全量重载（full_refresh_interval）时生效。
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple, Any
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.models.proxy import Proxy
+
+# 索引键: (协议, 国家)，None 表示不限
+GroupKey = Tuple[Optional[str], Optional[str]]
+
+PROXY_COLUMNS = [column.name for column in Proxy.__table__.columns]
+
+def proxy_snapshot(row: Proxy) -> Dict[str, Any]:
+    """代理行的全部字段"""
+    return {name: getattr(row, name) for name in PROXY_COLUMNS}
+
+class AliasTable:
+    """Vose 别名法：O(n) 构建，O(1) 按权重抽样"""
+    __slots__ = ('ids', 'prob', 'alias')
+
+    def __init__(self, ids: List[int], weights: List[float]):
+        n = len(ids)
+        self.ids = ids
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        total = sum(weights)
+        if not n or total <= 0:
+            return
+
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large[-1]
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(large.pop())
+        # 剩余项由于浮点误差可能略偏离 1，直接视为 1
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def sample(self, rng: random.Random = random) -> int:
+        column = int(rng.random() * len(self.ids))
+        if rng.random() < self.prob[column]:
+            return self.ids[column]
+        return self.ids[self.alias[column]]
+
+def _group_keys(proxy: Dict[str, Any]) -> Tuple[GroupKey, ...]:
+    protocol, country = proxy['protocol'], proxy['country']
+    return ((None, None), (protocol, None), (None, country), (protocol, country))
+
+class _Snapshot:
+    """一次刷新得到的不可变快照，members 为每个索引键下的 代理ID -> 权重"""
+
+    def __init__(self, proxies: Dict[int, Dict[str, Any]], members: Dict[GroupKey, Dict[int, float]],
+                 tables: Dict[GroupKey, AliasTable]):
+        self.proxies = proxies
+        self.members = members
+        self.tables = tables
+
+    @staticmethod
+    def weight(proxy: Dict[str, Any], min_weight: float) -> float:
+        return max(proxy['quality_score'] or proxy['success_rate'] or 0.0, min_weight)
+
+    @classmethod
+    def build(cls, proxies: Dict[int, Dict[str, Any]], min_weight: float) -> '_Snapshot':
+        """由全部有效代理构建快照"""
+        members: Dict[GroupKey, Dict[int, float]] = {}
+        for proxy_id, proxy in proxies.items():
+            weight = cls.weight(proxy, min_weight)
+            for key in _group_keys(proxy):
+                members.setdefault(key, {})[proxy_id] = weight
+        tables = {key: AliasTable(list(group), list(group.values())) for key, group in members.items()}
+        return cls(proxies, members, tables)
+
+    def updated(self, changes: Dict[int, Optional[Dict[str, Any]]], min_weight: float) -> '_Snapshot':
+        """应用一批变化（None 表示移除）得到新快照，只重建涉及到的索引键的别名表"""
+        proxies = dict(self.proxies)
+        members = dict(self.members)
+        changed = set()
+
+        def group(key: GroupKey) -> Dict[int, float]:
+            # 写时复制：只复制发生变化的分组，旧快照保持不变
+            if key not in changed:
+                members[key] = dict(members.get(key, {}))
+                changed.add(key)
+            return members[key]
+
+        for proxy_id, proxy in changes.items():
+            old = proxies.pop(proxy_id, None)
+            if old is not None:
+                for key in _group_keys(old):
+                    group(key).pop(proxy_id, None)
+            if proxy is not None:
+                proxies[proxy_id] = proxy
+                weight = self.weight(proxy, min_weight)
+                for key in _group_keys(proxy):
+                    group(key)[proxy_id] = weight
+
+        tables = dict(self.tables)
+        for key in changed:
+            if members[key]:
+                tables[key] = AliasTable(list(members[key]), list(members[key].values()))
+            else:
+                del members[key]
+                tables.pop(key, None)
+        return _Snapshot(proxies, members, tables)
+
+    def choose(self, protocol: Optional[str], country: Optional[str],
+               rng: random.Random = random) -> Optional[Dict[str, Any]]:
+        table = self.tables.get((protocol, country))
+        if not table:
+            return None
+        return self.proxies[table.sample(rng)]
+
+    def choose_many(self, protocol: Optional[str], country: Optional[str], count: int,
+                    exclude: Set[int] = frozenset(), rng: random.Random = random) -> List[Dict[str, Any]]:
+        """按权重不重复地选择最多 count 个代理，优先选择不在 exclude 中的，不足时再从 exclude 中补足"""
+        table = self.tables.get((protocol, country))
+        if not table:
+            return []
+        count = min(count, len(table))
+        chosen: Dict[int, None] = {}
+        # 拒绝采样：重复或被排除的抽样结果丢弃，尝试次数有上限，权重高度集中时不会长时间循环
+        for skip in (exclude, frozenset()):
+            attempts = count * 10
+            while len(chosen) < count and attempts:
+                attempts -= 1
+                proxy_id = table.sample(rng)
+                if proxy_id not in chosen and proxy_id not in skip:
+                    chosen[proxy_id] = None
+            if len(chosen) >= count:
+                break
+        return [self.proxies[proxy_id] for proxy_id in chosen]
+
+class ProxySelector:
+    def __init__(self, refresh_interval: float = 5.0, full_refresh_interval: float = 300.0,
+                 min_weight: float = 1.0, overlap: int = 5):
+        self.refresh_interval = refresh_interval  # 增量刷新的最小间隔(秒)
+        self.full_refresh_interval = full_refresh_interval  # 全量重载间隔(秒)，用于清除被删除的代理
+        self.min_weight = min_weight  # 评分为0的有效代理仍保留少量被选中的机会
+        # 增量刷新时水位线向前多取的秒数，覆盖同一时刻的更新、写入时的时钟差以及
+        # 生成 updated_at 到事务提交之间的耗时；超出该范围的写入等下一次全量重载（见模块说明）
+        self.overlap = timedelta(seconds=overlap)
+        self._snapshot = _Snapshot.build({}, min_weight)
+        self._watermark: Optional[datetime] = None
+        self._last_refresh = 0.0
+        self._last_full_refresh = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._snapshot.proxies)
+
+    def refresh(self, bind: Engine, full: bool = False) -> int:
+        """在单独的会话中从数据库刷新快照，返回读取的行数"""
+        full = full or self._watermark is None
+        with Session(bind=bind) as db:
+            return self._refresh(db, full)
+
+    def _refresh(self, db: Session, full: bool) -> int:
+        query = db.query(Proxy)
+        if full:
+            query = query.filter(Proxy.is_active == True)
+        else:
+            # 增量读取包括变为无效的代理，以便从快照中移除
+            query = query.filter(Proxy.updated_at >= self._watermark - self.overlap)
+
+        count = 0
+        watermark = self._watermark
+        current = self._snapshot.proxies
+        proxies: Dict[int, Dict[str, Any]] = {}
+        changes: Dict[int, Optional[Dict[str, Any]]] = {}
+        for row in query.yield_per(1000):
+            count += 1
+            if row.updated_at and (watermark is None or row.updated_at > watermark):
+                watermark = row.updated_at
+            if full:
+                proxies[row.id] = proxy_snapshot(row)
+            elif row.is_active:
+                proxy = proxy_snapshot(row)
+                # 水位线重叠区间内重复读到的未变化的行不触发重建
+                if current.get(row.id) != proxy:
+                    changes[row.id] = proxy
+            elif row.id in current:
+                changes[row.id] = None
+
+        if full:
+            self._snapshot = _Snapshot.build(proxies, self.min_weight)
+        elif changes:
+            self._snapshot = self._snapshot.updated(changes, self.min_weight)
+        self._watermark = watermark or self._watermark or datetime.min + self.overlap
+        now = time.monotonic()
+        self._last_refresh = now
+        if full:
+            self._last_full_refresh = now
+        return count
+
+    def mark_stale(self):
+        """本进程写入了会影响评分的数据，下一次选择时立即增量刷新"""
+        self._last_refresh = 0.0
+
+    def _maybe_refresh(self, db: Session):
+        now = time.monotonic()
+        if now - self._last_refresh < self.refresh_interval:
+            return
+        # 只有一个请求负责刷新，其余请求继续使用旧快照
+        if not self._refresh_lock.acquire(blocking=self._watermark is None):
+            return
+        try:
+            if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                self.refresh(db.get_bind(), full=now - self._last_full_refresh >= self.full_refresh_interval)
+        finally:
+            self._refresh_lock.release()
+
+    def choose(self, db: Session, protocol: Optional[str] = None,
+               country: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """按质量评分加权随机选择一个有效代理，返回快照字典的副本"""
+        self._maybe_refresh(db)
+        proxy = self._snapshot.choose(protocol or None, country or None)
+        return dict(proxy) if proxy else None
+
+    def choose_many(self, db: Session, count: int, protocol: Optional[str] = None, country: Optional[str] = None,
+                    exclude: Set[int] = frozenset()) -> List[Dict[str, Any]]:
+        """按质量评分加权、不重复地选择最多 count 个有效代理，尽量避开 exclude 中的代理"""
+        self._maybe_refresh(db)
+        return [dict(proxy) for proxy in self._snapshot.choose_many(protocol or None, country or None, count, exclude)]
+
+# 进程内共享的选择器
+proxy_selector = ProxySelector()
@@ -1,13 +1,26 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from typing import List, Optional, Dict, Any
+from sqlalchemy import func, and_, case, insert, select, Table, Column, MetaData
+from typing import List, Optional, Dict, Any, Iterator, Set, Tuple
 from app.models.proxy_website import ProxyWebsite
 from app.models.proxy import Proxy
+from app.models.proxy_source_page import ProxySourcePage
 from app.schemas.proxy import ProxyWebsiteCreate, ProxyWebsiteUpdate, ProxyCreate, ProxyUpdate
+from app.services.proxy_health import update_health, quality_score, ACTIVE_THRESHOLD, TIMING_PHASES
+from app.services.proxy_pool import CompactProxyPool, pack_key
+from app.services.proxy_selector import proxy_selector
+from app.services.redis_pool import redis_proxy_pool
+from app.services.proxy_stats import apply_stats_changes, load_stats, stats_row, StatsRow
+from app.core.config import settings
+from app.core.pagination import paginate
 from datetime import datetime, timedelta
 import requests
+import csv
+import io
 import time
 import random
+import logging
+
+logger = logging.getLogger(__name__)
 
 class ProxyWebsiteService:
     def __init__(self, db: Session):
@@ -26,6 +39,19 @@ class ProxyWebsiteService:
     def get_proxy_websites(self, skip: int = 0, limit: int = 100) -> List[ProxyWebsite]:
         return self.db.query(ProxyWebsite).offset(skip).limit(limit).all()
     
+    def get_proxy_websites_page(self, limit: int = 100, cursor: Optional[str] = None, skip: int = 0,
+                                descending: bool = False) -> Tuple[List[ProxyWebsite], Optional[str]]:
+        """按ID分页，返回 (本页数据, 下一页游标)"""
+        return paginate(self.db.query(ProxyWebsite), ProxyWebsite.id, limit,
+                        cursor=cursor, skip=skip, descending=descending)
+    
+    def get_crawlable_websites(self) -> List[ProxyWebsite]:
+        """获取启用且配置了抓取规则的网站"""
+        return self.db.query(ProxyWebsite).filter(
+            ProxyWebsite.is_active == True,
+            ProxyWebsite.crawl_rules.isnot(None)
+        ).all()
+    
     def update_proxy_website(self, proxy_website_id: int, proxy_website: ProxyWebsiteUpdate) -> Optional[ProxyWebsite]:
         db_proxy_website = self.get_proxy_website(proxy_website_id)
         if db_proxy_website:
@@ -55,21 +81,90 @@ class ProxyWebsiteService:
             db_proxy_website.updated_at = datetime.utcnow()
             self.db.commit()
 
+    def update_crawl_schedule(self, proxy_website_id: int, adaptive_interval: int,
+                              consecutive_failures: int, next_crawl_time: datetime):
+        """记录自适应爬取间隔、连续失败次数和下次爬取时间"""
+        db_proxy_website = self.get_proxy_website(proxy_website_id)
+        if db_proxy_website:
+            db_proxy_website.adaptive_interval = adaptive_interval
+            db_proxy_website.consecutive_failures = consecutive_failures
+            db_proxy_website.next_crawl_time = next_crawl_time
+            self.db.commit()
+
+class ProxySourcePageService:
+    """代理来源页面缓存（ETag / Last-Modified / 内容哈希）的读写"""
+
+    CACHE_FIELDS = ('website_id', 'etag', 'last_modified', 'content_hash', 'content_length',
+                    'last_fetch_time', 'last_changed_time')
+
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def load_page_cache(self) -> Dict[str, Dict[str, Any]]:
+        """读取全部页面缓存，键为URL"""
+        return {
+            page.url: {field: getattr(page, field) for field in self.CACHE_FIELDS}
+            for page in self.db.query(ProxySourcePage).all()
+        }
+    
+    def save_page_cache(self, entries: Dict[str, Dict[str, Any]]):
+        """保存页面缓存，已存在的URL更新，其余新增"""
+        if not entries:
+            return
+        existing = {
+            page.url: page
+            for page in self.db.query(ProxySourcePage).filter(ProxySourcePage.url.in_(list(entries)))
+        }
+        for url, entry in entries.items():
+            page = existing.get(url)
+            if page is None:
+                page = ProxySourcePage(url=url)
+                self.db.add(page)
+            for field in self.CACHE_FIELDS:
+                if field in entry:
+                    setattr(page, field, entry[field])
+        self.db.commit()
+
 class ProxyService:
+    # 批量写入爬取结果时使用的字段
+    UPSERT_FIELDS = ('ip', 'port', 'protocol', 'country', 'region', 'city', 'isp', 'anonymity',
+                     'speed', 'source_website_id')
+
     def __init__(self, db: Session):
         self.db = db
     
-    def create_proxy(self, proxy: ProxyCreate) -> Proxy:
+    def create_proxy(self, proxy: ProxyCreate) -> Optional[Proxy]:
+        """创建代理，(ip, port, protocol) 已存在时返回 None"""
+        exists = self.db.query(Proxy.id).filter(
+            Proxy.ip == proxy.ip, Proxy.port == proxy.port, Proxy.protocol == proxy.protocol
+        ).first()
+        if exists:
+            return None
         db_proxy = Proxy(**proxy.dict())
         self.db.add(db_proxy)
+        self.db.flush()
+        apply_stats_changes(self.db, [(None, stats_row(db_proxy))])
         self.db.commit()
         self.db.refresh(db_proxy)
+        self._sync_pool([db_proxy.id])
         return db_proxy
     
     def get_proxy(self, proxy_id: int) -> Optional[Proxy]:
         return self.db.query(Proxy).filter(Proxy.id == proxy_id).first()
     
     def get_proxies(self, skip: int = 0, limit: int = 100, filters: Dict[str, Any] = None) -> List[Proxy]:
+        return self._filter_proxies(filters).offset(skip).limit(limit).all()
+    
+    # 分页时可用的排序键，排序列不能为空
+    PAGE_SORTS = {'id': Proxy.id, 'updated_at': Proxy.updated_at}
+    
+    def get_proxies_page(self, limit: int = 100, filters: Dict[str, Any] = None, cursor: Optional[str] = None,
+                         skip: int = 0, sort: str = 'id', descending: bool = False) -> Tuple[List[Proxy], Optional[str]]:
+        """按 (排序键, ID) 分页，返回 (本页数据, 下一页游标)"""
+        return paginate(self._filter_proxies(filters), Proxy.id, limit, cursor=cursor, skip=skip,
+                        sort_column=self.PAGE_SORTS[sort], descending=descending)
+    
+    def _filter_proxies(self, filters: Dict[str, Any] = None):
         query = self.db.query(Proxy)
         
         if filters:
@@ -81,74 +176,494 @@ class ProxyService:
                 query = query.filter(Proxy.is_active == filters['is_active'])
             if filters.get('source_website_id'):
                 query = query.filter(Proxy.source_website_id == filters['source_website_id'])
+            # 按阶段耗时筛选，供对某一阶段延迟敏感的爬取任务使用
+            for phase in TIMING_PHASES:
+                max_value = filters.get(f'max_{phase}_ms')
+                if max_value is not None:
+                    query = query.filter(getattr(Proxy, f'{phase}_ms') <= max_value)
         
-        return query.offset(skip).limit(limit).all()
+        return query
     
     def update_proxy(self, proxy_id: int, proxy: ProxyUpdate) -> Optional[Proxy]:
         db_proxy = self.get_proxy(proxy_id)
         if db_proxy:
+            old_stats = stats_row(db_proxy)
             update_data = proxy.dict(exclude_unset=True)
             for field, value in update_data.items():
                 setattr(db_proxy, field, value)
             db_proxy.updated_at = datetime.utcnow()
+            apply_stats_changes(self.db, [(old_stats, stats_row(db_proxy))])
             self.db.commit()
             self.db.refresh(db_proxy)
+            self._sync_pool([proxy_id])
         return db_proxy
     
     def delete_proxy(self, proxy_id: int) -> bool:
         db_proxy = self.get_proxy(proxy_id)
         if db_proxy:
+            old_stats = stats_row(db_proxy)
             self.db.delete(db_proxy)
+            apply_stats_changes(self.db, [(old_stats, None)])
             self.db.commit()
+            self._sync_pool([proxy_id])
             return True
         return False
     
+    def _sync_pool(self, proxy_ids: List[int]):
+        """使用Redis代理池时，把这些代理的最新状态同步过去；Redis出错不影响数据库写入"""
+        if settings.PROXY_POOL_BACKEND != 'redis':
+            return
+        try:
+            redis_proxy_pool.sync(self.db, proxy_ids)
+        except Exception as e:
+            logger.warning(f"同步 {len(proxy_ids)} 个代理到Redis代理池失败: {e}")
+    
+    def _sync_pool_keys(self, proxies: List[Dict[str, Any]], batch_size: int = 1000):
+        """批量写入后按 (ip, port, protocol) 查出代理ID并同步到Redis代理池"""
+        if settings.PROXY_POOL_BACKEND != 'redis' or not proxies:
+            return
+        keys = {(proxy['ip'], proxy['port'], proxy['protocol']) for proxy in proxies}
+        ips = list({ip for ip, _, _ in keys})
+        for start in range(0, len(ips), batch_size):
+            rows = self.db.query(Proxy.id, Proxy.ip, Proxy.port, Proxy.protocol).filter(
+                Proxy.ip.in_(ips[start:start + batch_size])
+            )
+            self._sync_pool([row.id for row in rows if (row.ip, row.port, row.protocol) in keys])
+    
+    def _stats_by_key(self, keys: List[Tuple[str, int, str]], lock: bool = False,
+                      batch_size: int = 1000) -> Dict[Tuple[str, int, str], StatsRow]:
+        """按 (ip, port, protocol) 查询已存在代理的统计字段，lock 为 True 时锁定这些行直到事务结束"""
+        wanted = set(keys)
+        found = {}
+        ips = list({key[0] for key in wanted})
+        for start in range(0, len(ips), batch_size):
+            query = self.db.query(
+                Proxy.ip, Proxy.port, Proxy.protocol, Proxy.country, Proxy.is_active, Proxy.speed, Proxy.success_rate
+            ).filter(Proxy.ip.in_(ips[start:start + batch_size]))
+            if lock:
+                query = query.with_for_update()
+            for row in query:
+                key = (row.ip, row.port, row.protocol)
+                if key in wanted:
+                    found[key] = stats_row(row)
+        return found
+    
+    def _stats_by_id(self, proxy_ids: List[int], lock: bool = False,
+                     batch_size: int = 1000) -> Dict[int, StatsRow]:
+        """按ID查询代理的统计字段，lock 为 True 时锁定这些行直到事务结束"""
+        found = {}
+        for start in range(0, len(proxy_ids), batch_size):
+            query = self.db.query(
+                Proxy.id, Proxy.protocol, Proxy.country, Proxy.is_active, Proxy.speed, Proxy.success_rate
+            ).filter(Proxy.id.in_(proxy_ids[start:start + batch_size]))
+            if lock:
+                query = query.with_for_update()
+            for row in query:
+                found[row.id] = stats_row(row)
+        return found
+    
     def get_proxy_stats(self) -> Dict[str, Any]:
-        total_proxies = self.db.query(func.count(Proxy.id)).scalar()
-        active_proxies = self.db.query(func.count(Proxy.id)).filter(Proxy.is_active == True).scalar()
-        inactive_proxies = total_proxies - active_proxies
+        """概览统计及按协议、按国家的细分，读取按 (协议, 国家) 汇总的统计表"""
+        return load_stats(self.db)
+    
+    def get_random_proxy(self, protocol: str = None, country: str = None) -> Optional[Dict[str, Any]]:
+        """按质量评分加权随机选择有效代理
+
+        PROXY_POOL_BACKEND 为 redis 时从共享的Redis代理池选择，Redis不可用或对应分片为空时退回进程内选择器；
+        进程内选择器按需从数据库增量刷新
+        """
+        if settings.PROXY_POOL_BACKEND == 'redis':
+            try:
+                proxy = redis_proxy_pool.choose(protocol=protocol, country=country)
+                if proxy:
+                    return proxy
+            except Exception as e:
+                logger.warning(f"Redis代理池不可用，使用进程内选择器: {e}")
+        return proxy_selector.choose(self.db, protocol=protocol, country=country)
+
+    def choose_proxies(self, count: int, protocol: str = None, country: str = None,
+                       exclude: Set[int] = frozenset()) -> List[Dict[str, Any]]:
+        """按质量评分加权、不重复地选择最多 count 个有效代理，尽量避开 exclude 中的代理（如已租出的）"""
+        if settings.PROXY_POOL_BACKEND == 'redis':
+            try:
+                proxies = redis_proxy_pool.choose_many(count, protocol=protocol, country=country, exclude=exclude)
+                if proxies:
+                    return proxies
+            except Exception as e:
+                logger.warning(f"Redis代理池不可用，使用进程内选择器: {e}")
+        return proxy_selector.choose_many(self.db, count, protocol=protocol, country=country, exclude=exclude)
+
+    def bulk_update_proxies(self, proxy_ids: List[int], updates: Dict[str, Any]):
+        """批量更新代理信息"""
+        before = self._stats_by_id(proxy_ids, lock=True)
+        self.db.query(Proxy).filter(Proxy.id.in_(proxy_ids)).update(
+            {**updates, 'updated_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        after = self._stats_by_id(proxy_ids)
+        apply_stats_changes(self.db, [(before[proxy_id], after.get(proxy_id)) for proxy_id in before])
+        self.db.commit()
+        self._sync_pool(proxy_ids)
+    
+    def count_proxies_by_source(self, website_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+        """按来源网站统计代理总数和有效数，返回 website_id -> (总数, 有效数)"""
+        rows = self.db.query(
+            Proxy.source_website_id,
+            func.count(Proxy.id),
+            func.count(case((Proxy.is_active == True, 1)))
+        ).filter(Proxy.source_website_id.in_(website_ids)).group_by(Proxy.source_website_id).all()
+        return {row[0]: (row[1], row[2]) for row in rows}
+    
+    def iter_proxies_updated_since(self, since: datetime, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """读取 updated_at >= since 的代理（字段同 iter_proxies_for_validation，另含 updated_at），
+        供常驻的复检进程同步其他进程写入的检测结果"""
+        query = self.db.query(
+            Proxy.id, Proxy.ip, Proxy.port, Proxy.protocol, Proxy.country, Proxy.is_active,
+            Proxy.success_rate, Proxy.last_check_time, Proxy.fail_count, Proxy.updated_at
+        ).filter(Proxy.updated_at >= since)
+        for row in query.yield_per(batch_size):
+            yield {
+                'id': row.id,
+                'ip': row.ip,
+                'port': row.port,
+                'protocol': row.protocol,
+                'country': row.country,
+                'is_active': row.is_active,
+                'success_rate': row.success_rate,
+                'last_check_time': row.last_check_time,
+                'fail_count': row.fail_count or 0,
+                'updated_at': row.updated_at
+            }
+    
+    def iter_proxies_for_validation(self, batch_size: int = 1000, filters: Dict[str, Any] = None,
+                                    start_id: int = 0) -> Iterator[Dict[str, Any]]:
+        """按主键分段读取 id > start_id 的代理，供流式验证使用，内存中只保留一段"""
+        last_id = start_id
+        while True:
+            query = self.db.query(
+                Proxy.id, Proxy.ip, Proxy.port, Proxy.protocol, Proxy.country,
+                Proxy.is_active, Proxy.success_rate, Proxy.last_check_time, Proxy.fail_count
+            )
+            if filters:
+                if filters.get('protocol'):
+                    query = query.filter(Proxy.protocol == filters['protocol'])
+                if filters.get('is_active') is not None:
+                    query = query.filter(Proxy.is_active == filters['is_active'])
+            rows = query.filter(Proxy.id > last_id).order_by(Proxy.id).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                yield {
+                    'id': row.id,
+                    'ip': row.ip,
+                    'port': row.port,
+                    'protocol': row.protocol,
+                    'country': row.country,
+                    'is_active': row.is_active,
+                    'success_rate': row.success_rate,
+                    'last_check_time': row.last_check_time,
+                    'fail_count': row.fail_count or 0
+                }
+            last_id = rows[-1].id
+    
+    def load_proxy_pool(self, batch_size: int = 10000) -> CompactProxyPool:
+        """按主键分段读取全部代理到紧凑代理池（ID、国家、有效性、成功率、质量评分、失败次数、最后检测时间）"""
+        pool = CompactProxyPool()
+        last_id = 0
+        while True:
+            rows = self.db.query(
+                Proxy.id, Proxy.ip, Proxy.port, Proxy.protocol, Proxy.country, Proxy.is_active,
+                Proxy.success_rate, Proxy.quality_score, Proxy.fail_count, Proxy.last_check_time
+            ).filter(Proxy.id > last_id).order_by(Proxy.id).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                try:
+                    key = pack_key(row.ip, row.port, row.protocol)
+                except ValueError:
+                    continue
+                pool.add_key(
+                    key, proxy_id=row.id, country=row.country, is_active=row.is_active,
+                    success_rate=row.success_rate, quality_score=row.quality_score,
+                    fail_count=row.fail_count, last_check_time=row.last_check_time
+                )
+            last_id = rows[-1].id
+        pool.compact()
+        return pool
+    
+    def insert_discovered_proxies(self, proxies: List[Dict[str, Any]]) -> List[int]:
+        """写入新发现的代理（已存在则合并），返回与输入顺序一致的ID"""
+        self.bulk_upsert_proxies(proxies)
+        ids = self.get_proxy_ids([(proxy['ip'], proxy['port'], proxy['protocol']) for proxy in proxies])
+        return [ids[(proxy['ip'], proxy['port'], proxy['protocol'])] for proxy in proxies]
+    
+    def get_proxy_ids(self, keys: List[Tuple[str, int, str]]) -> Dict[Tuple[str, int, str], int]:
+        """按 (ip, port, protocol) 查询代理ID"""
+        wanted = set(keys)
+        ids = {}
+        ips = list({key[0] for key in wanted})
+        for start in range(0, len(ips), 1000):
+            rows = self.db.query(Proxy.id, Proxy.ip, Proxy.port, Proxy.protocol).filter(
+                Proxy.ip.in_(ips[start:start + 1000])
+            ).all()
+            for row in rows:
+                key = (row.ip, row.port, row.protocol)
+                if key in wanted:
+                    ids[key] = row.id
+        return ids
+    
+    def bulk_upsert_proxies(self, proxies: List[Dict[str, Any]], chunk_size: int = 1000,
+                            fields: Tuple[str, ...] = None, overwrite: bool = False) -> int:
+        """按 (ip, port, protocol) 批量写入爬取到的代理，每次执行提交 chunk_size 行
+
+        已存在的代理只补全为空的元数据（地区、运营商、来源等），匿名度仅在原值为 unknown 时覆盖，
+        成功率、响应时间等检测得到的字段保持不变；overwrite 为 True 时用传入的 fields 覆盖已有值。
+        返回去重后写入的代理数
+        """
+        fields = fields or self.UPSERT_FIELDS
+        rows = {}
+        for proxy in proxies:
+            row = {field: proxy.get(field) for field in fields}
+            row['protocol'] = (row['protocol'] or 'http').lower()
+            row['anonymity'] = row['anonymity'] or 'unknown'
+            rows[(row['ip'], row['port'], row['protocol'])] = row
+        rows = list(rows.values())
+        if not rows:
+            return 0
         
-        # 按协议统计
-        http_proxies = self.db.query(func.count(Proxy.id)).filter(Proxy.protocol == 'http').scalar()
-        https_proxies = self.db.query(func.count(Proxy.id)).filter(Proxy.protocol == 'https').scalar()
-        socks_proxies = self.db.query(func.count(Proxy.id)).filter(Proxy.protocol.like('socks%')).scalar()
+        # 语句只构造一次，按 executemany 方式执行：PostgreSQL / SQLite 由 SQLAlchemy 的 insertmanyvalues
+        # 合并为多行 VALUES，MySQL 驱动的 executemany 同样会改写为多行 INSERT
+        dialect = self.db.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(Proxy)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['ip', 'port', 'protocol'],
+                set_=self._upsert_assignments(stmt.excluded, fields, overwrite)
+            )
+        elif dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+            stmt = dialect_insert(Proxy)
+            stmt = stmt.on_duplicate_key_update(self._upsert_assignments(stmt.inserted, fields, overwrite))
+        else:
+            stmt = None
         
-        # 按国家统计
-        countries_count = self.db.query(func.count(func.distinct(Proxy.country))).scalar()
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            keys = [(row['ip'], row['port'], row['protocol']) for row in chunk]
+            before = self._stats_by_key(keys, lock=True)
+            if stmt is None:
+                self._merge_chunk(chunk, overwrite)
+            else:
+                self.db.execute(stmt, chunk)
+            after = self._stats_by_key(keys)
+            apply_stats_changes(self.db, [(before.get(key), after.get(key)) for key in keys])
+        self.db.commit()
+        self._sync_pool_keys(rows)
+        return len(rows)
+    
+    def copy_upsert_proxies(self, proxies: List[Dict[str, Any]], fields: Tuple[str, ...],
+                            overwrite: bool = False) -> int:
+        """PostgreSQL 的批量导入路径：COPY 写入临时表，再用一条 INSERT ... SELECT ... ON CONFLICT 合并
+
+        proxies 须已按 (ip, port, protocol) 去重，冲突时的处理与 bulk_upsert_proxies 相同。返回写入的代理数
+        """
+        if not proxies:
+            return 0
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
         
-        # 平均速度和成功率
-        avg_speed = self.db.query(func.avg(Proxy.speed)).scalar()
-        avg_success_rate = self.db.query(func.avg(Proxy.success_rate)).scalar()
+        connection = self.db.connection()
+        columns = Proxy.__table__.columns
+        staging = Table(
+            'proxies_import', MetaData(),
+            *[Column(field, columns[field].type) for field in fields],
+            prefixes=['TEMPORARY'], postgresql_on_commit='DROP'
+        )
+        staging.create(connection)
         
-        return {
-            'total_proxies': total_proxies,
-            'active_proxies': active_proxies,
-            'inactive_proxies': inactive_proxies,
-            'http_proxies': http_proxies,
-            'https_proxies': https_proxies,
-            'socks_proxies': socks_proxies,
-            'countries_count': countries_count,
-            'avg_speed': float(avg_speed) if avg_speed else None,
-            'avg_success_rate': float(avg_success_rate) if avg_success_rate else None
+        # CSV 中未加引号的空字段按 NULL 写入
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for proxy in proxies:
+            writer.writerow([proxy.get(field) for field in fields])
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY proxies_import ({', '.join(fields)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        finally:
+            cursor.close()
+        
+        keys = [(proxy['ip'], proxy['port'], proxy['protocol']) for proxy in proxies]
+        before = self._stats_by_key(keys, lock=True)
+        stmt = pg_insert(Proxy).from_select(list(fields), select(*staging.columns))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['ip', 'port', 'protocol'],
+            set_=self._upsert_assignments(stmt.excluded, fields, overwrite)
+        )
+        connection.execute(stmt)
+        after = self._stats_by_key(keys)
+        apply_stats_changes(self.db, [(before.get(key), after.get(key)) for key in keys])
+        self.db.commit()
+        self._sync_pool_keys(proxies)
+        return len(proxies)
+    
+    def _upsert_assignments(self, incoming, fields: Tuple[str, ...] = None, overwrite: bool = False) -> Dict[str, Any]:
+        """冲突时的更新表达式：已有值优先，只填补空缺；overwrite 时用新值覆盖 fields 中的非键字段"""
+        if overwrite:
+            assignments = {
+                field: getattr(incoming, field)
+                for field in fields or self.UPSERT_FIELDS if field not in ('ip', 'port', 'protocol')
+            }
+            assignments['updated_at'] = datetime.utcnow()
+            return assignments
+        assignments = {
+            field: func.coalesce(getattr(Proxy, field), getattr(incoming, field))
+            for field in ('country', 'region', 'city', 'isp', 'speed', 'source_website_id')
         }
+        assignments['anonymity'] = case(
+            (Proxy.anonymity == 'unknown', incoming.anonymity),
+            else_=Proxy.anonymity
+        )
+        assignments['updated_at'] = datetime.utcnow()
+        return assignments
     
-    def get_random_proxy(self, protocol: str = None, country: str = None) -> Optional[Proxy]:
-        query = self.db.query(Proxy).filter(Proxy.is_active == True)
+    def _merge_chunk(self, chunk: List[Dict[str, Any]], overwrite: bool = False):
+        """不支持 upsert 语法的数据库：先查出已存在的键，缺失的批量插入，已有的补全空缺或覆盖"""
+        existing = {
+            (proxy.ip, proxy.port, proxy.protocol): proxy
+            for proxy in self.db.query(Proxy).filter(Proxy.ip.in_({row['ip'] for row in chunk}))
+        }
+        new_rows = []
+        for row in chunk:
+            proxy = existing.get((row['ip'], row['port'], row['protocol']))
+            if proxy is None:
+                new_rows.append(row)
+                continue
+            if overwrite:
+                for field, value in row.items():
+                    setattr(proxy, field, value)
+                continue
+            for field in ('country', 'region', 'city', 'isp', 'speed', 'source_website_id'):
+                if getattr(proxy, field) is None:
+                    setattr(proxy, field, row[field])
+            if proxy.anonymity == 'unknown':
+                proxy.anonymity = row['anonymity']
+        if new_rows:
+            self.db.execute(insert(Proxy), new_rows)
+    
+    def delete_duplicate_proxies(self, batch_size: int = 1000) -> int:
+        """删除 (ip, port, protocol) 重复的代理，每组保留ID最小的一条，返回删除数量
+
+        在已有重复数据的库上添加唯一约束之前执行
+        """
+        keep_ids = self.db.query(func.min(Proxy.id)).group_by(Proxy.ip, Proxy.port, Proxy.protocol).subquery()
+        duplicate_ids = [
+            row.id for row in self.db.query(Proxy.id).filter(Proxy.id.notin_(keep_ids.select())).all()
+        ]
+        for start in range(0, len(duplicate_ids), batch_size):
+            batch = duplicate_ids[start:start + batch_size]
+            before = self._stats_by_id(batch, lock=True)
+            self.db.query(Proxy).filter(Proxy.id.in_(batch)).delete(synchronize_session=False)
+            apply_stats_changes(self.db, [(old, None) for old in before.values()])
+        self.db.commit()
+        return len(duplicate_ids)
+    
+    def apply_validation_results(self, results: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """将一批验证结果合并进平滑健康统计并写回 proxies 表，返回 代理ID -> 写入的字段
+
+        success_rate / speed / is_active 由平滑统计得出，单次偶然的超时或成功不会直接覆盖；
+        结果中的 observations 为合并的观测次数（使用反馈按代理汇总后写入），默认为1。
+        已被删除的代理不写入，也不出现在返回值中
+        """
+        results = [result for result in results if result.get('proxy_id')]
+        if not results:
+            return {}
         
-        if protocol:
-            query = query.filter(Proxy.protocol == protocol)
-        if country:
-            query = query.filter(Proxy.country == country)
+        # 一次查询取出本批代理的当前统计并锁定这些行直到提交：复检脚本、流水线和各 API worker
+        # 的反馈写回会并发更新同一代理，读-改-写不加锁会丢失其中一方的更新；按ID顺序加锁避免死锁
+        ids = {result['proxy_id'] for result in results}
+        rows = self.db.query(
+            Proxy.id, Proxy.protocol, Proxy.anonymity, Proxy.ewma_success, Proxy.ewma_latency,
+            Proxy.latency_p50, Proxy.latency_p95, Proxy.check_count, Proxy.last_check_time,
+            Proxy.connect_ms, Proxy.tls_ms, Proxy.ttfb_ms,
+            Proxy.country, Proxy.is_active, Proxy.speed, Proxy.success_rate
+        ).filter(Proxy.id.in_(ids)).order_by(Proxy.id).with_for_update().all()
+        states = {row.id: dict(row._mapping) for row in rows}
+        old_stats = {proxy_id: stats_row(state) for proxy_id, state in states.items()}
         
-        # 按成功率排序，选择成功率高的代理
-        query = query.order_by(Proxy.success_rate.desc())
+        now = datetime.utcnow()
+        mappings = {}
+        for result in results:
+            state = states.get(result['proxy_id'])
+            if state is None:
+                continue  # 代理已被删除
+            
+            health = update_health(state, (result.get('success_rate') or 0.0) / 100, result.get('speed'),
+                                   now, result.get('timings'), result.get('observations', 1))
+            state.update(health)
+            if result.get('anonymity') and result['anonymity'] != 'unknown':
+                state['anonymity'] = result['anonymity']
+            
+            is_active = health['ewma_success'] >= ACTIVE_THRESHOLD
+            success_rate = health['ewma_success'] * 100
+            mapping = {
+                'id': state['id'],
+                **health,
+                'anonymity': state['anonymity'],
+                'speed': health['ewma_latency'],
+                'success_rate': success_rate,
+                'is_active': is_active,
+                'quality_score': quality_score(success_rate, health['ewma_latency'],
+                                               state['anonymity'], state['protocol']) if is_active else 0.0,
+                'updated_at': now
+            }
+            if 'fail_count' in result:
+                mapping['fail_count'] = result['fail_count']
+            mappings[state['id']] = mapping
+            result.update(health)
         
-        return query.first()
+        if mappings:
+            self.db.bulk_update_mappings(Proxy, list(mappings.values()))
+            apply_stats_changes(self.db, [
+                (old_stats[proxy_id], stats_row({**old_stats[proxy_id], **mapping}))
+                for proxy_id, mapping in mappings.items()
+            ])
+            self.db.commit()
+            self._sync_pool(list(mappings))
+        else:
+            self.db.rollback()  # 释放行锁
+        return mappings
+
+class ValidationResultWriter:
+    """验证结果写入器：缓存结果并按批写回数据库"""
     
-    def bulk_update_proxies(self, proxy_ids: List[int], updates: Dict[str, Any]):
-        """批量更新代理信息"""
-        self.db.query(Proxy).filter(Proxy.id.in_(proxy_ids)).update(
-            {**updates, 'updated_at': datetime.utcnow()},
-            synchronize_session=False
-        )
-        self.db.commit()
+    def __init__(self, db: Session, batch_size: int = 500):
+        self.service = ProxyService(db)
+        self.batch_size = batch_size
+        self.buffer: List[Dict[str, Any]] = []
+        self.written = 0
+    
+    def write(self, result: Dict[str, Any]):
+        self.buffer.append(result)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        if not self.buffer:
+            return
+        # 先换出缓冲区，写库期间到达的结果进入新的缓冲区
+        batch, self.buffer = self.buffer, []
+        self.service.apply_validation_results(batch)
+        self.written += len(batch)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 异常退出时也写回已完成的结果，避免丢失
+        self.flush()
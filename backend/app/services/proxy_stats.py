@@ -0,0 +1,160 @@
+"""
+代理统计汇总
+
+proxy_stats_groups 表按 (协议, 国家) 保存代理数、有效数、速度和成功率的和。
+所有对 proxies 表的写入（接口、爬虫、验证和复检脚本）都经过 ProxyService，
+在同一事务中按写入前后的差量更新汇总表，任何进程的写入提交后立即可见；
+概览和按协议/国家的细分由汇总表的分组行得出，接口耗时只与分组数有关，与代理表大小无关。
+汇总表与 proxies 表出现偏差时（如直接执行SQL修改了代理）用 rebuild_stats 重新聚合。
+"""
+
+from typing import Dict, Optional, Any, Tuple, Iterable, List
+from sqlalchemy import func, case, update, insert
+from sqlalchemy.orm import Session
+from app.models.proxy import Proxy
+from app.models.proxy_stats import ProxyStatsGroup
+
+UNKNOWN_COUNTRY = '未知'
+
+# 每组的累计值: [总数, 有效数, 速度之和, 有速度的数量, 成功率之和, 有成功率的数量]
+_TOTAL, _ACTIVE, _SPEED_SUM, _SPEED_COUNT, _SUCCESS_SUM, _SUCCESS_COUNT = range(6)
+_VALUE_COLUMNS = ('total', 'active', 'speed_sum', 'speed_count', 'success_sum', 'success_count')
+
+StatsRow = Dict[str, Any]
+GroupKey = Tuple[str, str]
+
+def stats_row(proxy: Any) -> StatsRow:
+    """从代理对象或字典中取出统计用的字段"""
+    get = proxy.get if isinstance(proxy, dict) else lambda name: getattr(proxy, name)
+    return {
+        'protocol': get('protocol'),
+        'country': get('country'),
+        'is_active': bool(get('is_active')),
+        'speed': get('speed'),
+        'success_rate': get('success_rate')
+    }
+
+def _add(groups: Dict[GroupKey, List[float]], row: StatsRow, sign: int):
+    values = groups.setdefault((row['protocol'], row['country'] or ''), [0.0] * 6)
+    values[_TOTAL] += sign
+    if row['is_active']:
+        values[_ACTIVE] += sign
+    if row['speed'] is not None:
+        values[_SPEED_SUM] += sign * row['speed']
+        values[_SPEED_COUNT] += sign
+    if row['success_rate'] is not None:
+        values[_SUCCESS_SUM] += sign * row['success_rate']
+        values[_SUCCESS_COUNT] += sign
+
+def apply_stats_changes(db: Session, changes: Iterable[Tuple[Optional[StatsRow], Optional[StatsRow]]]):
+    """按 (旧值, 新值) 差量更新汇总表，新增时旧值为 None，删除时新值为 None
+
+    只执行不提交，由调用方与代理的写入一起提交；同一分组的并发更新由数据库的行锁串行化
+    """
+    deltas: Dict[GroupKey, List[float]] = {}
+    for old, new in changes:
+        if old == new:
+            continue
+        if old:
+            _add(deltas, old, -1)
+        if new:
+            _add(deltas, new, 1)
+    deltas = {key: values for key, values in deltas.items() if any(values)}
+    if not deltas:
+        return
+
+    dialect = db.get_bind().dialect.name
+    for (protocol, country), values in sorted(deltas.items()):
+        row = {'protocol': protocol, 'country': country, **dict(zip(_VALUE_COLUMNS, values))}
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(ProxyStatsGroup).values(row)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['protocol', 'country'],
+                set_={name: getattr(ProxyStatsGroup, name) + getattr(stmt.excluded, name) for name in _VALUE_COLUMNS}
+            )
+            db.execute(stmt)
+        elif dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+            stmt = dialect_insert(ProxyStatsGroup).values(row)
+            stmt = stmt.on_duplicate_key_update(
+                {name: getattr(ProxyStatsGroup, name) + getattr(stmt.inserted, name) for name in _VALUE_COLUMNS}
+            )
+            db.execute(stmt)
+        else:
+            result = db.execute(
+                update(ProxyStatsGroup)
+                .where(ProxyStatsGroup.protocol == protocol, ProxyStatsGroup.country == country)
+                .values({name: getattr(ProxyStatsGroup, name) + row[name] for name in _VALUE_COLUMNS})
+            )
+            if not result.rowcount:
+                db.execute(insert(ProxyStatsGroup).values(row))
+
+def rebuild_stats(db: Session):
+    """由 proxies 表重新聚合汇总表并提交"""
+    country = func.coalesce(Proxy.country, '')
+    rows = db.query(
+        Proxy.protocol,
+        country,
+        func.count(Proxy.id),
+        func.sum(case((Proxy.is_active == True, 1), else_=0)),
+        func.sum(Proxy.speed),
+        func.count(Proxy.speed),
+        func.sum(Proxy.success_rate),
+        func.count(Proxy.success_rate)
+    ).group_by(Proxy.protocol, country).all()
+    db.query(ProxyStatsGroup).delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(ProxyStatsGroup), [
+            {'protocol': row[0], 'country': row[1], **dict(zip(_VALUE_COLUMNS, (value or 0 for value in row[2:])))}
+            for row in rows
+        ])
+    db.commit()
+
+def _summarize(values: List[float]) -> Dict[str, Any]:
+    return {
+        'total': int(values[_TOTAL]),
+        'active': int(values[_ACTIVE]),
+        'avg_speed': values[_SPEED_SUM] / values[_SPEED_COUNT] if values[_SPEED_COUNT] else None,
+        'avg_success_rate': values[_SUCCESS_SUM] / values[_SUCCESS_COUNT] if values[_SUCCESS_COUNT] else None
+    }
+
+def load_stats(db: Session) -> Dict[str, Any]:
+    """读取汇总表，返回概览统计及按协议、按国家的细分"""
+    overall = [0.0] * 6
+    by_protocol: Dict[str, List[float]] = {}
+    by_country: Dict[str, List[float]] = {}
+    countries = set()
+    for group in db.query(ProxyStatsGroup).filter(ProxyStatsGroup.total > 0):
+        values = [float(getattr(group, name) or 0) for name in _VALUE_COLUMNS]
+        if group.country:
+            countries.add(group.country)
+        for target in (
+            overall,
+            by_protocol.setdefault(group.protocol, [0.0] * 6),
+            by_country.setdefault(group.country or UNKNOWN_COUNTRY, [0.0] * 6)
+        ):
+            for index, value in enumerate(values):
+                target[index] += value
+
+    summary = _summarize(overall)
+    count_of = lambda protocol: int(by_protocol.get(protocol, [0])[_TOTAL])
+    return {
+        'total_proxies': summary['total'],
+        'active_proxies': summary['active'],
+        'inactive_proxies': summary['total'] - summary['active'],
+        'http_proxies': count_of('http'),
+        'https_proxies': count_of('https'),
+        'socks_proxies': sum(
+            int(values[_TOTAL]) for protocol, values in by_protocol.items()
+            if protocol and protocol.startswith('socks')
+        ),
+        'countries_count': len(countries),
+        'avg_speed': summary['avg_speed'],
+        'avg_success_rate': summary['avg_success_rate'],
+        'by_protocol': {protocol: _summarize(values) for protocol, values in by_protocol.items()},
+        'by_country': {country: _summarize(values) for country, values in by_country.items()}
+    }
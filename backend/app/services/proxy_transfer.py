@@ -0,0 +1,293 @@
+"""
+代理批量导入导出
+
+格式为 NDJSON（每行一个JSON对象）或首行为表头的 CSV，字段为 proxies 表中除ID和创建/更新时间外的列，
+导出的文件可以直接导入另一个环境。
+导入按批解析和写入：PostgreSQL 用 COPY 写入临时表后合并，其他数据库按批 upsert；
+导出用服务端游标按批取行，内存占用与总行数无关。
+"""
+
+import codecs
+import csv
+import io
+import ipaddress
+import json
+from datetime import datetime
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import String
+from sqlalchemy.orm import Session
+from app.models.proxy import Proxy
+from app.models.proxy_website import ProxyWebsite
+from app.services.proxy_pool import PROTOCOLS
+from app.services.proxy_service import ProxyService
+
+FORMATS = ('ndjson', 'csv')
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+_COLUMNS = Proxy.__table__.columns
+TRANSFER_FIELDS = tuple(column.name for column in _COLUMNS if column.name not in ('id', 'created_at', 'updated_at'))
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+
+# 导入结果中最多保留的错误信息条数
+MAX_ERRORS = 20
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"不是布尔值: {value!r}")
+
+def _parse_datetime(value: Any) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+def _parse_int(value: Any) -> int:
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"不是整数: {value!r}")
+    return int(value)
+
+def _converter(column) -> Callable[[Any], Any]:
+    """按列类型返回把 JSON / CSV 中的值转换为列值的函数"""
+    python_type = column.type.python_type
+    if python_type is bool:
+        return _parse_bool
+    if python_type is datetime:
+        return _parse_datetime
+    if python_type is int:
+        return _parse_int
+    if python_type is float:
+        return float
+    length = column.type.length if isinstance(column.type, String) else None
+
+    def parse_string(value: Any) -> str:
+        value = str(value)
+        if length and len(value) > length:
+            raise ValueError(f"超过 {length} 个字符")
+        return value
+    return parse_string
+
+# 每个字段的 (名称, 转换函数, 缺失时的默认值)，导入时逐行使用，预先计算
+_FIELD_SPECS = [
+    (
+        column.name,
+        _converter(column),
+        column.default.arg if column.default is not None and column.default.is_scalar else None
+    )
+    for column in (_COLUMNS[field] for field in TRANSFER_FIELDS)
+]
+
+def normalize_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    """校验一行导入数据并转换为 proxies 表的字段，缺失的字段取列的默认值；无效时抛出 ValueError"""
+    row = {}
+    for field, convert, default in _FIELD_SPECS:
+        value = data.get(field)
+        if value is None or value == '':
+            row[field] = default
+            continue
+        try:
+            row[field] = convert(value)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"{field}: {e}") from e
+
+    if not row['ip']:
+        raise ValueError("缺少 ip")
+    row['ip'] = str(ipaddress.ip_address(row['ip'].strip()))
+    if row['port'] is None or not 0 < row['port'] < 65536:
+        raise ValueError(f"无效的端口: {row['port']!r}")
+    row['protocol'] = row['protocol'].lower()
+    if row['protocol'] not in PROTOCOLS:
+        raise ValueError(f"不支持的协议: {row['protocol']!r}")
+    return row
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+class ProxyImporter:
+    """按批导入代理，调用方把输入按行（CSV 为按记录，见 join_csv_records）分批传给 feed，
+    CSV 的表头从第一条记录读取"""
+
+    def __init__(self, db: Session, fmt: str = 'ndjson', overwrite: bool = False):
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的格式: {fmt}")
+        self.db = db
+        self.fmt = fmt
+        self.overwrite = overwrite
+        self.service = ProxyService(db)
+        self._header: Optional[List[str]] = None
+        self.lines = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors: List[str] = []
+
+    def _records(self, lines: List[str]) -> Iterator[tuple]:
+        """逐行解析，返回 (行号, 字段字典)，空行跳过；CSV 记录的行号为其第一行"""
+        if self.fmt == 'ndjson':
+            for line in lines:
+                self.lines += 1
+                if line.strip():
+                    yield self.lines, line
+            return
+        # 引号内含换行的记录占多行，按每条记录的实际行数推算行号
+        starts = []
+        for record in lines:
+            starts.append(self.lines + 1)
+            self.lines += record.count('\n') + (not record.endswith('\n'))
+        reader = csv.reader(lines)
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            if self._header is None:
+                self._header = [name.strip() for name in values]
+                continue
+            yield starts[reader.line_num - 1], dict(zip(self._header, values))
+
+    def _reject(self, line_number: int, error: Exception):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"第 {line_number} 行: {error}")
+
+    def feed(self, lines: List[str]) -> int:
+        """解析并写入一批行，返回本批写入的代理数"""
+        rows = {}
+        for line_number, record in self._records(lines):
+            try:
+                if self.fmt == 'ndjson':
+                    record = json.loads(record)
+                    if not isinstance(record, dict):
+                        raise ValueError("不是JSON对象")
+                row = normalize_row(record)
+            except (ValueError, TypeError) as e:
+                self._reject(line_number, e)
+                continue
+            rows[(row['ip'], row['port'], row['protocol'])] = row
+        rows = list(rows.values())
+        if not rows:
+            return 0
+
+        # 来源网站ID在不同环境间可能不一致，目标库中不存在的置空，避免外键错误
+        source_ids = {row['source_website_id'] for row in rows if row['source_website_id'] is not None}
+        if source_ids:
+            known = {
+                website_id for (website_id,) in
+                self.db.query(ProxyWebsite.id).filter(ProxyWebsite.id.in_(source_ids))
+            }
+            for row in rows:
+                if row['source_website_id'] not in known:
+                    row['source_website_id'] = None
+
+        if self.db.get_bind().dialect.name == 'postgresql':
+            count = self.service.copy_upsert_proxies(rows, TRANSFER_FIELDS, self.overwrite)
+        else:
+            count = self.service.bulk_upsert_proxies(
+                rows, chunk_size=len(rows), fields=TRANSFER_FIELDS, overwrite=self.overwrite
+            )
+        self.imported += count
+        return count
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            'lines': self.lines,
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'errors': self.errors
+        }
+
+def join_csv_records(lines: Iterable[str]) -> Iterator[str]:
+    """把按行读取的 CSV 合并为完整的记录：引号内含换行的字段会跨多行，
+    引号未闭合（引号数为奇数）时与后续行合并，保证分批时同一记录不会被拆开
+
+    每行须保留行尾的换行符；按CSV规则字段内的引号成对出现，未加引号的字段中不应有引号
+    """
+    parts: List[str] = []
+    quotes = 0
+    for line in lines:
+        parts.append(line)
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            yield ''.join(parts)
+            parts = []
+            quotes = 0
+    if parts:
+        yield ''.join(parts)
+
+def batched_lines(lines: Iterable[str], batch_size: int, fmt: str = 'ndjson') -> Iterator[List[str]]:
+    """把按行读取的文本分成每批 batch_size 行，CSV 按记录分批"""
+    iterator = iter(join_csv_records(lines) if fmt == 'csv' else lines)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+async def stream_line_batches(chunks: AsyncIterator[bytes], batch_size: int,
+                             fmt: str = 'ndjson') -> AsyncIterator[List[str]]:
+    """把请求体的字节流按UTF-8解码后分行（保留行尾换行符），每批 batch_size 行，CSV 按记录分批"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    batch: List[str] = []
+    record: List[str] = []  # CSV 中引号尚未闭合的记录已读到的行
+    quotes = 0
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split('\n')
+        pending = lines.pop()
+        if fmt == 'csv':
+            for line in lines:
+                record.append(line + '\n')
+                quotes += line.count('"')
+                if quotes % 2 == 0:
+                    batch.append(''.join(record))
+                    record = []
+                    quotes = 0
+        else:
+            batch.extend(line + '\n' for line in lines)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        record.append(pending)
+    if record:
+        batch.append(''.join(record))
+    if batch:
+        yield batch
+
+def iter_export(db: Session, fmt: str = 'ndjson', filters: Dict[str, Any] = None,
+                batch_size: int = 5000) -> Iterator[str]:
+    """按ID顺序导出代理，每批行格式化为一段文本
+
+    PostgreSQL 上通过 yield_per 使用服务端游标，其他数据库同样按批取行
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}")
+    columns = [_COLUMNS[field] for field in TRANSFER_FIELDS]
+    query = ProxyService(db)._filter_proxies(filters).with_entities(*columns).order_by(Proxy.id).yield_per(batch_size)
+
+    buffer = io.StringIO()
+    # CSV 中的时间按 str() 写为 "YYYY-MM-DD HH:MM:SS"，与 JSON 的 isoformat 一样可被导入解析
+    writer = csv.writer(buffer, lineterminator='\n') if fmt == 'csv' else None
+    encoder = json.JSONEncoder(ensure_ascii=False, default=_json_default)
+    if writer:
+        writer.writerow(TRANSFER_FIELDS)
+    count = 0
+    for row in query:
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(encoder.encode(dict(zip(TRANSFER_FIELDS, row))))
+            buffer.write('\n')
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,186 @@
+"""
+Redis 中的共享代理池
+
+有效代理按质量评分写入有序集合，并按协议、国家分片：
+    {prefix}:{protocol}:{country}   具体分片
+    {prefix}:{protocol}:*           按协议
+    {prefix}:*:{country}            按国家
+    {prefix}:*:*                    全部
+有序集合的成员为代理ID，代理的完整字段以JSON存放在哈希 {prefix}:data 中。
+选择时从对应分片随机取一批候选（ZRANDMEMBER），再按评分加权挑选其中一个，
+多个 uvicorn worker 读写同一份数据，结果一致且不访问数据库。
+
+加权只在均匀抽出的 sample_size 个候选内进行：分片不超过 sample_size 个代理时与按评分加权完全一致；
+分片更大时，每个代理被选中的概率不超过 sample_size / 分片大小，评分远高于平均的代理
+得到的份额低于其评分占比。需要更接近全局加权时调大 sample_size。
+ZRANDMEMBER 需要 Redis 6.2 及以上版本。
+"""
+
+import json
+import random
+from datetime import datetime, date
+from typing import Dict, List, Optional, Any, Iterable, Set
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.proxy import Proxy
+from app.services.proxy_selector import proxy_snapshot
+
+WILDCARD = '*'
+UNKNOWN_COUNTRY = '-'
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value)}")
+
+class RedisProxyPool:
+    def __init__(self, client=None, prefix: Optional[str] = None, sample_size: int = 32,
+                 min_weight: float = 1.0):
+        # client 可以是任何兼容 redis-py 接口的客户端，未指定时按 REDIS_URL 连接
+        self._client = client
+        self.prefix = prefix or settings.PROXY_POOL_REDIS_PREFIX
+        self.sample_size = sample_size  # 每次选择时随机取出的候选数
+        self.min_weight = min_weight
+        self.data_key = f'{self.prefix}:data'
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._client
+
+    def shard_key(self, protocol: Optional[str] = None, country: Optional[str] = None) -> str:
+        return f'{self.prefix}:{protocol or WILDCARD}:{country or WILDCARD}'
+
+    def _shards(self, proxy: Dict[str, Any]) -> List[str]:
+        protocol, country = proxy['protocol'], proxy.get('country') or UNKNOWN_COUNTRY
+        return [
+            self.shard_key(protocol, country),
+            self.shard_key(protocol, None),
+            self.shard_key(None, country),
+            self.shard_key(None, None)
+        ]
+
+    def upsert(self, proxies: Iterable[Dict[str, Any]]) -> int:
+        """写入一批代理：有效的加入（或移动到）对应分片，无效的移出，返回处理的代理数"""
+        proxies = list(proxies)
+        if not proxies:
+            return 0
+        # 先取出旧数据，协议或国家变化时从旧分片移除
+        previous = self.client.hmget(self.data_key, [str(proxy['id']) for proxy in proxies])
+        pipe = self.client.pipeline(transaction=False)
+        for proxy, old in zip(proxies, previous):
+            member = str(proxy['id'])
+            shards = self._shards(proxy) if proxy['is_active'] else []
+            if old:
+                for key in set(self._shards(json.loads(old))) - set(shards):
+                    pipe.zrem(key, member)
+            if shards:
+                score = max(proxy.get('quality_score') or proxy.get('success_rate') or 0.0, self.min_weight)
+                for key in shards:
+                    pipe.zadd(key, {member: score})
+                pipe.hset(self.data_key, member, json.dumps(proxy, default=_json_default, ensure_ascii=False))
+            elif old:
+                pipe.hdel(self.data_key, member)
+        pipe.execute()
+        return len(proxies)
+
+    def remove(self, proxy_ids: Iterable[int]) -> int:
+        """从池中删除代理，返回实际删除的数量"""
+        members = [str(proxy_id) for proxy_id in proxy_ids]
+        if not members:
+            return 0
+        previous = self.client.hmget(self.data_key, members)
+        pipe = self.client.pipeline(transaction=False)
+        removed = 0
+        for member, old in zip(members, previous):
+            if not old:
+                continue
+            for key in self._shards(json.loads(old)):
+                pipe.zrem(key, member)
+            pipe.hdel(self.data_key, member)
+            removed += 1
+        pipe.execute()
+        return removed
+
+    def choose(self, protocol: Optional[str] = None, country: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """随机取一批候选，按评分加权选择一个代理"""
+        candidates = self.client.zrandmember(self.shard_key(protocol, country), self.sample_size, withscores=True)
+        if not candidates:
+            return None
+        members, scores = candidates[0::2], [float(score) for score in candidates[1::2]]
+        member = random.choices(members, weights=scores)[0]
+        data = self.client.hget(self.data_key, member)
+        return json.loads(data) if data else None
+
+    def choose_many(self, count: int, protocol: Optional[str] = None, country: Optional[str] = None,
+                    exclude: Set[int] = frozenset()) -> List[Dict[str, Any]]:
+        """随机取一批候选，按评分加权不重复地选择最多 count 个代理，尽量避开 exclude 中的代理"""
+        candidates = self.client.zrandmember(
+            self.shard_key(protocol, country), max(self.sample_size, count * 2), withscores=True
+        )
+        if not candidates:
+            return []
+        scored = list(zip(candidates[0::2], (float(score) for score in candidates[1::2])))
+        preferred = [item for item in scored if int(item[0]) not in exclude]
+        members = []
+        for pool in (preferred, [item for item in scored if int(item[0]) in exclude]):
+            while pool and len(members) < count:
+                index = random.choices(range(len(pool)), weights=[score for _, score in pool])[0]
+                members.append(pool.pop(index)[0])
+        if not members:
+            return []
+        return [json.loads(data) for data in self.client.hmget(self.data_key, members) if data]
+
+    def count(self, protocol: Optional[str] = None, country: Optional[str] = None) -> int:
+        return self.client.zcard(self.shard_key(protocol, country))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f'{self.prefix}:*', count=1000))
+        for start in range(0, len(keys), 1000):
+            self.client.delete(*keys[start:start + 1000])
+
+    def rebuild(self, db: Session, batch_size: int = 1000) -> int:
+        """从数据库重新载入全部有效代理，返回载入的数量
+
+        先写入临时前缀下的键，载入完成后在一个事务中 RENAME 为正式的键并删除已不存在的分片，
+        重建过程中读取方始终看到完整的旧池或新池；重建期间其他进程写入的变化以数据库为准，
+        由后续的写入或同步补上
+        """
+        staging = RedisProxyPool(self.client, prefix=f'{self.prefix}~rebuild',
+                                 sample_size=self.sample_size, min_weight=self.min_weight)
+        staging.clear()  # 上次中断的重建可能留下临时键
+        count = 0
+        batch = []
+        for row in db.query(Proxy).filter(Proxy.is_active == True).yield_per(batch_size):
+            batch.append(proxy_snapshot(row))
+            if len(batch) >= batch_size:
+                count += staging.upsert(batch)
+                batch = []
+        count += staging.upsert(batch)
+        db.rollback()
+
+        new_keys = {key: self.prefix + key[len(staging.prefix):] for key in staging.client.scan_iter(
+            match=f'{staging.prefix}:*', count=1000
+        )}
+        stale_keys = set(self.client.scan_iter(match=f'{self.prefix}:*', count=1000)) - set(new_keys.values())
+        pipe = self.client.pipeline(transaction=True)
+        for staging_key, key in new_keys.items():
+            pipe.rename(staging_key, key)
+        if stale_keys:
+            pipe.delete(*stale_keys)
+        pipe.execute()
+        return count
+
+    def sync(self, db: Session, proxy_ids: Iterable[int]):
+        """按数据库中的最新状态同步一批代理，已删除的代理从池中移除"""
+        proxy_ids = set(proxy_ids)
+        if not proxy_ids:
+            return
+        proxies = [proxy_snapshot(row) for row in db.query(Proxy).filter(Proxy.id.in_(proxy_ids))]
+        self.upsert(proxies)
+        self.remove(proxy_ids - {proxy['id'] for proxy in proxies})
+
+# 进程内共享的Redis代理池，连接在首次使用时建立
+redis_proxy_pool = RedisProxyPool()
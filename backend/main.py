@@ -5,14 +5,24 @@ from contextlib import asynccontextmanager
 import uvicorn
 from app.core.config import settings
 from app.api.v1.api import api_router
-from app.core.database import engine
+from app.core.database import engine, SessionLocal
+from app.core.pagination import NEXT_CURSOR_HEADER
 from app.models import Base
+from app.services.proxy_lease import proxy_feedback_buffer
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时创建数据库表
     Base.metadata.create_all(bind=engine)
+    proxy_feedback_buffer.start(SessionLocal)
     yield
+    # 退出前写回尚未落库的代理使用反馈
+    proxy_feedback_buffer.stop()
+    db = SessionLocal()
+    try:
+        proxy_feedback_buffer.flush(db)
+    finally:
+        db.close()
 
 app = FastAPI(
     title="通用爬虫网站API",
@@ -28,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # 挂载API路由
@@ -0,0 +1,68 @@
+import base64
+import json
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.core.pagination import InvalidCursor, encode_cursor, paginate
+from app.models.proxy import Proxy
+import app.models  # noqa: F401  注册全部模型
+
+START = datetime(2024, 1, 1)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    # 创建时间有重复，验证同值时按ID继续翻页
+    session.add_all([
+        Proxy(ip=f'10.0.0.{n}', port=8080, protocol='http', created_at=START + timedelta(minutes=n // 2))
+        for n in range(1, 8)
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+def collect(db, limit, **kwargs):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = paginate(db.query(Proxy), Proxy.id, limit, cursor=cursor, **kwargs)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+def test_cursor_pages_cover_every_row_once(db):
+    assert collect(db, 3) == [[1, 2, 3], [4, 5, 6], [7]]
+    assert collect(db, 3, descending=True) == [[7, 6, 5], [4, 3, 2], [1]]
+
+def test_sorted_pages_break_ties_by_id(db):
+    assert collect(db, 2, sort_column=Proxy.created_at) == [[1, 2], [3, 4], [5, 6], [7]]
+    assert collect(db, 2, sort_column=Proxy.created_at, descending=True) == [[7, 6], [5, 4], [3, 2], [1]]
+
+def test_skip_returns_cursor_for_the_next_page(db):
+    rows, cursor = paginate(db.query(Proxy), Proxy.id, 2, skip=3)
+    assert [row.id for row in rows] == [4, 5]
+    rows, cursor = paginate(db.query(Proxy), Proxy.id, 2, cursor=cursor)
+    assert [row.id for row in rows] == [6, 7]
+    assert cursor is None
+    assert paginate(db.query(Proxy), Proxy.id, 0) == ([], None)
+
+def test_cursor_round_trips_datetime_values(db):
+    rows, cursor = paginate(db.query(Proxy), Proxy.id, 3, sort_column=Proxy.created_at)
+    payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    assert payload == {'s': 'created_at', 'd': False, 'v': (START + timedelta(minutes=1)).isoformat(), 'id': 3}
+    assert '=' not in cursor
+
+@pytest.mark.parametrize('cursor, kwargs', [
+    ('not a cursor', {}),
+    (base64.urlsafe_b64encode(b'{"s": "id"}').decode(), {}),
+    (encode_cursor('id', False, 3, 3), {'descending': True}),
+    (encode_cursor('id', False, 3, 3), {'sort_column': Proxy.created_at}),
+    (encode_cursor('created_at', False, 'yesterday', 3), {'sort_column': Proxy.created_at}),
+])
+def test_invalid_or_mismatched_cursors_are_rejected(db, cursor, kwargs):
+    with pytest.raises(InvalidCursor):
+        paginate(db.query(Proxy), Proxy.id, 2, cursor=cursor, **kwargs)
@@ -0,0 +1,149 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.api.v1.api import api_router
+from app.core.database import Base, get_db
+from app.models.proxy_website import ProxyWebsite
+from app.services.proxy_selector import proxy_selector
+from app.services.proxy_service import ProxyService
+import app.models  # noqa: F401  注册全部模型
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture(autouse=True)
+def fresh_selector(monkeypatch):
+    # 选择器是进程内单例，清空水位线让每个用例首次选择时全量载入自己的数据库
+    monkeypatch.setattr(proxy_selector, "_watermark", None)
+
+@pytest.fixture
+def client(session_factory):
+    application = FastAPI()
+    application.include_router(api_router, prefix="/api/v1")
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    application.dependency_overrides[get_db] = override_get_db
+    return TestClient(application)
+
+def test_list_random_and_lease_after_upsert_without_source(client, session_factory):
+    db = session_factory()
+    ProxyService(db).bulk_upsert_proxies([
+        {'ip': '10.0.0.1', 'port': 8080, 'protocol': 'http'},
+        {'ip': '10.0.0.2', 'port': 3128, 'protocol': 'https', 'country': '日本'},
+    ])
+    db.close()
+    proxy_selector.mark_stale()
+
+    response = client.get("/api/v1/proxy/")
+    assert response.status_code == 200
+    proxies = response.json()
+    assert {proxy['ip'] for proxy in proxies} == {'10.0.0.1', '10.0.0.2'}
+    assert all(proxy['source_website_id'] is None for proxy in proxies)
+
+    response = client.get("/api/v1/proxy/random/")
+    assert response.status_code == 200
+    assert response.json()['source_website_id'] is None
+
+    response = client.post("/api/v1/proxy/lease", json={"count": 2})
+    assert response.status_code == 200
+    assert len(response.json()['proxies']) == 2
+
+@pytest.fixture
+def redis_pool(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.core.config import settings
+    from app.services.redis_pool import redis_proxy_pool
+    monkeypatch.setattr(settings, "PROXY_POOL_BACKEND", "redis")
+    monkeypatch.setattr(redis_proxy_pool, "_client", fakeredis.FakeRedis(decode_responses=True))
+    return redis_proxy_pool
+
+def test_created_and_upserted_proxies_enter_redis_pool(client, session_factory, redis_pool):
+    db = session_factory()
+    website = ProxyWebsite(name="test", url="http://example.com/")
+    db.add(website)
+    db.commit()
+    response = client.post("/api/v1/proxy/", json={
+        "ip": "10.0.1.1", "port": 80, "protocol": "http", "source_website_id": website.id
+    })
+    assert response.status_code == 200
+    ProxyService(db).bulk_upsert_proxies([{'ip': '10.0.1.2', 'port': 80, 'protocol': 'https'}])
+    db.close()
+
+    assert redis_pool.count() == 2
+    assert redis_pool.count(protocol='https') == 1
+    response = client.post("/api/v1/proxy/lease", json={"count": 2})
+    assert response.status_code == 200
+    assert len(response.json()['proxies']) == 2
+
+def test_empty_redis_pool_falls_back_to_selector(client, session_factory, redis_pool):
+    db = session_factory()
+    ProxyService(db).bulk_upsert_proxies([{'ip': '10.0.2.1', 'port': 80, 'protocol': 'http'}])
+    db.close()
+    redis_pool.clear()
+    proxy_selector.mark_stale()
+
+    response = client.get("/api/v1/proxy/random/")
+    assert response.status_code == 200
+    assert response.json()['ip'] == '10.0.2.1'
+
+def test_imported_proxies_are_listed_and_served(client, redis_pool):
+    body = '{"ip": "10.0.3.1", "port": 1080, "protocol": "socks5", "source_website_id": 99}\n'
+    response = client.post("/api/v1/proxy/import", content=body.encode())
+    assert response.status_code == 200
+    assert response.json()['imported'] == 1
+    proxy_selector.mark_stale()
+
+    response = client.get("/api/v1/proxy/")
+    assert response.status_code == 200
+    assert [proxy['source_website_id'] for proxy in response.json()] == [None]
+    assert redis_pool.count(protocol='socks5') == 1
+    response = client.get("/api/v1/proxy/random/", params={"protocol": "socks5"})
+    assert response.status_code == 200
+    assert response.json()['ip'] == '10.0.3.1'
+
+def test_feedback_only_accepts_proxies_in_the_lease(client, session_factory):
+    db = session_factory()
+    ProxyService(db).bulk_upsert_proxies([
+        {'ip': '10.0.4.1', 'port': 80, 'protocol': 'http'},
+        {'ip': '10.0.4.2', 'port': 80, 'protocol': 'http'},
+    ])
+    db.close()
+
+    lease = client.post("/api/v1/proxy/lease", json={"count": 1}).json()
+    leased_id = lease['proxies'][0]['id']
+    response = client.post("/api/v1/proxy/feedback", json={
+        "lease_id": lease['lease_id'],
+        "release": True,
+        "results": [
+            {"proxy_id": leased_id, "success": True},
+            {"proxy_id": leased_id + 1000, "success": False},
+        ]
+    })
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 1, "rejected": 1, "released": True}
+
+    response = client.post("/api/v1/proxy/feedback", json={
+        "lease_id": lease['lease_id'], "results": [{"proxy_id": leased_id, "success": True}]
+    })
+    assert response.status_code == 404
+
+def test_spider_lists_accept_large_limits_and_reject_negative_skip(client):
+    for path in ("/api/v1/data/", "/api/v1/tasks/", "/api/v1/configs/"):
+        assert client.get(path, params={"limit": 5000}).status_code == 200
+        response = client.get(path, params={"limit": 0})
+        assert response.status_code == 200
+        assert response.json() == []
+        assert client.get(path, params={"skip": -1}).status_code == 422
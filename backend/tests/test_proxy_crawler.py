@@ -0,0 +1,58 @@
+import threading
+import time
+import pytest
+from app.core.rate_limit import TokenBucket
+from app.scripts.proxy_crawler import ProxyCrawler
+
+class FakeResponse:
+    status_code = 200
+    content = b'<table></table>'
+    text = '<table></table>'
+    headers = {'ETag': '"v1"'}
+
+    def raise_for_status(self):
+        pass
+
+@pytest.fixture
+def crawler():
+    crawler = ProxyCrawler(host_rate=1000, host_burst=100)
+    crawler.session.get = lambda *args, **kwargs: FakeResponse()
+    return crawler
+
+def test_page_cache_is_kept_when_parsing_fails(crawler):
+    def broken(html):
+        raise RuntimeError("下游处理失败")
+
+    assert crawler._crawl_pages('s', ['http://example.com/1'], broken) == []
+    assert 'http://example.com/1' not in crawler.page_cache
+
+    proxies = crawler._crawl_pages('s', ['http://example.com/1'], lambda html: [{'ip': '1.2.3.4'}])
+    assert proxies == [{'ip': '1.2.3.4'}]
+    assert crawler.page_cache['http://example.com/1']['etag'] == '"v1"'
+
+def test_rate_limited_host_does_not_block_other_hosts():
+    crawler = ProxyCrawler(max_workers=1, host_rate=4, host_burst=1)
+    crawler.session.get = lambda *args, **kwargs: FakeResponse()
+    crawler._host_buckets['fast.example'] = TokenBucket(1000, capacity=100)
+    parse = lambda html: [{'ip': '1.2.3.4'}]
+    with crawler:
+        slow = threading.Thread(target=crawler._crawl_pages, args=(
+            'slow', [f'http://slow.example/{n}' for n in range(5)], parse, 1
+        ))
+        slow.start()
+        time.sleep(0.05)
+        start = time.monotonic()
+        proxies = crawler._crawl_pages('fast', [f'http://fast.example/{n}' for n in range(5)], parse, 2)
+        elapsed = time.monotonic() - start
+        slow.join()
+    assert len(proxies) == 5
+    assert elapsed < 0.3
+    assert crawler.source_stats[1]['pages'] == crawler.source_stats[2]['pages'] == 5
+    assert crawler._page_executor._shutdown
+
+def test_source_stats_are_keyed_by_website_id(crawler):
+    rules = {'urls': ['http://example.com/1'], 'regex': r'(?P<ip>\d+\.\d+\.\d+\.\d+):(?P<port>\d+)'}
+    crawler.crawl_source('同名', rules, source_website_id=7)
+    crawler.crawl_source('同名', rules, source_website_id=8)
+    crawler.crawl_source('内置', rules)
+    assert set(crawler.source_stats) == {7, 8, '内置'}
@@ -0,0 +1,36 @@
+import pytest
+from app.scripts.proxy_extractor import CompiledRule, HAS_LXML
+
+HTML = """
+<table><tbody>
+<tr><td>1.2.3.4</td><td>8080</td><td>高匿</td><td>0.5秒</td></tr>
+<tr><td>5.6.7.8</td><td>3128</td><td></td><td></td></tr>
+</tbody></table>
+"""
+
+TEXT = """
+1.2.3.4:8080 高匿 0.5秒
+5.6.7.8:3128
+"""
+
+TABLE_RULES = {
+    'row_selector': 'tbody tr',
+    'columns': {'ip': 0, 'port': 1, 'anonymity': 2, 'speed': 3}
+}
+
+REGEX_RULES = {
+    'regex': r'(?P<ip>\d+\.\d+\.\d+\.\d+):(?P<port>\d+)(?:[ \t]+(?P<anonymity>\S+))?(?:[ \t]+(?P<speed>\S+))?'
+}
+
+@pytest.mark.parametrize('parser', ['bs4', 'lxml', 'stream'] if HAS_LXML else ['bs4'])
+def test_missing_optional_columns_match_between_table_and_regex(parser):
+    from_table = CompiledRule(TABLE_RULES).extract(HTML, parser=parser)
+    from_regex = CompiledRule(REGEX_RULES).extract(TEXT)
+    assert from_table == from_regex == [
+        {'ip': '1.2.3.4', 'port': 8080, 'protocol': 'http', 'anonymity': 'elite', 'speed': 0.5},
+        {'ip': '5.6.7.8', 'port': 3128, 'protocol': 'http', 'anonymity': 'unknown', 'speed': None}
+    ]
+
+def test_missing_optional_group_keeps_rule_default():
+    rule = CompiledRule({**REGEX_RULES, 'defaults': {'anonymity': '透明'}})
+    assert rule.extract('5.6.7.8:3128')[0]['anonymity'] == 'transparent'
@@ -0,0 +1,49 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from app.services.proxy_health import HEALTH_HALF_LIFE, MIN_ALPHA, update_health, update_quantile
+
+NOW = datetime(2024, 1, 1, 12, 0, 0)
+
+def test_quantile_starts_at_first_value_and_moves_asymmetrically():
+    assert update_quantile(None, 120.0, 0.95) == 120.0
+    up = update_quantile(100.0, 200.0, 0.95) - 100.0
+    down = 100.0 - update_quantile(100.0, 50.0, 0.95)
+    assert up == pytest.approx(19 * down)
+    assert update_quantile(0.01, 0.0, 0.05) == 0.0  # 不会低于0
+
+def test_quantile_converges_to_the_requested_fraction():
+    rng = random.Random(0)
+    p50 = p95 = None
+    for _ in range(20000):
+        value = rng.uniform(0, 100)
+        p50 = update_quantile(p50, value, 0.5)
+        p95 = update_quantile(p95, value, 0.95)
+    assert 45 <= p50 <= 60
+    assert 88 <= p95 <= 100
+
+def test_first_observation_sets_the_state():
+    state = update_health({}, 1.0, 250.0, now=NOW, timings={'connect': 80.4, 'tls': None, 'ttfb': 120.6})
+    assert state['ewma_success'] == 1.0
+    assert state['ewma_latency'] == state['latency_p50'] == state['latency_p95'] == 250.0
+    assert (state['connect_ms'], state['tls_ms'], state['ttfb_ms']) == (80, None, 121)
+    assert state['check_count'] == 1
+    assert state['last_check_time'] == NOW
+
+def test_old_observations_decay_by_half_life():
+    state = update_health({}, 1.0, 100.0, now=NOW)
+    after_half_life = update_health(state, 0.0, None, now=NOW + timedelta(seconds=HEALTH_HALF_LIFE))
+    assert after_half_life['ewma_success'] == pytest.approx(0.5)
+    assert after_half_life['ewma_latency'] == 100.0  # 失败不更新延迟
+    soon = update_health(state, 0.0, None, now=NOW + timedelta(seconds=1))
+    assert soon['ewma_success'] == pytest.approx(1 - MIN_ALPHA)
+
+def test_merged_observations_match_sequential_updates():
+    state = update_health({}, 1.0, 100.0, now=NOW, timings={'connect': 50.0})
+    merged = update_health(state, 0.0, None, now=NOW + timedelta(seconds=60), observations=3)
+    sequential = state
+    for _ in range(3):
+        sequential = update_health(sequential, 0.0, None, now=sequential['last_check_time'] + timedelta(seconds=60))
+    assert merged['check_count'] == 4
+    assert merged['connect_ms'] == 50
+    assert merged['ewma_success'] == pytest.approx(sequential['ewma_success'], rel=1e-6)
@@ -0,0 +1,89 @@
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core.database import Base
+from app.models.proxy import Proxy
+from app.services import proxy_lease
+from app.services.proxy_lease import ProxyFeedbackBuffer, ProxyLeaseManager
+from app.services.proxy_service import ProxyService
+import app.models  # noqa: F401  注册全部模型
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+def test_lease_excludes_leased_proxies_until_expiry(monkeypatch):
+    manager = ProxyLeaseManager(default_ttl=60)
+    calls = []
+
+    class FakeService:
+        def __init__(self, db):
+            pass
+
+        def choose_proxies(self, count, protocol=None, country=None, exclude=frozenset()):
+            calls.append(set(exclude))
+            return [{'id': proxy_id} for proxy_id in (1, 2, 3) if proxy_id not in exclude][:count]
+
+    monkeypatch.setattr(proxy_lease, "ProxyService", FakeService)
+    now = [1000.0]
+    monkeypatch.setattr(proxy_lease.time, "monotonic", lambda: now[0])
+
+    first = manager.lease(None, 2)
+    assert [proxy['id'] for proxy in first['proxies']] == [1, 2]
+    second = manager.lease(None, 2, ttl=10)
+    assert calls[-1] == {1, 2}
+    assert [proxy['id'] for proxy in second['proxies']] == [3]
+    assert manager.lease_proxy_ids(second['lease_id']) == {3}
+
+    now[0] += 30  # 第二个租约到期，第一个仍有效
+    assert manager.leased_ids() == {1, 2}
+    assert manager.lease_proxy_ids(second['lease_id']) is None
+    assert manager.release(first['lease_id'])
+    assert manager.leased_ids() == set()
+    assert not manager.release(first['lease_id'])
+
+def test_failed_flush_keeps_feedback(session_factory, monkeypatch):
+    db = session_factory()
+    ProxyService(db).bulk_upsert_proxies([{'ip': '10.0.0.1', 'port': 80, 'protocol': 'http'}])
+    proxy_id = db.query(Proxy.id).scalar()
+    buffer = ProxyFeedbackBuffer(flush_interval=0)
+    buffer.add([{'proxy_id': proxy_id, 'success': True, 'latency_ms': 100.0}])
+
+    def broken(self, results):
+        raise RuntimeError("数据库不可用")
+
+    monkeypatch.setattr(ProxyService, "apply_validation_results", broken)
+    assert buffer.maybe_flush(db) == 0
+    buffer.add([{'proxy_id': proxy_id, 'success': False}])
+    assert buffer._pending[proxy_id] == [1, 1, 100.0, 1]
+
+    monkeypatch.undo()
+    assert buffer.maybe_flush(db) == 1
+    assert len(buffer) == 0
+    assert db.query(Proxy.check_count).scalar() == 2
+    db.close()
+
+def test_background_thread_flushes_idle_buffer(session_factory):
+    db = session_factory()
+    ProxyService(db).bulk_upsert_proxies([{'ip': '10.0.0.2', 'port': 80, 'protocol': 'http'}])
+    proxy_id = db.query(Proxy.id).scalar()
+    db.close()
+
+    buffer = ProxyFeedbackBuffer(flush_interval=0.05)
+    buffer.start(session_factory)
+    try:
+        buffer.add([{'proxy_id': proxy_id, 'success': True}])
+        deadline = time.monotonic() + 5
+        while len(buffer) and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        buffer.stop()
+    assert len(buffer) == 0
+    db = session_factory()
+    assert db.query(Proxy.check_count).scalar() == 1
+    db.close()
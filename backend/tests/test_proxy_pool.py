@@ -0,0 +1,31 @@
+import pytest
+from app.services.proxy_pool import PROTOCOLS, pack_key, proxy_key, unpack_key
+
+@pytest.mark.parametrize('ip', ['0.0.0.0', '1.2.3.4', '255.255.255.255', '::1', '2001:db8::8a2e:370:7334'])
+@pytest.mark.parametrize('port', [0, 80, 65535])
+@pytest.mark.parametrize('protocol', PROTOCOLS)
+def test_pack_unpack_round_trip(ip, port, protocol):
+    key = pack_key(ip, port, protocol)
+    assert unpack_key(key) == (ip, port, protocol)
+    assert proxy_key(ip, port, protocol) == key
+    if ':' not in ip:
+        assert key < 1 << 64
+
+def test_keys_are_distinct_across_fields():
+    keys = {
+        pack_key('1.2.3.4', 80, 'http'), pack_key('1.2.3.4', 80, 'https'),
+        pack_key('1.2.3.4', 81, 'http'), pack_key('1.2.3.5', 80, 'http'),
+        pack_key('::102:304', 80, 'http')  # 与 1.2.3.4 数值相同的 IPv6 地址
+    }
+    assert len(keys) == 5
+
+@pytest.mark.parametrize('ip, port, protocol', [
+    ('010.0.0.3', 80, 'http'),
+    ('1.2.3.4', 80, 'http,https'),
+    ('1.2.3.4', 70000, 'http'),
+    ('example.com', 80, 'http'),
+])
+def test_unpackable_proxies_fall_back_to_tuple_keys(ip, port, protocol):
+    with pytest.raises(ValueError):
+        pack_key(ip, port, protocol)
+    assert proxy_key(ip, port, protocol) == (ip, port, protocol)
@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core.database import Base
+from app.models.proxy import Proxy
+from app.scripts.proxy_scheduler import RevalidationScheduler
+from app.services.proxy_service import ProxyService
+import app.models  # noqa: F401  注册全部模型
+
+class FailingValidator:
+    concurrency = 10
+
+    async def validate_proxy_async(self, proxy):
+        return {
+            'proxy_id': proxy['id'], 'ip': proxy['ip'], 'port': proxy['port'], 'protocol': proxy['protocol'],
+            'is_valid': False, 'success_rate': 0.0, 'speed': None, 'anonymity': 'unknown'
+        }
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+def check_due(scheduler, db):
+    """按 run() 的方式取出队列中的全部代理检测一次并写回"""
+    async def run():
+        semaphore = asyncio.Semaphore(10)
+        while scheduler.queue:
+            next_check, _, _, key = heapq.heappop(scheduler.queue)
+            record = scheduler._get(key)
+            if record is None or key in scheduler._checking or next_check != scheduler._next_check(record):
+                continue
+            scheduler._checking.add(key)
+            await semaphore.acquire()
+            await scheduler._check(record, semaphore)
+        await scheduler._flush(db)
+    asyncio.run(run())
+
+def test_reschedules_from_merged_health_and_evicts_deleted(session_factory):
+    db = session_factory()
+    ProxyService(db).bulk_upsert_proxies([
+        {'ip': '10.0.0.1', 'port': 80, 'protocol': 'http'},
+        {'ip': '10.0.0.2', 'port': 80, 'protocol': 'http,https'},
+        {'ip': '010.0.0.3', 'port': 80, 'protocol': 'http'},
+    ])
+    db.query(Proxy).update({
+        'ewma_success': 0.9, 'success_rate': 90.0, 'is_active': True, 'check_count': 5,
+        'last_check_time': datetime.utcnow() - timedelta(minutes=10)
+    })
+    db.commit()
+
+    scheduler = RevalidationScheduler(FailingValidator(), session_factory=session_factory)
+    assert scheduler._load_new_proxies(db) == 3
+    assert len(scheduler.others) == 2
+    db.query(Proxy).filter(Proxy.ip == '10.0.0.1').delete()
+    db.commit()
+    check_due(scheduler, db)
+
+    assert scheduler.stats['evicted'] == 1
+    assert len(scheduler.pool) == 0
+    # 一次失败后平滑成功率仍高于阈值，与数据库一致地保持有效
+    for record in scheduler.others.values():
+        assert record.is_active
+        assert record.fail_count == 1
+    assert {row.is_active for row in db.query(Proxy.is_active)} == {True}
+    assert len(scheduler.queue) == 2
+    db.close()
+
+def test_sync_picks_up_checks_written_elsewhere(session_factory):
+    db = session_factory()
+    ProxyService(db).bulk_upsert_proxies([{'ip': '10.0.1.1', 'port': 80, 'protocol': 'http'}])
+    scheduler = RevalidationScheduler(FailingValidator(), session_factory=session_factory)
+    scheduler._load_new_proxies(db)
+    key = scheduler.queue[0][3]
+    assert scheduler._next_check(scheduler._get(key)) == 0.0
+
+    checked_at = datetime.utcnow().replace(microsecond=0)
+    db.query(Proxy).update({'last_check_time': checked_at, 'updated_at': datetime.utcnow()})
+    db.commit()
+    assert scheduler._sync_updated(db) == 1
+    record = scheduler._get(key)
+    assert record.last_check_time == checked_at
+    # 旧的排期仍在队列中，但已与代理的状态不符，取出时会被跳过
+    stale = [entry for entry in scheduler.queue if entry[0] == 0.0]
+    assert stale and stale[0][0] != scheduler._next_check(record)
+    # 再次同步时没有变化，不重复入队
+    assert scheduler._sync_updated(db) == 0
+    db.close()
@@ -0,0 +1,64 @@
+import random
+from collections import Counter
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models.proxy import Proxy
+from app.services.proxy_selector import AliasTable, ProxySelector, _Snapshot
+import app.models  # noqa: F401  注册全部模型
+
+def proxy(proxy_id, protocol='http', country='中国', score=10.0):
+    return {'id': proxy_id, 'protocol': protocol, 'country': country, 'quality_score': score, 'success_rate': 0.0}
+
+@pytest.mark.parametrize('weights', [[1.0, 2.0, 3.0, 4.0], [100.0, 1.0, 1.0], [5.0], [0.5, 0.5]])
+def test_alias_table_samples_in_proportion_to_weights(weights):
+    table = AliasTable(list(range(len(weights))), weights)
+    rng = random.Random(1)
+    draws = 100000
+    counts = Counter(table.sample(rng) for _ in range(draws))
+    total = sum(weights)
+    for index, weight in enumerate(weights):
+        assert counts[index] / draws == pytest.approx(weight / total, abs=0.01)
+
+def test_snapshot_update_only_touches_changed_groups():
+    old = _Snapshot.build({1: proxy(1), 2: proxy(2, 'https', '日本'), 3: proxy(3, country='美国')}, 1.0)
+    new = old.updated({1: proxy(1, 'socks5'), 2: None, 4: proxy(4, country='美国', score=0.0)}, 1.0)
+
+    # 旧快照保持不变
+    assert set(old.proxies) == {1, 2, 3}
+    assert set(old.members[('http', None)]) == {1, 3}
+
+    assert set(new.proxies) == {1, 3, 4}
+    assert set(new.members[(None, None)]) == {1, 3, 4}
+    assert set(new.members[('http', None)]) == {3, 4}
+    assert set(new.members[('socks5', '中国')]) == {1}
+    assert new.members[('http', '美国')] == {3: 10.0, 4: 1.0}  # 评分为0时取 min_weight
+    # 清空的分组被移除
+    assert ('https', None) not in new.tables and (None, '日本') not in new.tables
+    assert ('http', '中国') not in new.members
+    # 未涉及的分组沿用旧的别名表
+    touched = old.updated({3: proxy(3, country='美国', score=20.0)}, 1.0)
+    assert touched.tables[('http', '中国')] is old.tables[('http', '中国')]
+    assert touched.tables[(None, '日本')] is old.tables[(None, '日本')]
+    assert touched.members[(None, '美国')] == {3: 20.0}
+
+def test_refresh_does_not_touch_request_session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'proxies.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(Proxy(ip='10.0.0.1', port=8080, protocol='http', is_active=True))
+        db.commit()
+
+    selector = ProxySelector()
+    with Session() as db:
+        # 请求中尚未提交的写入不应被选择器的刷新回滚
+        db.add(Proxy(ip='10.0.0.2', port=8080, protocol='http', is_active=True))
+        db.flush()
+        assert selector.choose(db)['ip'] == '10.0.0.1'
+        db.commit()
+
+    with Session() as db:
+        assert db.query(Proxy).count() == 2
+    engine.dispose()
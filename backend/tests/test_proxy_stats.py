@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.schemas.proxy import ProxyCreate, ProxyUpdate
+from app.services.proxy_service import ProxyService
+from app.services.proxy_stats import load_stats, rebuild_stats
+import app.models  # noqa: F401  注册全部模型
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+def rounded(value):
+    # 差量累加的浮点和与重新聚合的结果只允许舍入误差
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    return round(value, 6) if isinstance(value, float) else value
+
+def assert_matches_rebuild(db):
+    incremental = rounded(load_stats(db))
+    rebuild_stats(db)
+    assert rounded(load_stats(db)) == incremental
+    return incremental
+
+def test_summary_table_follows_every_write_path(db):
+    service = ProxyService(db)
+    service.bulk_upsert_proxies([
+        {'ip': '10.0.0.1', 'port': 80, 'protocol': 'http', 'country': '中国'},
+        {'ip': '10.0.0.2', 'port': 80, 'protocol': 'https'},
+        {'ip': '10.0.0.3', 'port': 1080, 'protocol': 'socks5', 'country': '日本', 'speed': 300.0},
+    ])
+    # 已存在的代理只补全空缺的国家
+    service.bulk_upsert_proxies([{'ip': '10.0.0.2', 'port': 80, 'protocol': 'https', 'country': '美国'}])
+    created = service.create_proxy(ProxyCreate(ip='10.0.0.4', port=8080, protocol='http', source_website_id=1))
+    stats = assert_matches_rebuild(db)
+    assert stats['total_proxies'] == 4
+    assert stats['countries_count'] == 3
+    assert stats['by_country']['未知']['total'] == 1
+
+    ids = [proxy.id for proxy in service.get_proxies()]
+    service.apply_validation_results([
+        {'proxy_id': ids[0], 'success_rate': 0.0, 'speed': None},
+        {'proxy_id': ids[1], 'success_rate': 100.0, 'speed': 120.0},
+    ])
+    service.bulk_update_proxies([ids[2]], {'is_active': False})
+    service.update_proxy(created.id, ProxyUpdate(country='德国'))
+    stats = assert_matches_rebuild(db)
+    assert stats['active_proxies'] == 2
+
+    service.delete_proxy(ids[1])
+    stats = assert_matches_rebuild(db)
+    assert stats['total_proxies'] == 3
+    assert stats['https_proxies'] == 0
+
+def test_writes_from_another_session_are_visible(db):
+    other = sessionmaker(bind=db.get_bind())()
+    ProxyService(other).bulk_upsert_proxies([{'ip': '10.0.1.1', 'port': 80, 'protocol': 'http'}])
+    other.close()
+    assert ProxyService(db).get_proxy_stats()['total_proxies'] == 1
@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models.proxy import Proxy
+from app.services.proxy_transfer import ProxyImporter, batched_lines, stream_line_batches
+import app.models  # noqa: F401  注册全部模型
+
+CSV = (
+    'ip,port,protocol,isp\n'
+    '10.0.0.1,8080,http,"电信\n机房, A区"\n'
+    '10.0.0.2,3128,https,"说明 ""多行""\n\n结束"\n'
+    '10.0.0.3,0,http,无效端口\n'
+    '10.0.0.4,1080,socks5,联通'
+)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+def check_import(db, batches):
+    importer = ProxyImporter(db, 'csv')
+    for batch in batches:
+        importer.feed(batch)
+    result = importer.result()
+    assert result['lines'] == 8
+    assert result['imported'] == 3
+    assert result['errors'] == ["第 7 行: 无效的端口: 0"]
+    isp = dict(db.query(Proxy.ip, Proxy.isp))
+    assert isp == {'10.0.0.1': '电信\n机房, A区', '10.0.0.2': '说明 "多行"\n\n结束', '10.0.0.4': '联通'}
+
+@pytest.mark.parametrize('batch_size', [1, 2, 3])
+def test_batched_csv_keeps_multiline_records_together(db, batch_size):
+    check_import(db, batched_lines(CSV.splitlines(keepends=True), batch_size, 'csv'))
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_streamed_csv_keeps_multiline_records_together(db, chunk_size):
+    data = CSV.encode()
+
+    async def chunks():
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    async def collect():
+        return [batch async for batch in stream_line_batches(chunks(), 2, 'csv')]
+
+    check_import(db, asyncio.run(collect()))
+
+def test_streamed_ndjson_batches_by_line():
+    async def chunks():
+        yield b'{"a": 1}\n{"a"'
+        yield b': 2}\n{"a": 3}'
+
+    async def collect():
+        return [batch async for batch in stream_line_batches(chunks(), 2)]
+
+    assert asyncio.run(collect()) == [['{"a": 1}\n', '{"a": 2}\n'], ['{"a": 3}']]
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from app.scripts.proxy_validator import PROBE_HEADER, PROBE_VALUE, ProxyValidator
+
+@pytest.fixture
+def validator():
+    return ProxyValidator(concurrency=3, origin_ip='')
+
+def fake_checks(validator, started, cancelled):
+    async def validate_proxy_async(proxy):
+        started.append(proxy['n'])
+        try:
+            await asyncio.sleep(0.01 * proxy['n'])
+        except asyncio.CancelledError:
+            cancelled.append(proxy['n'])
+            raise
+        return {'ip': '10.0.0.1', 'port': proxy['n'], 'is_valid': True, 'success_rate': float(proxy['n'])}
+    validator.validate_proxy_async = validate_proxy_async
+
+def test_stream_cancels_pending_checks_when_consumer_stops(validator):
+    started, cancelled = [], []
+    fake_checks(validator, started, cancelled)
+
+    async def consume_one():
+        stream = validator.validate_proxies_stream_async({'n': n} for n in range(1, 10))
+        async for _ in stream:
+            break
+        await stream.aclose()
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(consume_one()) == []
+    assert started == [1, 2, 3]
+    assert sorted(cancelled) == [2, 3]
+
+def test_batch_keeps_at_most_concurrency_checks_in_flight(validator):
+    active = [0, 0]  # 当前在途数, 峰值
+
+    async def validate_proxy_async(proxy):
+        active[0] += 1
+        active[1] = max(active)
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return {'ip': '10.0.0.1', 'port': proxy['n'], 'is_valid': True, 'success_rate': float(proxy['n'])}
+
+    validator.validate_proxy_async = validate_proxy_async
+    results = asyncio.run(validator.validate_proxies_batch_async([{'n': n} for n in range(1, 8)]))
+    assert [result['port'] for result in results] == [7, 6, 5, 4, 3, 2, 1]
+    assert active[1] == 3
+
+def echo(validator, origin='203.0.113.9', **extra):
+    headers = {'User-Agent': validator.headers['User-Agent'], PROBE_HEADER: PROBE_VALUE, **extra}
+    return {'origin': origin, 'headers': headers}
+
+@pytest.mark.parametrize('extra, origin, anonymity, tampered', [
+    ({}, '203.0.113.9', 'elite', False),
+    ({}, '203.0.113.9, 198.51.100.7', 'transparent', False),
+    ({'X-Forwarded-For': '198.51.100.70, 198.51.100.7'}, '203.0.113.9', 'transparent', False),
+    ({'X-Forwarded-For': '198.51.100.70'}, '203.0.113.9', 'anonymous', False),
+    ({'Via': '1.1 squid'}, '203.0.113.9', 'anonymous', False),
+    ({PROBE_HEADER: 'changed'}, '203.0.113.9', 'anonymous', True),
+    ({'User-Agent': 'other'}, '203.0.113.9', 'anonymous', True),
+])
+def test_analyze_echo_with_known_origin(validator, extra, origin, anonymity, tampered):
+    validator.origin_ip = '198.51.100.7'
+    result = validator._analyze_echo(echo(validator, origin, **extra))
+    assert (result['anonymity'], result['header_tampered']) == (anonymity, tampered)
+
+def test_analyze_echo_without_origin_treats_real_ip_headers_as_leaks(validator):
+    assert validator._analyze_echo(echo(validator))['anonymity'] == 'elite'
+    assert validator._analyze_echo(echo(validator, **{'X-Real-IP': '198.51.100.70'}))['anonymity'] == 'transparent'
+    assert validator._analyze_echo({'origin': '203.0.113.9'})['header_tampered']
+
+@pytest.mark.parametrize('text, ip', [
+    ('{"origin": "8.8.4.4"}', '8.8.4.4'),
+    ('{"origin": "8.8.4.4, 1.1.1.1"}', '8.8.4.4'),
+    ('{"ip": "2001:4860:4860::8888"}', '2001:4860:4860::8888'),
+    ('8.8.4.4\n', '8.8.4.4'),
+    ('{"origin": "127.0.0.1"}', ''),
+    ('203.0.113.9', ''),  # 文档示例网段也不是公网地址
+    ('192.168.1.10', ''),
+])
+def test_parse_origin_ip(validator, text, ip):
+    assert validator._parse_origin_ip(text) == ip
+
+@pytest.mark.parametrize('text', ['{"origin": ""}', '', 'not an ip'])
+def test_parse_origin_ip_rejects_missing_or_invalid_ip(validator, text):
+    with pytest.raises(ValueError):
+        validator._parse_origin_ip(text)
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models.proxy import Proxy
+from app.services.redis_pool import RedisProxyPool
+import app.models  # noqa: F401  注册全部模型
+
+fakeredis = pytest.importorskip("fakeredis")
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+def test_rebuild_swaps_in_new_keys_and_drops_stale_shards(db):
+    pool = RedisProxyPool(fakeredis.FakeRedis(decode_responses=True), prefix='test:pool')
+    pool.upsert([{'id': 99, 'ip': '10.0.0.99', 'port': 80, 'protocol': 'socks5', 'country': '日本',
+                  'is_active': True, 'quality_score': 50.0}])
+    db.add_all([
+        Proxy(ip='10.0.0.1', port=8080, protocol='http', country='中国', is_active=True, quality_score=80.0),
+        Proxy(ip='10.0.0.2', port=3128, protocol='https', is_active=True),
+        Proxy(ip='10.0.0.3', port=3128, protocol='https', is_active=False),
+    ])
+    db.commit()
+
+    assert pool.rebuild(db) == 2
+    assert pool.count() == 2
+    assert pool.count(protocol='socks5') == 0
+    assert pool.client.hlen(pool.data_key) == 2
+    assert not list(pool.client.scan_iter(match='test:pool~rebuild:*'))
+    assert set(pool.client.scan_iter(match='test:pool:*')) == {
+        pool.data_key,
+        pool.shard_key('http', '中国'), pool.shard_key('http'), pool.shard_key(None, '中国'),
+        pool.shard_key('https', '-'), pool.shard_key('https'), pool.shard_key(None, '-'),
+        pool.shard_key()
+    }
+    assert pool.choose(protocol='http')['ip'] == '10.0.0.1'